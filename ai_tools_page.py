@@ -18,17 +18,20 @@ Procedures/Functions/Classi Principali:
 Modifiche Recenti:
   - 2025-01-14: Creazione stile Pascal-like, aggiunti docstring.
   - Uso di sklearn KMeans come esempio di clustering (non implementato in dettaglio).
+  - 2026-10-19: KnowledgeGraphPage costruita alla prima selezione della tab
+    (LazyPage); knowledge_graph_page e sklearn non sono più importati all'avvio.
 
 Note:
-  - L’istanza KnowledgeGraphPage è importata dal file knowledge_graph_page.py.
+  - L’istanza KnowledgeGraphPage è importata dal file knowledge_graph_page.py
+    solo quando la tab "Knowledge Graph" viene selezionata.
+  - sklearn va importato dentro run_ml_clustering() quando verrà implementato.
   - DataFrame finali sono in data_structures.FinalDiagnoses_DF.
 """
 
 import tkinter as tk
 from tkinter import ttk
 import data_structures
-from sklearn.cluster import KMeans
-from knowledge_graph_page import KnowledgeGraphPage
+from startup_functions import LazyPage
 
 class AIToolsPage(ttk.Frame):
     """
@@ -46,8 +49,23 @@ class AIToolsPage(ttk.Frame):
         self.final_diag_cluster_page = FinalDiagClusterPage(self.notebook)
         self.notebook.add(self.final_diag_cluster_page, text="Final Diag/ML Cluster")
 
-        self.knowledge_graph_page = KnowledgeGraphPage(self.notebook)
-        self.notebook.add(self.knowledge_graph_page, text="Knowledge Graph")
+        # Knowledge Graph: costruita (e importata) alla prima selezione
+        self.knowledge_graph_tab = LazyPage(self.notebook, make_knowledge_graph_page, "Knowledge Graph")
+        self.notebook.add(self.knowledge_graph_tab, text="Knowledge Graph")
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+
+    @property
+    def knowledge_graph_page(self):
+        return self.knowledge_graph_tab.ensure_built()
+
+    def on_tab_changed(self, event):
+        if self.notebook.select() == str(self.knowledge_graph_tab):
+            self.knowledge_graph_tab.ensure_built()
+
+
+def make_knowledge_graph_page(parent):
+    from knowledge_graph_page import KnowledgeGraphPage
+    return KnowledgeGraphPage(parent)
 
 
 class FinalDiagClusterPage(ttk.Frame):
@@ -0,0 +1,288 @@
+"""
+Filename: benchmark_functions.py
+================================
+
+Scopo:
+  - Benchmark delle costruzioni vettoriali rispetto alle versioni
+    precedenti, sugli stessi DF: tempi e verifica che il risultato coincida.
+  - Utilizzabile da riga di comando dopo il caricamento di uno snapshot:
+      python benchmark_functions.py [--snapshot <nome>] [--sample N] [--repeat R]
+                                    [--graph-io <cartella>]
+
+Procedures/Functions:
+  - build_graph_legacy(): build_graph() precedente (iterrows).
+  - graph_differences(G1, G2): differenze tra due grafi (nodi, archi, attributi).
+  - drop_null_cases(G): toglie i RICO_ID nulli dal grafo legacy.
+  - time_call(func, repeat): (risultato, tempo migliore in secondi).
+  - build_graph_uncached(): build_graph() senza la cache di get_concept_matrix.
+  - benchmark_build_graph(repeat, legacy): build_graph vettoriale vs legacy.
+  - benchmark_graph_io(folder, repeat): salvataggio/caricamento del grafo,
+    pickle vs formato colonnare (ConceptMatrix.save/load).
+  - main(): interfaccia da riga di comando.
+
+Modifiche recenti:
+  - 2026-10-19: Creazione del modulo (benchmark di build_graph).
+  - 2026-10-19: Benchmark di salvataggio/caricamento del grafo (--graph-io).
+  - 2026-10-19: benchmark_build_graph misura build_graph_uncached(): con
+    --repeat > 1 build_graph() riusava la matrice in cache.
+
+Note:
+  - La versione legacy è O(righe RulesConclusions x righe KB): con --sample N
+    si usano solo le prime N righe di RulesConclusions_DF per entrambe.
+  - Il confronto ignora il nodo "case_<NA>" e i RICO_ID nulli negli
+    study_set che la versione legacy produce per le righe con RICO_ID nullo.
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import pandas as pd
+
+import data_structures
+from graph_matrix_functions import build_concept_matrix
+
+
+def build_graph_legacy():
+    """
+    Crea e ritorna un nx.DiGraph con:
+      - Nodi "conc_{ID}" (type="concept") -> provenienti da KB_Conclusions_DF
+        con attributi: STR, CODE, usage_count, etc.
+      - Nodi "case_{rico}" (type="case") -> provenienti da RulesConclusions_DF
+      - Archi "IS-A" (tra conc_{pid} e conc_{cid}) e "CASE-OF" (tra case_{rico} e conc_{cid}).
+      - usage_count = len(study_set) per ogni conc_{cid}.
+    Versione precedente (iterrows, scansione del KB per ogni riga di
+    RulesConclusions_DF), mantenuta solo come riferimento per i benchmark.
+    """
+    import networkx as nx
+    G = nx.DiGraph()
+
+    kb_df = data_structures.KB_Conclusions_DF
+    rc_df = data_structures.RulesConclusions_DF
+
+    # Se mancano dati, grafo vuoto
+    if kb_df.empty or rc_df.empty:
+        return G
+
+    # 1) calcoliamo usage_count = n distinct RICO_ID per each CODE
+    rccopy = rc_df.copy()
+    if 'CONCLUSION_CODE' in rccopy.columns and 'CODE' not in rccopy.columns:
+        rccopy.rename(columns={'CONCLUSION_CODE': 'CODE'}, inplace=True)
+    grp = rccopy.groupby('CODE')['RICO_ID'].nunique().reset_index(name='distinct_rico')
+    rc_count = pd.Series(grp.distinct_rico.values, index=grp['CODE']).to_dict()
+
+    # 2) Creiamo nodi concept
+    for _, row in kb_df.iterrows():
+        cid = row['ID']
+        code_ = row.get('CODE', None)
+        usage = rc_count.get(code_, 0) if code_ else 0
+
+        node_name = f"conc_{cid}"
+        G.add_node(
+            node_name,
+            type="concept",
+            STR = row.get('STR', f"Concept {cid}"),
+            CODE = code_ if code_ else "?",
+            SHOW_IN_REPORTS_BL = bool(row.get('SHOW_IN_REPORTS_BL', False)),
+            GENERALIZATION_BL = bool(row.get('GENERALIZATION_BL', False)),
+            SET_PARENT_TRUE_BL = bool(row.get('SET_PARENT_TRUE_BL', False)),
+            RESERVED_BL = bool(row.get('RESERVED_BL', False)),
+            PARENT_ID = row.get('PARENT_ID', 0),
+            study_set = set(),
+            usage_count = usage
+        )
+
+    # 3) Archi IS-A
+    for _, row in kb_df.iterrows():
+        cid = row['ID']
+        pid = row.get('PARENT_ID', 0)
+        if pid and pid>0:
+            parent_node = f"conc_{pid}"
+            child_node  = f"conc_{cid}"
+            if parent_node in G and child_node in G:
+                G.add_edge(parent_node, child_node, relation="IS-A")
+
+    # 4) Nodi case_{rico} e archi CASE-OF
+    if 'CONCLUSION_CODE' in rc_df.columns and 'CODE' not in rc_df.columns:
+        rc_df = rc_df.rename(columns={'CONCLUSION_CODE': 'CODE'})
+
+    for rico in rc_df['RICO_ID'].unique():
+        case_node = f"case_{rico}"
+        G.add_node(case_node, type="case")
+
+    for _, row in rc_df.iterrows():
+        rico = row['RICO_ID']
+        code_val = row.get('CODE', None)
+        if code_val is None:
+            continue
+        sub_kb = kb_df[kb_df['CODE']==code_val]
+        if sub_kb.empty:
+            continue
+        cid = sub_kb.iloc[0]['ID']
+        conc_node = f"conc_{cid}"
+        if conc_node in G:
+            case_node = f"case_{rico}"
+            G.add_edge(case_node, conc_node, relation="CASE-OF")
+            G.nodes[conc_node]['study_set'].add(rico)
+
+    # 5) Se vogliamo usage_count esatto => len(study_set)
+    for n, d in G.nodes(data=True):
+        if d.get('type')=='concept':
+            d['usage_count'] = len(d['study_set'])
+
+    return G
+
+
+
+def graph_differences(G1, G2, max_items=10):
+    """
+    Righe di testo con le differenze tra G1 e G2 (vuota se coincidono):
+    nodi e archi presenti in uno solo dei grafi, attributi diversi.
+    """
+    lines = []
+    nodes1, nodes2 = set(G1.nodes), set(G2.nodes)
+    for label, diff in (("only in first", nodes1 - nodes2), ("only in second", nodes2 - nodes1)):
+        if diff:
+            lines.append(f"Nodes {label}: {len(diff)} {sorted(map(str, diff))[:max_items]}")
+    changed = [n for n in nodes1 & nodes2 if G1.nodes[n] != G2.nodes[n]]
+    if changed:
+        lines.append(f"Nodes with different attributes: {len(changed)} {sorted(map(str, changed))[:max_items]}")
+    edges1 = {(u, v, d.get('relation')) for u, v, d in G1.edges(data=True)}
+    edges2 = {(u, v, d.get('relation')) for u, v, d in G2.edges(data=True)}
+    for label, diff in (("only in first", edges1 - edges2), ("only in second", edges2 - edges1)):
+        if diff:
+            lines.append(f"Edges {label}: {len(diff)} {sorted(map(str, diff))[:max_items]}")
+    return lines
+
+
+def drop_null_cases(G):
+    """
+    Toglie dal grafo legacy il nodo "case_<NA>" e i RICO_ID nulli dagli
+    study_set (con usage_count ricalcolato), che build_graph() non produce.
+    """
+    if "case_<NA>" in G:
+        G.remove_node("case_<NA>")
+    for _, d in G.nodes(data=True):
+        if d.get('type') == "concept":
+            d['study_set'] = {r for r in d['study_set'] if not pd.isna(r)}
+            d['usage_count'] = len(d['study_set'])
+
+
+def time_call(func, repeat=1):
+    """
+    Esegue func() repeat volte; ritorna (ultimo risultato, tempo migliore).
+    """
+    best = None
+    result = None
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def build_graph_uncached():
+    """
+    Come build_graph(), ma con la matrice sempre ricostruita (join CODE -> ID,
+    deduplica, CSR) invece di quella in cache di get_concept_matrix().
+    """
+    matrix = build_concept_matrix(data_structures.KB_Conclusions_DF,
+                                  data_structures.RulesConclusions_DF)
+    return matrix.to_networkx()
+
+
+def benchmark_build_graph(repeat=1, legacy=True):
+    """
+    Confronta build_graph() (ricostruzione completa, build_graph_uncached)
+    con build_graph_legacy() sui DF correnti.
+    Ritorna righe di testo (tempi, speedup, differenze).
+    """
+    rc_rows = len(data_structures.RulesConclusions_DF)
+    kb_rows = len(data_structures.KB_Conclusions_DF)
+    lines = [f"build_graph benchmark: RulesConclusions {rc_rows:,d} rows, KB {kb_rows:,d} rows"]
+    G_new, t_new = time_call(build_graph_uncached, repeat)
+    lines.append(f"  vectorized: {t_new:.3f}s ({G_new.number_of_nodes():,d} nodes, {G_new.number_of_edges():,d} edges)")
+    if not legacy:
+        return lines
+    G_old, t_old = time_call(build_graph_legacy, repeat)
+    drop_null_cases(G_old)
+    lines.append(f"  legacy:     {t_old:.3f}s ({G_old.number_of_nodes():,d} nodes, {G_old.number_of_edges():,d} edges)")
+    lines.append(f"  speedup:    {t_old / t_new:.1f}x" if t_new > 0 else "  speedup:    n/a")
+    diff = graph_differences(G_old, G_new)
+    lines.append("  graphs identical" if not diff else "  graphs differ:")
+    lines.extend(f"    {line}" for line in diff)
+    return lines
+
+
+def file_size(path):
+    """Dimensione in byte di un file o di una cartella (somma dei file)."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def benchmark_graph_io(folder, repeat=1):
+    """
+    Confronta il salvataggio/caricamento del grafo in pickle (DiGraph
+    networkx) con il formato colonnare di ConceptMatrix (con e senza
+    memory map), nella cartella folder. Ritorna righe di testo.
+    """
+    from graph_functions import save_graph, load_graph
+    from graph_matrix_functions import get_concept_matrix, ConceptMatrix
+
+    matrix = get_concept_matrix()
+    G = matrix.to_networkx()
+    pkl_file = os.path.join(folder, "graph_data.pkl")
+    store = os.path.join(folder, "graph_data")
+    os.makedirs(folder, exist_ok=True)
+
+    _, t_pkl_save = time_call(lambda: save_graph(G, pkl_file), repeat)
+    G_pkl, t_pkl_load = time_call(lambda: load_graph(pkl_file), repeat)
+    _, t_save = time_call(lambda: matrix.save(store), repeat)
+    loaded, t_mmap = time_call(lambda: ConceptMatrix.load(store, mmap=True), repeat)
+    _, t_load = time_call(lambda: ConceptMatrix.load(store, mmap=False), repeat)
+
+    lines = [f"Graph I/O benchmark: {matrix.n_studies:,d} studies, {matrix.n_concepts:,d} concepts, "
+             f"{matrix.n_edges:,d} links"]
+    lines.append(f"  pickle:   save {t_pkl_save:.3f}s  load {t_pkl_load:.3f}s  size {file_size(pkl_file) / 1e6:.1f} MB")
+    lines.append(f"  columnar: save {t_save:.3f}s  load {t_load:.3f}s (mmap {t_mmap:.3f}s)  "
+                 f"size {file_size(store) / 1e6:.1f} MB")
+    if t_mmap > 0:
+        lines.append(f"  load speedup (mmap): {t_pkl_load / t_mmap:.1f}x")
+    diff = graph_differences(G_pkl, loaded.to_networkx())
+    lines.append("  loaded graphs identical" if not diff else "  loaded graphs differ:")
+    lines.extend(f"    {line}" for line in diff)
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the vectorized builders against the legacy versions.")
+    parser.add_argument("--snapshot", default="", help="FEATHER snapshot to load ('' = default folder).")
+    parser.add_argument("--sample", type=int, default=0, help="Use only the first N rows of RulesConclusions_DF.")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--no-legacy", action="store_true", help="Time only the vectorized version.")
+    parser.add_argument("--graph-io", metavar="FOLDER",
+                        help="Also benchmark graph save/load (pickle vs columnar) in FOLDER.")
+    args = parser.parse_args()
+
+    from snapshot_functions import load_snapshot
+    for line in load_snapshot(args.snapshot):
+        print(line)
+    if args.sample:
+        data_structures.set_dataframe('RulesConclusions_DF', data_structures.RulesConclusions_DF.head(args.sample))
+    print()
+    for line in benchmark_build_graph(args.repeat, legacy=not args.no_legacy):
+        print(line)
+    if args.graph_io:
+        print()
+        for line in benchmark_graph_io(args.graph_io, args.repeat):
+            print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# End of benchmark_functions.py
@@ -0,0 +1,532 @@
+"""
+Filename: cube_functions.py
+===========================
+
+Scopo:
+  - Cubo di aggregati giornalieri materializzato, calcolato dai DF di
+    dettaglio e salvato accanto ai file FEATHER dello snapshot:
+      studies      (DAY, SEX_CODE, AGE_BAND) -> STUDIES, AGE_COUNT, AGE_SUM
+      conclusions  DAY -> ROWS, N_<tipo> (conclusioni) e S_<tipo> (studi con
+                   almeno una conclusione) per Total/Final/Muscle/Nerve/
+                   In Report/Reserved/Generalization/Warning
+      diagnoses    DAY -> FINAL_ROWS, FINAL_STUDIES, CLINICAL_ROWS, CLINICAL_STUDIES
+  - Somme prefisse per giorno di calendario: il totale di un intervallo di
+    date è una differenza di due celle (O(1)), senza rileggere il dettaglio.
+  - Statistiche della Home e report per intervallo di date leggono il cubo.
+
+Procedures/Functions/Classi Principali:
+  - RC_STAT_COLUMNS, conclusion_flag_lut(kb_df), get_conclusion_flag_lut():
+    bitmask dei flag per CODE della conclusione.
+  - per_study_flag_counts(rc_df): conteggi per studio e tipo (un bincount).
+  - derived_study_columns(df), get_study_derived_columns(): YEAR/DAY/AGE/AGE_BAND.
+  - build_studies_section(), build_conclusions_section(), build_diagnoses_section().
+  - DailyCube: sezioni + range_total(section, column, start, end, **filtri).
+  - get_cube(): cubo aggiornato (sezioni ricalcolate solo se i loro DF sono
+    cambiati, o rilette dallo snapshot se le versioni coincidono).
+  - update_cube(persist): aggiornamento a fine import.
+  - save_cube(snapshot_name): salva sezioni (FEATHER) + CUBE_FILE.
+
+Modifiche recenti:
+  - 2026-10-19: Creazione del modulo. LUT dei flag e colonne derivate degli
+    studi spostate qui da stats_functions (che le reimporta).
+  - 2026-10-19: DailyCube.save non riscrive CUBE_FILE se nessuna sezione è
+    salvabile e mantiene le voci delle sezioni non salvate; dopo un import
+    da DB il cubo è aggiornato solo in memoria (update_cube(persist=False)).
+
+Note:
+  - Ogni studio ha un solo giorno (STUDY_DATE): i conteggi "studi con almeno
+    una conclusione/diagnosi" sono quindi additivi tra giorni.
+  - Righe senza data (o con RICO_ID non presente in Studies_DF) sono nel
+    giorno NaT: contano nei totali complessivi, non negli intervalli.
+  - Una sezione è valida finché coincidono le generazioni (sessione) o le
+    versioni (hash FEATHER) dei suoi DF; solo le sezioni con versioni da
+    snapshot sono salvate ("gen-N" vale solo nella sessione corrente).
+"""
+
+import os
+import json
+import time
+import logging
+import datetime
+import threading
+
+import numpy as np
+import pandas as pd
+
+import data_structures
+from kb_cache_functions import codes_to_index
+from snapshot_functions import snapshot_folder, get_active_snapshot
+
+logger = logging.getLogger(__name__)
+
+CUBE_FILE = "cube.json"
+
+# Sezione -> DF da cui dipende
+CUBE_SECTIONS = {
+    "studies": ["Studies_DF"],
+    "conclusions": ["RulesConclusions_DF", "Studies_DF", "KB_Conclusions_DF"],
+    "diagnoses": ["FinalDiagnoses_DF", "ClinicalDiagnoses_DF", "Studies_DF"]
+}
+
+# Limiti inferiori delle fasce d'età (anni); AGE_BAND = indice, -1 = ignota
+AGE_BANDS = [0, 18, 30, 40, 50, 60, 70, 80]
+AGE_BAND_LABELS = [f"{a}-{b - 1}" for a, b in zip(AGE_BANDS, AGE_BANDS[1:])] + [f"{AGE_BANDS[-1]}+"]
+
+# (colonna, etichetta): TOTAL conta tutte le righe, le altre un bit della LUT
+RC_STAT_COLUMNS = [
+    ("TOTAL", "Total"),
+    ("FINAL", "Final"),
+    ("MUSCLE", "Single Muscle"),
+    ("NERVE", "Single Nerve"),
+    ("IN_REPORT", "In Report"),
+    ("RESERVED", "Reserved"),
+    ("GENERALIZATION", "Generalization"),
+    ("WARNING", "Warning")
+]
+
+# Bit della LUT (nello stesso ordine di RC_STAT_COLUMNS[1:])
+RC_FLAG_BITS = {name: i for i, (name, _) in enumerate(RC_STAT_COLUMNS[1:])}
+
+NAT_DAY = np.iinfo(np.int64).min
+
+
+def conclusion_flag_lut(kb_df):
+    """
+    LUT uint8 indicizzata per CODE (size+1 celle, l'ultima è la sentinella
+    per i codici sconosciuti = nessun flag). Ritorna (lut, size).
+    """
+    if kb_df.empty:
+        return np.zeros(1, dtype=np.uint8), 0
+    codes = kb_df['CODE'].to_numpy(dtype='int64')
+    ok = codes >= 0
+    size = int(codes[ok].max()) + 1 if ok.any() else 0
+
+    def is_true(col):
+        if col not in kb_df.columns:
+            return np.zeros(len(kb_df), dtype=bool)
+        return (kb_df[col] == True).to_numpy(dtype=bool)
+
+    group = kb_df['GROUP_CODE'].to_numpy(dtype='int64', na_value=-1)
+    conditions = {
+        "FINAL": group == 1,
+        "MUSCLE": group == 2,
+        "NERVE": group == 3,
+        "IN_REPORT": is_true('SHOW_IN_REPORTS_BL'),
+        "RESERVED": is_true('RESERVED_BL'),
+        "GENERALIZATION": is_true('GENERALIZATION_BL'),
+        "WARNING": is_true('WARNING_BL')
+    }
+    row_bits = np.zeros(len(kb_df), dtype=np.uint8)
+    for name, cond in conditions.items():
+        row_bits |= cond.astype(np.uint8) << RC_FLAG_BITS[name]
+
+    lut = np.zeros(size + 1, dtype=np.uint8)
+    np.bitwise_or.at(lut, codes[ok], row_bits[ok])
+    return lut, size
+
+
+_flag_lut = None
+
+
+def get_conclusion_flag_lut():
+    """
+    (lut, size) per KB_Conclusions_DF corrente; ricostruita solo se la
+    generazione del DF è cambiata.
+    """
+    global _flag_lut
+    gen = data_structures.get_generation("KB_Conclusions_DF")
+    if _flag_lut is None or _flag_lut[0] != gen:
+        _flag_lut = (gen,) + conclusion_flag_lut(data_structures.KB_Conclusions_DF)
+    return _flag_lut[1], _flag_lut[2]
+
+
+def per_study_flag_counts(rc_df):
+    """
+    Conteggi per studio (righe con RICO_ID valido) di ogni colonna di
+    RC_STAT_COLUMNS, in un solo bincount sulle chiavi (studio, colonna).
+    Ritorna (ricos ordinati, matrice int64 n_studi x n_colonne).
+    """
+    lut, size = get_conclusion_flag_lut()
+    n_cols = len(RC_STAT_COLUMNS)
+    if rc_df.empty:
+        return np.empty(0, dtype=np.int64), np.zeros((0, n_cols), dtype=np.int64)
+    rico = rc_df['RICO_ID'].to_numpy(dtype='int64', na_value=-1)
+    valid = rico >= 0
+    bits = lut[codes_to_index(rc_df['CONCLUSION_CODE'], size)][valid]
+
+    group, ricos = pd.factorize(rico[valid], sort=True)
+    present = np.empty((len(group), n_cols), dtype=bool)
+    present[:, 0] = True
+    present[:, 1:] = np.unpackbits(bits[:, None], axis=1, count=n_cols - 1, bitorder='little').astype(bool)
+    keys = (group[:, None] * n_cols + np.arange(n_cols))[present]
+    counts = np.bincount(keys, minlength=len(ricos) * n_cols).reshape(len(ricos), n_cols)
+    return np.asarray(ricos), counts
+
+
+_study_columns = None
+
+
+def derived_study_columns(studies_df):
+    """
+    Colonne derivate di Studies_DF (allineate alle righe):
+      YEAR (Int64), DAY (data senza ora, datetime64), AGE (anni, float),
+      AGE_BAND (indice in AGE_BANDS, -1 se l'età non è nota).
+    """
+    date = pd.to_datetime(studies_df['STUDY_DATE'])
+    birth = pd.to_datetime(studies_df['BIRTH_DATE'])
+    age = (date - birth).dt.days / 365.25
+    age_values = age.to_numpy(dtype='float64', na_value=np.nan)
+    band = np.digitize(age_values, AGE_BANDS) - 1
+    band[np.isnan(age_values) | (band < 0)] = -1
+    return pd.DataFrame({
+        'YEAR': date.dt.year.astype('Int64'),
+        'DAY': date.dt.normalize(),
+        'AGE': age,
+        'AGE_BAND': band
+    }, index=studies_df.index)
+
+
+def get_study_derived_columns():
+    """
+    YEAR/DAY/AGE/AGE_BAND di Studies_DF corrente; ricalcolate solo se la
+    generazione del DF è cambiata.
+    """
+    global _study_columns
+    gen = data_structures.get_generation("Studies_DF")
+    if _study_columns is None or _study_columns[0] != gen:
+        _study_columns = (gen, derived_study_columns(data_structures.Studies_DF))
+    return _study_columns[1]
+
+
+# ----------------------------------------------------------------
+# Giorni come interi (giorni dal 1970-01-01, NAT_DAY = senza data)
+# ----------------------------------------------------------------
+def day_numbers(days):
+    values = np.asarray(days, dtype='datetime64[D]')
+    out = values.astype(np.int64)
+    out[np.isnat(values)] = NAT_DAY
+    return out
+
+
+def day_values(numbers):
+    numbers = np.asarray(numbers, dtype=np.int64)
+    out = numbers.astype('datetime64[D]').astype('datetime64[ns]')
+    out[numbers == NAT_DAY] = np.datetime64('NaT')
+    return out
+
+
+class RicoDays:
+    """
+    RICO_ID -> giorno dello studio (numero di giorno; NAT_DAY se lo studio
+    non ha data o non è in Studies_DF). Con RICO_ID duplicati vale la prima riga.
+    """
+    def __init__(self, studies_df, derived):
+        rico = studies_df['RICO_ID'].to_numpy(dtype='int64', na_value=-1) if len(studies_df) else np.empty(0, dtype=np.int64)
+        first = ~pd.Series(rico).duplicated(keep='first').to_numpy() & (rico >= 0)
+        self.index = pd.Index(rico[first])
+        self.days = day_numbers(derived['DAY'].to_numpy()[first]) if len(studies_df) else np.empty(0, dtype=np.int64)
+
+    def lookup(self, ricos):
+        pos = self.index.get_indexer(np.asarray(ricos, dtype=np.int64))
+        out = np.full(len(pos), NAT_DAY, dtype=np.int64)
+        out[pos >= 0] = self.days[pos[pos >= 0]]
+        return out
+
+
+def _sum_by_day(days, columns):
+    """
+    Somma per giorno: days (numeri di giorno) allineato ai valori di columns
+    (dict nome -> array). Ritorna un DataFrame DAY + colonne, ordinato per giorno.
+    """
+    uniq, inv = np.unique(days, return_inverse=True)
+    data = {'DAY': day_values(uniq)}
+    for name, values in columns.items():
+        data[name] = np.bincount(inv, weights=values, minlength=len(uniq)).astype(np.int64)
+    return pd.DataFrame(data)
+
+
+def build_studies_section(studies_df, derived):
+    frame = pd.DataFrame({
+        'DAY': derived['DAY'].array,
+        'SEX_CODE': studies_df['SEX_CODE'].array,
+        'AGE_BAND': derived['AGE_BAND'].to_numpy(),
+        'AGE': derived['AGE'].array
+    })
+    return frame.groupby(['DAY', 'SEX_CODE', 'AGE_BAND'], dropna=False, sort=True).agg(
+        STUDIES=('AGE', 'size'),
+        AGE_COUNT=('AGE', 'count'),
+        AGE_SUM=('AGE', 'sum')
+    ).reset_index()
+
+
+def build_conclusions_section(rc_df, rico_days):
+    """
+    Per giorno: ROWS (tutte le righe), N_<tipo> conclusioni e S_<tipo> studi
+    con almeno una conclusione del tipo (solo righe con RICO_ID valido).
+    """
+    columns = [name for name, _ in RC_STAT_COLUMNS]
+    if rc_df.empty:
+        return pd.DataFrame(columns=['DAY', 'ROWS'] + [f"N_{c}" for c in columns] + [f"S_{c}" for c in columns])
+    row_days = rico_days.lookup(rc_df['RICO_ID'].to_numpy(dtype='int64', na_value=-1))
+    ricos, counts = per_study_flag_counts(rc_df)
+    study_days = rico_days.lookup(ricos)
+
+    # Righe e studi sono sommati sullo stesso asse dei giorni
+    days = np.concatenate([row_days, study_days])
+    n_rows, n_studies = len(row_days), len(study_days)
+    values = {'ROWS': np.concatenate([np.ones(n_rows), np.zeros(n_studies)])}
+    for i, c in enumerate(columns):
+        values[f"N_{c}"] = np.concatenate([np.zeros(n_rows), counts[:, i]])
+    for i, c in enumerate(columns):
+        values[f"S_{c}"] = np.concatenate([np.zeros(n_rows), counts[:, i] > 0])
+    return _sum_by_day(days, values)
+
+
+def build_diagnoses_section(final_df, clinical_df, rico_days):
+    parts = []
+    for prefix, df in (("FINAL", final_df), ("CLINICAL", clinical_df)):
+        rico = df['RICO_ID'].to_numpy(dtype='int64', na_value=-1) if len(df) else np.empty(0, dtype=np.int64)
+        studies = np.unique(rico[rico >= 0])
+        parts.append((prefix, rico_days.lookup(rico), rico_days.lookup(studies)))
+    days = np.concatenate([p for _, rows, st in parts for p in (rows, st)])
+    values = {}
+    offset = 0
+    for prefix, rows, st in parts:
+        for suffix, arr in (("ROWS", rows), ("STUDIES", st)):
+            col = np.zeros(len(days))
+            col[offset:offset + len(arr)] = 1
+            values[f"{prefix}_{suffix}"] = col
+            offset += len(arr)
+    return _sum_by_day(days, values)
+
+
+def _build_section(name):
+    studies_df = data_structures.Studies_DF
+    if name == "studies":
+        return build_studies_section(studies_df, get_study_derived_columns())
+    rico_days = RicoDays(studies_df, get_study_derived_columns())
+    if name == "conclusions":
+        return build_conclusions_section(data_structures.RulesConclusions_DF, rico_days)
+    return build_diagnoses_section(data_structures.FinalDiagnoses_DF,
+                                   data_structures.ClinicalDiagnoses_DF, rico_days)
+
+
+def _persistable(versions):
+    return all(not v.startswith("gen-") for v in versions.values())
+
+
+def _read_cube_meta(filename):
+    """Contenuto di CUBE_FILE; None se manca o non è leggibile."""
+    if not os.path.isfile(filename):
+        return None
+    try:
+        with open(filename, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning("Cannot read %s: %s", filename, e)
+        return None
+
+
+class DailyCube:
+    """
+    Sezioni del cubo (DataFrame con colonna DAY) con le versioni/generazioni
+    dei DF da cui sono state calcolate, e somme prefisse per giorno.
+    """
+    def __init__(self):
+        self.sections = {}
+        self.versions = {}
+        self.generations = {}
+        self.stored = {}
+        self.loaded_folders = set()
+        self._prefix = {}
+
+    def table(self, name):
+        return self.sections[name]
+
+    def set_section(self, name, table, versions, generations):
+        self.sections[name] = table
+        self.versions[name] = versions
+        self.generations[name] = generations
+        self._prefix = {k: v for k, v in self._prefix.items() if k[0] != name}
+
+    def is_current(self, name):
+        df_names = CUBE_SECTIONS[name]
+        if name not in self.sections:
+            return False
+        if self.generations.get(name) == {n: data_structures.get_generation(n) for n in df_names}:
+            return True
+        return self.versions.get(name) == {n: data_structures.get_version(n) for n in df_names}
+
+    def prefix(self, name, column, **filters):
+        """
+        (primo giorno, somme prefisse) della colonna per giorno di calendario,
+        sulle righe con data che soddisfano i filtri (colonna == valore).
+        cs[i] = somma dei giorni first .. first+i-1.
+        """
+        key = (name, column, tuple(sorted(filters.items())))
+        cached = self._prefix.get(key)
+        if cached is not None:
+            return cached
+        table = self.sections[name]
+        days = day_numbers(table['DAY'].to_numpy())
+        mask = days != NAT_DAY
+        for col, value in filters.items():
+            mask &= (table[col] == value).to_numpy(dtype=bool, na_value=False)
+        if not mask.any():
+            result = (0, np.zeros(1))
+        else:
+            first = int(days[mask].min())
+            n_days = int(days[mask].max()) - first + 1
+            values = table[column].to_numpy(dtype='float64', na_value=0.0)[mask]
+            per_day = np.bincount(days[mask] - first, weights=values, minlength=n_days)
+            result = (first, np.concatenate([[0.0], np.cumsum(per_day)]))
+        self._prefix[key] = result
+        return result
+
+    def range_total(self, name, column, start=None, end=None, **filters):
+        """
+        Somma della colonna nei giorni start..end (inclusi; None = senza
+        limite), con i filtri indicati: due letture delle somme prefisse.
+        """
+        first, cs = self.prefix(name, column, **filters)
+        n_days = len(cs) - 1
+        i0 = 0 if start is None else min(max(int(day_numbers([start])[0]) - first, 0), n_days)
+        i1 = n_days if end is None else min(max(int(day_numbers([end])[0]) - first + 1, 0), n_days)
+        return float(cs[i1] - cs[i0]) if i1 > i0 else 0.0
+
+    def total(self, name, column, **filters):
+        """
+        Somma della colonna su tutte le righe, comprese quelle senza data.
+        """
+        table = self.sections[name]
+        mask = np.ones(len(table), dtype=bool)
+        for col, value in filters.items():
+            mask &= (table[col] == value).to_numpy(dtype=bool, na_value=False)
+        return float(table[column].to_numpy(dtype='float64', na_value=0.0)[mask].sum())
+
+    # ------------------------------------------------------------
+    # Persistenza (accanto ai FEATHER dello snapshot)
+    # ------------------------------------------------------------
+    def read_stored(self, snapshot_name):
+        """
+        Legge (una volta per cartella) CUBE_FILE: le sezioni salvate sono
+        adottate da get_cube() quando le versioni dei DF coincidono.
+        """
+        folder = snapshot_folder(snapshot_name)
+        if folder in self.loaded_folders:
+            return
+        self.loaded_folders.add(folder)
+        meta = _read_cube_meta(os.path.join(folder, CUBE_FILE))
+        if meta is None:
+            return
+        for name, entry in meta.get('sections', {}).items():
+            if name in CUBE_SECTIONS:
+                self.stored[name] = (folder, entry)
+
+    def adopt_stored(self, name):
+        stored = self.stored.get(name)
+        if stored is None:
+            return False
+        folder, entry = stored
+        df_names = CUBE_SECTIONS[name]
+        if entry['versions'] != {n: data_structures.get_version(n) for n in df_names}:
+            return False
+        import pyarrow.feather as feather
+        table = feather.read_feather(os.path.join(folder, entry['file']))
+        self.set_section(name, table, entry['versions'],
+                         {n: data_structures.get_generation(n) for n in df_names})
+        return True
+
+    def save(self, snapshot_name=""):
+        """
+        Salva in FEATHER le sezioni con versioni da snapshot e aggiorna
+        CUBE_FILE. Le sezioni non salvabili ("gen-N") mantengono la voce
+        già presente in CUBE_FILE; se nessuna sezione è salvabile il file
+        non viene riscritto. Ritorna il nome di CUBE_FILE o None.
+        """
+        folder = snapshot_folder(snapshot_name)
+        if not os.path.isdir(folder):
+            return None
+        import pyarrow.feather as feather
+        filename = os.path.join(folder, CUBE_FILE)
+        previous = _read_cube_meta(filename) or {}
+        sections = {name: entry for name, entry in previous.get('sections', {}).items()
+                    if name in CUBE_SECTIONS}
+        saved = 0
+        for name, table in self.sections.items():
+            df_names = CUBE_SECTIONS[name]
+            # Sezione calcolata su DF poi salvati: prende le versioni correnti
+            if self.generations.get(name) == {n: data_structures.get_generation(n) for n in df_names}:
+                self.versions[name] = {n: data_structures.get_version(n) for n in df_names}
+            if not _persistable(self.versions[name]):
+                continue
+            file = f"Cube_{name}.feather"
+            feather.write_feather(table.reset_index(drop=True), os.path.join(folder, file))
+            sections[name] = {'file': file, 'rows': int(len(table)), 'versions': self.versions[name]}
+            self.stored[name] = (folder, sections[name])
+            saved += 1
+        if not saved:
+            return None
+        meta = {'saved_at': datetime.datetime.now().isoformat(timespec='seconds'), 'sections': sections}
+        with open(filename + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=1)
+        os.replace(filename + ".tmp", filename)
+        self.loaded_folders.add(folder)
+        return filename
+
+
+_cube = DailyCube()
+_cube_lock = threading.Lock()
+
+
+def get_cube():
+    """
+    Cubo con tutte le sezioni aggiornate: una sezione è ricalcolata solo se
+    uno dei suoi DF è cambiato e non è disponibile nello snapshot attivo.
+    Le sezioni ricalcolate su DF caricati da snapshot vi sono salvate.
+    """
+    with _cube_lock:
+        _cube.read_stored(get_active_snapshot())
+        rebuilt = []
+        for name, df_names in CUBE_SECTIONS.items():
+            if _cube.is_current(name) or _cube.adopt_stored(name):
+                continue
+            versions = {n: data_structures.get_version(n) for n in df_names}
+            generations = {n: data_structures.get_generation(n) for n in df_names}
+            t0 = time.perf_counter()
+            table = _build_section(name)
+            _cube.set_section(name, table, versions, generations)
+            logger.info("Cube section %s: %d rows in %.2fs", name, len(table), time.perf_counter() - t0)
+            rebuilt.append(name)
+        if rebuilt and any(_persistable(_cube.versions[n]) for n in rebuilt):
+            _cube.save(get_active_snapshot())
+    return _cube
+
+
+def update_cube(persist=True):
+    """
+    Da chiamare a fine import: aggiorna le sezioni del cubo dei DF cambiati
+    e, se persist, lo salva nello snapshot attivo. Ritorna un messaggio di esito.
+    """
+    try:
+        start_time = time.time()
+        cube = get_cube()
+        if persist:
+            save_cube(get_active_snapshot())
+        rows = ", ".join(f"{name} {len(cube.table(name))}" for name in CUBE_SECTIONS)
+        elapsed = time.time() - start_time
+        return f"Daily cube: {rows} rows in {elapsed:.2f}s."
+    except Exception as E:
+        return f"Error update_cube: {E}"
+
+
+def save_cube(snapshot_name=""):
+    """
+    Aggiorna e salva le sezioni del cubo nella cartella dello snapshot
+    (dopo save_snapshot). Ritorna il nome di CUBE_FILE o None.
+    """
+    get_cube()
+    with _cube_lock:
+        return _cube.save(snapshot_name)
+
+# End of cube_functions.py
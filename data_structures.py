@@ -15,23 +15,77 @@ Strutture Dati Principali:
   - KB_Rules_DF: Regole (riferimento a Conclusioni).
   - KB_Conditions_DF: Condizioni associate a regole.
   - KB_Muscles_DF, KB_Nerves_DF: Tabelle di riferimento anatomico.
+  - SCHEMA_VERSION: Versione dello schema dei DataFrame (scritta nel manifest
+    degli snapshot FEATHER). Da incrementare quando si cambiano le colonne.
+  - IMPORT_INFO: df_name -> {'import_id', 'imported_at'} dell'ultimo import.
+  - DF_GENERATIONS: df_name -> generazione (intero crescente) del DF corrente.
+  - DF_VERSIONS: df_name -> versione del contenuto (hash SHA-256 del file
+    FEATHER se caricato/salvato da snapshot, altrimenti "gen-N").
 
 Procedures/Functions:
-  - (Nessuna funzione in questo file; solo definizioni di DataFrame.)
+  - set_dataframe(df_name, df, version): Sostituisce un DF globale e ne
+    incrementa la generazione (cache derivate invalidate).
+  - get_generation(df_name), get_version(df_name): Generazione/versione corrente.
 
 Modifiche recenti:
   - Aggiunta colonna 'SEX_CODE' in STUDIES (Int32).
   - Cambiato float->Int32 in RULES_CONCLUSIONS_COLUMNS.
   - Aggiunto GENERALIZATION_BL in KB_Conclusions.
   - 2025-01-14: Riconfigurato i commenti per chiarezza in stile Pascal-like.
+  - 2026-10-19: Aggiunti SCHEMA_VERSION e IMPORT_INFO per il manifest snapshot.
+  - 2026-10-19: Generazioni/versioni dei DF (set_dataframe) per le cache
+    costruite sui DataFrame (accesso record, indici, statistiche).
 
 Note:
   - I DataFrame qui definiti sono vuoti all'avvio e vengono
     poi popolati in altre parti del programma (import, etc.).
+  - Per sostituire un DF usare sempre set_dataframe(), così chi tiene una
+    cache sul DF può accorgersi del cambio confrontando la generazione.
 """
 
 import pandas as pd
 
+# -----------------------------------------------------------
+# VERSIONE SCHEMA + INFO IMPORT
+#     SCHEMA_VERSION viene registrata nel manifest degli snapshot
+#     FEATHER; IMPORT_INFO è aggiornato ad ogni import DB/KB.
+# -----------------------------------------------------------
+SCHEMA_VERSION = 1
+IMPORT_INFO = {}
+
+# -----------------------------------------------------------
+# GENERAZIONI / VERSIONI DEI DATAFRAME
+#     La generazione cambia ad ogni set_dataframe(); le cache
+#     derivate la confrontano per sapere se ricostruirsi.
+# -----------------------------------------------------------
+DF_GENERATIONS = {}
+DF_VERSIONS = {}
+_generation_counter = 0
+
+def set_dataframe(df_name, df, version=None):
+    """
+    Sostituisce il DataFrame globale df_name e incrementa la generazione.
+    version identifica il contenuto (es. hash del file FEATHER);
+    se None si usa "gen-N".
+    """
+    global _generation_counter
+    _generation_counter += 1
+    globals()[df_name] = df
+    DF_GENERATIONS[df_name] = _generation_counter
+    DF_VERSIONS[df_name] = version or f"gen-{_generation_counter}"
+
+def get_generation(df_name):
+    """
+    Generazione corrente del DF (0 = mai impostato).
+    """
+    return DF_GENERATIONS.get(df_name, 0)
+
+def get_version(df_name):
+    """
+    Versione del contenuto del DF ("" = DF vuoto iniziale).
+    """
+    return DF_VERSIONS.get(df_name, "")
+
 # -----------------------------------------------------------
 # STUDIES (HIS) 
 #     Contiene informazioni anagrafiche e parametri di uno
@@ -9,15 +9,25 @@ OBIETTIVO:
    e “SIDE_CODE” di Final/Clinical Diagnoses, rimangano float.
  - Utilizzare cast a int/Int32.
  - Aggiunta gestione del nuovo SEX_CODE in Studies_DF.
+ - 2026-10-19: fdb e striprtf importati solo all'interno delle funzioni
+   di import (non più all'avvio dell'applicazione).
+ - 2026-10-19: DF pubblicati con data_structures.set_dataframe() (generazione).
+ - 2026-10-19: import_db_data() registra timestamp e id dell'import
+   (record_import) per il manifest degli snapshot FEATHER.
+ - 2026-10-19: import_db_data() aggiorna l'indice full-text dei referti
+   (solo studi nuovi o cambiati) e lo salva nello snapshot attivo.
+ - 2026-10-19: import_db_data() aggiorna il cubo giornaliero (update_cube),
+   solo in memoria: è salvato con lo snapshot (Download FEATHER).
 
 """
 
-import fdb
 import pandas as pd
 import time
-from striprtf.striprtf import rtf_to_text
 
 import data_structures
+from snapshot_functions import record_import, DB_DF_NAMES
+from fulltext_functions import update_fulltext_index
+from cube_functions import update_cube
 
 database_path = "D:/EuristicDB/EURISTIC.FDB"
 user = "EURISTIC"
@@ -29,6 +39,8 @@ def process_blob(blob):
     """
     if blob is None:
         return None
+    import fdb
+    from striprtf.striprtf import rtf_to_text
     if isinstance(blob, fdb.BlobReader):
         content = blob.read()
         return rtf_to_text(content.decode('utf-8', errors='replace') if isinstance(content, bytes) else content)
@@ -54,6 +66,7 @@ def populate_studies_dataframe():
     """
     start_time = time.time()
     try:
+        import fdb
         with fdb.connect(dsn=database_path, user=user, password=password) as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM GET_STUDIES_NEW")
@@ -87,7 +100,7 @@ def populate_studies_dataframe():
         df["SEX_CODE"]     = pd.to_numeric(df["SEX_CODE"], downcast="integer", errors="coerce").astype("Int32")
         df["STUDY_NUMBER"] = pd.to_numeric(df["STUDY_NUMBER"], downcast="integer", errors="coerce").astype("Int64")
 
-        data_structures.Studies_DF = df
+        data_structures.set_dataframe('Studies_DF', df)
         elapsed = time.time() - start_time
         return f"Studies imported: {len(df)} records in {elapsed:.2f}s."
 
@@ -101,6 +114,7 @@ def populate_rules_conclusions_dataframe():
     """
     start_time = time.time()
     try:
+        import fdb
         with fdb.connect(dsn=database_path, user=user, password=password) as conn:
             cursor = conn.cursor()
             cursor.execute("""
@@ -136,7 +150,7 @@ def populate_rules_conclusions_dataframe():
         df["SITE_CODE"]      = pd.to_numeric(df["SITE_CODE"], downcast="integer", errors="coerce").astype("Int32")
         df["SIDE_CODE"]      = pd.to_numeric(df["SIDE_CODE"], downcast="integer", errors="coerce").astype("Int32")
 
-        data_structures.RulesConclusions_DF = df
+        data_structures.set_dataframe('RulesConclusions_DF', df)
         elapsed = time.time() - start_time
         return f"RulesConclusions: {len(df)} records in {elapsed:.2f}s."
 
@@ -149,6 +163,7 @@ def fetch_final_diagnoses_data():
     """
     start_time = time.time()
     try:
+        import fdb
         with fdb.connect(dsn=database_path, user=user, password=password) as conn:
             cursor = conn.cursor()
             query = """
@@ -188,7 +203,7 @@ def fetch_final_diagnoses_data():
         df["RICO_ID"]   = pd.to_numeric(df["RICO_ID"], downcast="integer", errors="coerce").astype("Int64")
         df["SIDE_CODE"] = pd.to_numeric(df["SIDE_CODE"], downcast="integer", errors="coerce").astype("Int32")
 
-        data_structures.FinalDiagnoses_DF = df
+        data_structures.set_dataframe('FinalDiagnoses_DF', df)
         elapsed = time.time() - start_time
         return f"FinalDiagnoses loaded: {len(df)} records in {elapsed:.2f}s."
 
@@ -201,6 +216,7 @@ def fetch_clinical_diagnoses_data():
     """
     start_time = time.time()
     try:
+        import fdb
         with fdb.connect(dsn=database_path, user=user, password=password) as conn:
             cursor = conn.cursor()
             query = """
@@ -240,7 +256,7 @@ def fetch_clinical_diagnoses_data():
         df["RICO_ID"]   = pd.to_numeric(df["RICO_ID"], downcast="integer", errors="coerce").astype("Int64")
         df["SIDE_CODE"] = pd.to_numeric(df["SIDE_CODE"], downcast="integer", errors="coerce").astype("Int32")
 
-        data_structures.ClinicalDiagnoses_DF = df
+        data_structures.set_dataframe('ClinicalDiagnoses_DF', df)
         elapsed = time.time() - start_time
         return f"ClinicalDiagnoses loaded: {len(df)} records in {elapsed:.2f}s."
 
@@ -262,10 +278,14 @@ def import_db_data():
     msg2 = populate_rules_conclusions_dataframe()
     msg3 = fetch_final_diagnoses_data()
     msg4 = fetch_clinical_diagnoses_data()
+    record_import(DB_DF_NAMES)
+    msg5 = update_fulltext_index(persist=True)
+    # versioni "gen-N" fino al Download FEATHER (save_cube): solo in memoria
+    msg6 = update_cube(persist=False)
 
     elapsed = time.time() - start_time
     return (
-        f"{msg1}\n{msg2}\n{msg3}\n{msg4}\n"
+        f"{msg1}\n{msg2}\n{msg3}\n{msg4}\n{msg5}\n{msg6}\n"
         f"Total import DB time: {elapsed:.2f}s"
     )
 
@@ -6,13 +6,24 @@ Scopo:
   - Pagina "Explore KB": visualizzare la gerarchia delle conclusioni
     (KB_Conclusions_DF) a vari livelli di profondità
     e con la possibilità di mostrare/nascondere le regole.
-  - Consentire di andare a uno specifico concetto digitando il CODE.
+  - Consentire di andare a uno specifico concetto digitando il CODE,
+    oppure di cercare per testo conclusioni, regole e condizioni.
   - Aggiungere i tag: INT, RES, GEN, W, Depth N.
 
 Procedures/Functions/Metodi Principali:
-  - on_enter_page(): Imposta i radio button default e mostra la KB.
-  - show_kb(): Ricostruisce e stampa la gerarchia (livello 1/2/3/all).
-  - goto_concept(): Mostra un certo CODE e la sua catena di genitori.
+  - on_enter_page(): Costruisce l'albero al primo ingresso o se il KB è cambiato.
+  - show_kb(): Ricostruisce l'albero ed espande fino al livello scelto (1/2/3/all).
+  - expand_to_level(level): Espande i nodi dall'indice, senza rileggere i DF.
+  - on_open(): Caricamento dei figli (conclusioni, regole, condizioni)
+    alla prima apertura del nodo.
+  - goto_concept(): CODE numerico -> apre la catena dei genitori e lo
+    seleziona; testo -> search_kb().
+  - search_kb(text): Ricerca approssimata (kb_search_functions) e lista risultati.
+  - on_result_selected(): Mostra nell'albero il nodo scelto nei risultati.
+  - reveal_conclusion(pos) / reveal_rule(pos) / reveal_condition(pos):
+    Aprono la catena dei genitori e selezionano il nodo.
+  - CriterionImpactWindow: impact analysis per CRITERIUM_CODE
+    (regole, conclusioni, numero di studi).
   - compose_tags_for_conclusion(row, df): Crea i tag "[...,Depth N]".
   - get_rules_for_conclusion(code_int): Ritorna le regole.
   - get_conditions_for_rule(rule_id): Ritorna le condition.
@@ -21,44 +32,78 @@ Modifiche recenti:
   - 2025-01-14: Aggiunti "W" se WARNING_BL True e "Depth N".
   - Aggiunti commenti stile Pascal.
 
+  - 2026-10-19: Il dump testuale è sostituito da un Treeview con caricamento
+    dei figli all'apertura del nodo (come ConceptTreeWindow). Regole e
+    condizioni sono caricate solo aprendo il nodo; i livelli 1/2/3/all
+    espandono l'albero dall'indice kb_cache_functions.KBHierarchy.
+    Show/Hide Rules e i livelli non rileggono più i DataFrame.
+  - 2026-10-19: I tag [INT,RES,GEN,W,Depth N] sono precalcolati per tutto il
+    KB (kb_cache_functions, ricalcolati al reload del KB) invece di filtrare
+    i figli di ogni conclusione ad ogni disegno.
+  - 2026-10-19: "Go to Concept" accetta anche testo: ricerca a trigrammi
+    (prefisso/approssimata) su conclusioni, regole e condizioni, con lista
+    dei risultati; la selezione apre il nodo e la catena dei genitori.
+  - 2026-10-19: Pulsante "Criterion Impact": regole e conclusioni che
+    dipendono da uno o più CRITERIUM_CODE e studi che le riportano
+    (indice invertito di kb_impact_functions).
+
 Note:
   - In "compose_tags_for_conclusion" si costruisce ad es. "[INT,RES,GEN,W,Depth 4]"
-  - Espansione ricorsiva con expand_children.
+  - iid dei nodi: "c_<pos>" conclusione, "r_<pos>" regola, "k_<pos>" condizione
+    (pos = posizione nel rispettivo DF); "ph_<iid>" segnaposto "(loading...)".
 """
 
 import tkinter as tk
 from tkinter import ttk
-import data_structures
+import numpy as np
+from kb_cache_functions import get_kb_hierarchy, get_kb_cache
+from kb_search_functions import get_kb_search_index
+from kb_impact_functions import impact_analysis, parse_criteria
+
+KB_SEARCH_LIMIT = 100
 
 class ExploreKBPage(ttk.Frame):
     """
-    Pagina "Explore KB": Radiobutton per i vari livelli,
-    Radiobutton show/hide rules, e un Entry "Go to Concept".
+    Pagina "Explore KB": Treeview della gerarchia, Radiobutton per i
+    livelli di espansione, show/hide rules, e un Entry "Go to Concept".
     """
     def __init__(self, parent):
         super().__init__(parent)
         self.level_var = tk.StringVar(value="1")
         self.rules_var = tk.StringVar(value="HIDE")
+        self.hierarchy = None
 
-        # Frame testuale + scrollbar
-        self.text_frame = ttk.Frame(self)
-        self.text_frame.pack(fill=tk.BOTH, expand=True)
+        # Albero + scrollbar
+        self.tree_frame = ttk.Frame(self)
+        self.tree_frame.pack(fill=tk.BOTH, expand=True)
 
-        self.scrollbar = ttk.Scrollbar(self.text_frame, orient=tk.VERTICAL)
+        self.scrollbar = ttk.Scrollbar(self.tree_frame, orient=tk.VERTICAL)
         self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
-        self.text = tk.Text(self.text_frame, wrap=tk.WORD, yscrollcommand=self.scrollbar.set, height=25)
-        self.text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        self.scrollbar.config(command=self.text.yview)
+        self.tree = ttk.Treeview(self.tree_frame, show="tree", yscrollcommand=self.scrollbar.set)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.config(command=self.tree.yview)
+        self.tree.bind("<<TreeviewOpen>>", self.on_open)
+
+        # Risultati della ricerca testuale
+        self.results_frame = ttk.Frame(self)
+        self.results_frame.pack(side=tk.BOTTOM, fill=tk.X)
+        self.results_scroll = ttk.Scrollbar(self.results_frame, orient=tk.VERTICAL)
+        self.results_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.results_list = tk.Listbox(self.results_frame, height=6, yscrollcommand=self.results_scroll.set)
+        self.results_list.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.results_scroll.config(command=self.results_list.yview)
+        self.results_list.bind("<<ListboxSelect>>", lambda e: self.on_result_selected())
+        self.search_results = None
 
         # Frame bottom con i radio e entry
         self.bottom = ttk.Frame(self)
         self.bottom.pack(side=tk.BOTTOM, fill=tk.X)
 
-        self.rb1 = ttk.Radiobutton(self.bottom, text="1 level", variable=self.level_var, value="1", command=self.show_kb)
-        self.rb2 = ttk.Radiobutton(self.bottom, text="2 levels", variable=self.level_var, value="2", command=self.show_kb)
-        self.rb3 = ttk.Radiobutton(self.bottom, text="3 levels", variable=self.level_var, value="3", command=self.show_kb)
-        self.rb4 = ttk.Radiobutton(self.bottom, text="ALL levels", variable=self.level_var, value="all", command=self.show_kb)
+        self.rb1 = ttk.Radiobutton(self.bottom, text="1 level", variable=self.level_var, value="1", command=self.on_level_changed)
+        self.rb2 = ttk.Radiobutton(self.bottom, text="2 levels", variable=self.level_var, value="2", command=self.on_level_changed)
+        self.rb3 = ttk.Radiobutton(self.bottom, text="3 levels", variable=self.level_var, value="3", command=self.on_level_changed)
+        self.rb4 = ttk.Radiobutton(self.bottom, text="ALL levels", variable=self.level_var, value="all", command=self.on_level_changed)
 
         self.rb1.pack(side=tk.LEFT, padx=5)
         self.rb2.pack(side=tk.LEFT, padx=5)
@@ -70,195 +115,397 @@ class ExploreKBPage(ttk.Frame):
         self.show_rb.pack(side=tk.LEFT, padx=5)
         self.hide_rb.pack(side=tk.LEFT, padx=5)
 
-        self.concept_entry = ttk.Entry(self.bottom, width=6)
+        self.concept_entry = ttk.Entry(self.bottom, width=30)
         self.concept_entry.pack(side=tk.LEFT, padx=5)
+        self.concept_entry.bind("<Return>", lambda e: self.goto_concept())
 
         self.goto_button = ttk.Button(self.bottom, text="Go to Concept", command=self.goto_concept)
         self.goto_button.pack(side=tk.LEFT, padx=5)
 
+        self.impact_button = ttk.Button(self.bottom, text="Criterion Impact", command=lambda: CriterionImpactWindow(self))
+        self.impact_button.pack(side=tk.LEFT, padx=5)
+
+        self.status_var = tk.StringVar(value="")
+        self.status_label = ttk.Label(self.bottom, textvariable=self.status_var)
+        self.status_label.pack(side=tk.LEFT, padx=5)
+
         # Tag di stile
-        self.text.tag_config("blue_conclusion", foreground="blue")
-        self.text.tag_config("green_rule", foreground="green")
-        self.text.tag_config("brown_condition", foreground="#8B4513")
+        self.tree.tag_configure("blue_conclusion", foreground="blue")
+        self.tree.tag_configure("green_rule", foreground="green")
+        self.tree.tag_configure("brown_condition", foreground="#8B4513")
 
     def on_enter_page(self):
-        self.level_var.set("1")
-        self.rules_var.set("HIDE")
-        self.show_kb()
+        # L'albero è ricostruito solo al primo ingresso o se il KB è cambiato
+        if self.hierarchy is None or self.hierarchy is not get_kb_hierarchy():
+            self.level_var.set("1")
+            self.rules_var.set("HIDE")
+            self.show_kb()
+            self.clear_results()
+        # Indice di ricerca preparato in idle (no-op se già aggiornato)
+        self.after_idle(get_kb_search_index)
+
+    def on_level_changed(self):
+        self.collapse_all()
+        self.expand_to_level(self.level_var.get())
 
     def show_kb(self):
         """
-        Ricostruisce e stampa la gerarchia KB in base alle impostazioni
-        (level_var, rules_var).
+        Ricostruisce l'albero (solo le radici) ed espande fino al livello
+        scelto (level_var). I nodi più profondi sono caricati all'apertura.
         """
-        df = data_structures.KB_Conclusions_DF
-        self.text.delete("1.0", tk.END)
-        if df.empty:
-            self.text.insert(tk.END, "No KB data.\n")
+        self.hierarchy = get_kb_hierarchy()
+        self.tree.delete(*self.tree.get_children())
+        self.status_var.set("")
+        if self.hierarchy.conclusions.empty:
+            self.tree.insert("", tk.END, text="No KB data.")
             return
-
-        self.text.insert(tk.END, "Explore KB:\n\n")
-        parents = df[(df['PARENT_ID'] == 0) | (df['PARENT_ID'].isnull())]
-        max_level = self.level_var.get()
-        show_rules = (self.rules_var.get() == "SHOW")
-
-        results = []
-        for _, rowp in parents.iterrows():
-            code = rowp['CODE']
-            name = rowp['STR'] or "NoName"
-            tagp = self.compose_tags_for_conclusion(rowp, df)
-            results.append((0, name, code, tagp, "conclusion"))
-
-            if show_rules:
-                rlist = self.get_rules_for_conclusion(code)
-                for (rid, rstr) in rlist:
-                    results.append((1, "Rule: " + rstr, rid, "", "rule"))
-                    cdf = self.get_conditions_for_rule(rid)
-                    for _, crow in cdf.iterrows():
-                        results.append((2, crow['DESCR'] or "(no descr)", None, "", "condition"))
-
-            if max_level == "1":
-                results.extend(self.expand_children(rowp['ID'], df, 1, "1", show_rules))
-            elif max_level == "2":
-                results.extend(self.expand_children(rowp['ID'], df, 1, "2", show_rules))
-            elif max_level == "3":
-                results.extend(self.expand_children(rowp['ID'], df, 1, "3", show_rules))
-            else:  # "all"
-                results.extend(self.expand_children(rowp['ID'], df, 1, "all", show_rules))
-
-        # Stampa i risultati
-        for (lvl, txt, maybe_code, extra_tag, kind) in results:
-            indent = "   " * lvl
-            if kind == "conclusion":
-                self.text.insert(tk.END, indent)
-                self.text.insert(tk.END, txt, "blue_conclusion")
-                if extra_tag:
-                    self.text.insert(tk.END, f" {extra_tag}", "blue_conclusion")
-                if maybe_code is not None:
-                    self.text.insert(tk.END, f" ({maybe_code})\n", "blue_conclusion")
-                else:
-                    self.text.insert(tk.END, "\n", "blue_conclusion")
-            elif kind == "rule":
-                self.text.insert(tk.END, indent)
-                self.text.insert(tk.END, txt + "\n", "green_rule")
-            else:  # condition
-                self.text.insert(tk.END, indent)
-                self.text.insert(tk.END, txt + "\n", "brown_condition")
-
-        self.text.insert(tk.END, "\n")
-
+        for pos in self.hierarchy.roots:
+            self.insert_conclusion("", pos)
+        self.expand_to_level(self.level_var.get())
+
+    # ------------------------------------------------------------
+    # NODI
+    # ------------------------------------------------------------
+    def insert_conclusion(self, parent_iid, pos):
+        df = self.hierarchy.conclusions
+        row = df.iloc[pos]
+        name = row['STR'] or "NoName"
+        tagp = get_kb_cache().display_tags.iat[pos]
+        label = f"{name} {tagp} ({row['CODE']})" if tagp else f"{name} ({row['CODE']})"
+        iid = f"c_{pos}"
+        self.tree.insert(parent_iid, tk.END, iid=iid, text=label, tags=("blue_conclusion",))
+        if self.has_children(iid):
+            self.tree.insert(iid, tk.END, iid=f"ph_{iid}", text="(loading...)")
+        return iid
+
+    def has_children(self, iid):
+        kind, pos = iid[0], int(iid[2:])
+        h = self.hierarchy
+        if kind == "c":
+            row = h.conclusions.iloc[pos]
+            if len(h.child_positions(row['ID'])) > 0:
+                return True
+            return self.rules_var.get() == "SHOW" and len(h.rule_positions(row['CODE'])) > 0
+        if kind == "r":
+            return len(h.condition_positions(h.rules_df['ID'].iat[pos])) > 0
+        return False
+
+    def populate_children(self, iid):
+        """
+        Inserisce i figli del nodo: per una conclusione prima le regole
+        (se Show Rules) poi le sotto-conclusioni; per una regola le condizioni.
+        """
+        kind, pos = iid[0], int(iid[2:])
+        h = self.hierarchy
+        if kind == "c":
+            row = h.conclusions.iloc[pos]
+            if self.rules_var.get() == "SHOW":
+                for rpos in h.rule_positions(row['CODE']):
+                    rstr = h.rules_df['STR'].iat[rpos] or "(no rule name)"
+                    riid = f"r_{rpos}"
+                    self.tree.insert(iid, tk.END, iid=riid, text=f"Rule: {rstr}", tags=("green_rule",))
+                    if self.has_children(riid):
+                        self.tree.insert(riid, tk.END, iid=f"ph_{riid}", text="(loading...)")
+            for cpos in h.child_positions(row['ID']):
+                self.insert_conclusion(iid, cpos)
+        elif kind == "r":
+            for kpos in h.condition_positions(h.rules_df['ID'].iat[pos]):
+                descr = h.conditions_df['DESCR'].iat[kpos] or "(no descr)"
+                self.tree.insert(iid, tk.END, iid=f"k_{kpos}", text=descr, tags=("brown_condition",))
+
+    def ensure_populated(self, iid):
+        placeholder = f"ph_{iid}"
+        if self.tree.exists(placeholder):
+            self.tree.delete(placeholder)
+            self.populate_children(iid)
+
+    def on_open(self, event):
+        self.ensure_populated(self.tree.focus())
+
+    # ------------------------------------------------------------
+    # ESPANSIONE PER LIVELLI
+    # ------------------------------------------------------------
+    def collapse_all(self):
+        stack = list(self.tree.get_children())
+        while stack:
+            iid = stack.pop()
+            if self.tree.item(iid, "open"):
+                self.tree.item(iid, open=False)
+                stack.extend(self.tree.get_children(iid))
+
+    def expand_to_level(self, level):
+        """
+        Apre le conclusioni fino alla profondità level (le radici sono a 0):
+        "1" mostra radici e figli diretti, "all" tutta la gerarchia.
+        I figli sono presi dall'indice KBHierarchy (nessun filtro sui DF);
+        le regole restano chiuse e le condizioni non sono caricate.
+        """
+        max_depth = None if level == "all" else int(level)
+        frontier = [iid for iid in self.tree.get_children() if iid.startswith("c_")]
+        depth = 0
+        opened = 0
+        while frontier and (max_depth is None or depth < max_depth):
+            next_frontier = []
+            for iid in frontier:
+                self.ensure_populated(iid)
+                children = [c for c in self.tree.get_children(iid) if c.startswith("c_")]
+                if children or self.tree.get_children(iid):
+                    self.tree.item(iid, open=True)
+                    opened += 1
+                next_frontier.extend(children)
+            frontier = next_frontier
+            depth += 1
+        self.status_var.set(f"{opened} nodes expanded")
+
+    # ------------------------------------------------------------
+    # GO TO CONCEPT
+    # ------------------------------------------------------------
     def goto_concept(self):
-        code_str = self.concept_entry.get().strip()
-        self.text.delete("1.0", tk.END)
-        if not code_str.isdigit() or len(code_str) > 5:
-            self.text.insert(tk.END, "Invalid code. Must be integer up to 5 digits.\n")
+        text = self.concept_entry.get().strip()
+        if not text:
+            self.status_var.set("Enter a CODE or text to search.")
             return
-
-        code_int = int(code_str)
-        df = data_structures.KB_Conclusions_DF
-        row = df.loc[df['CODE'] == code_int]
-        if row.empty:
-            self.text.insert(tk.END, f"No conclusion with CODE={code_int}\n")
+        if not text.isdigit():
+            self.search_kb(text)
+            return
+        if len(text) > 5:
+            self.status_var.set("Invalid code. Must be integer up to 5 digits.")
             return
 
-        show_rules = (self.rules_var.get() == "SHOW")
-        chain = []
-        current_id = row.iloc[0]['ID']
+        code_int = int(text)
+        if self.hierarchy is None:
+            self.show_kb()
+        pos = self.hierarchy.pos_by_code.get(code_int)
+        if pos is None:
+            self.status_var.set(f"No conclusion with CODE={code_int}")
+            return
+        if self.reveal_conclusion(pos, open_rules=True):
+            depth = len(self.hierarchy.ancestors(pos)) - 1
+            self.status_var.set(f"CODE={code_int}: depth {depth}")
 
-        def find_by_id(idx):
-            return df.loc[df['ID'] == idx]
+    def select_node(self, iid):
+        self.tree.selection_set(iid)
+        self.tree.focus(iid)
+        self.tree.see(iid)
 
-        # Risali la catena dei genitori
-        while True:
-            r = find_by_id(current_id)
-            if r.empty:
-                break
-            chain.insert(0, r.iloc[0])
-            parent_id = r.iloc[0]['PARENT_ID']
-            if parent_id <= 0:
+    def reveal_conclusion(self, pos, open_rules=False, select=True):
+        """
+        Apre la catena dei genitori (dall'indice) fino alla conclusione pos.
+        Ritorna False se il nodo non è raggiungibile da una radice.
+        """
+        chain = self.hierarchy.ancestors(pos)
+        for anc in chain[:-1]:
+            iid = f"c_{anc}"
+            if not self.tree.exists(iid):
                 break
-            current_id = parent_id
-
-        # Stampa
-        for node in chain:
-            c_code = node['CODE']
-            name = node['STR'] or "NoName"
-            tagp = self.compose_tags_for_conclusion(node, df)
-            self.text.insert(tk.END, f"{name}({c_code}) {tagp}\n", "blue_conclusion")
-
-            if show_rules:
-                rlist = self.get_rules_for_conclusion(c_code)
-                for (rid, rstr) in rlist:
-                    self.text.insert(tk.END, f"   Rule: {rstr}\n", "green_rule")
-                    cdf = self.get_conditions_for_rule(rid)
-                    for _, crow in cdf.iterrows():
-                        self.text.insert(tk.END, f"      {crow['DESCR']}\n", "brown_condition")
-            self.text.insert(tk.END, "\n")
-
-    def compose_tags_for_conclusion(self, row, df_all):
+            self.ensure_populated(iid)
+            self.tree.item(iid, open=True)
+        target = f"c_{pos}"
+        if not self.tree.exists(target):
+            code = self.hierarchy.conclusions['CODE'].iat[pos]
+            self.status_var.set(f"CODE={code} is not reachable from a root conclusion.")
+            return False
+        if open_rules and self.rules_var.get() == "SHOW":
+            self.ensure_populated(target)
+            self.tree.item(target, open=True)
+        if select:
+            self.select_node(target)
+        return True
+
+    def reveal_rule(self, rpos, select=True):
+        """
+        Mostra la regola rpos sotto la sua conclusione (CONCLUSION_CODE);
+        attiva "Show Rules" se le regole sono nascoste.
+        """
+        if self.rules_var.get() != "SHOW":
+            self.rules_var.set("SHOW")
+            self.show_kb()
+        h = self.hierarchy
+        pos = h.pos_by_code.get(h.rules_df['CONCLUSION_CODE'].iat[rpos])
+        if pos is None:
+            self.status_var.set("Rule without a conclusion in the KB.")
+            return False
+        if not self.reveal_conclusion(pos, open_rules=True, select=False):
+            return False
+        target = f"r_{rpos}"
+        if not self.tree.exists(target):
+            return False
+        if select:
+            self.select_node(target)
+        return True
+
+    def reveal_condition(self, kpos):
+        h = self.hierarchy
+        rule_id = h.conditions_df['RULE_ID'].iat[kpos]
+        rule_pos = np.flatnonzero(h.rules_df['ID'].to_numpy() == rule_id)
+        if len(rule_pos) == 0:
+            self.status_var.set("Condition without a rule in the KB.")
+            return False
+        rpos = int(rule_pos[0])
+        if not self.reveal_rule(rpos, select=False):
+            return False
+        self.ensure_populated(f"r_{rpos}")
+        self.tree.item(f"r_{rpos}", open=True)
+        target = f"k_{kpos}"
+        if not self.tree.exists(target):
+            return False
+        self.select_node(target)
+        return True
+
+    # ------------------------------------------------------------
+    # RICERCA TESTUALE
+    # ------------------------------------------------------------
+    def clear_results(self):
+        self.results_list.delete(0, tk.END)
+        self.search_results = None
+
+    def search_kb(self, text):
+        """
+        Ricerca per prefisso/approssimata su STR delle conclusioni e delle
+        regole e su DESCR delle condizioni; i risultati (ordinati per
+        punteggio) sono elencati sotto l'albero.
+        """
+        if self.hierarchy is None:
+            self.show_kb()
+        results = get_kb_search_index().search(text, limit=KB_SEARCH_LIMIT)
+        self.clear_results()
+        self.search_results = results
+        for kind, txt, score in zip(results['KIND'], results['TEXT'], results['SCORE']):
+            self.results_list.insert(tk.END, f"{kind:<10} {score:5.2f}  {txt}")
+        if results.empty:
+            self.status_var.set(f"No KB text matches '{text}'")
+            return
+        self.status_var.set(f"{len(results)} matches for '{text}'")
+        self.results_list.selection_set(0)
+        self.on_result_selected()
+
+    def on_result_selected(self):
+        sel = self.results_list.curselection()
+        if not sel or self.search_results is None:
+            return
+        row = self.search_results.iloc[sel[0]]
+        kind, pos = row['KIND'], int(row['POSITION'])
+        if self.hierarchy is not get_kb_hierarchy():
+            # KB ricaricato: le posizioni dei risultati non sono più valide
+            self.show_kb()
+            self.clear_results()
+            self.status_var.set("KB reloaded, search again.")
+            return
+        if kind == "conclusion":
+            self.reveal_conclusion(pos)
+        elif kind == "rule":
+            self.reveal_rule(pos)
+        else:
+            self.reveal_condition(pos)
+
+    def compose_tags_for_conclusion(self, row, df_all=None):
         """
-        Ritorna stringa di tag, es: "[INT,RES,GEN,W,Depth 4]"
+        Ritorna stringa di tag, es: "[INT,RES,GEN,W,Depth 4]".
+        I tag di tutte le conclusioni sono precalcolati in un solo passaggio
+        (kb_cache_functions.compute_display_tags) e riletti per ID.
         """
-        tags = []
-        # INT se SHOW_IN_REPORTS_BL == False
-        if not row.get('SHOW_IN_REPORTS_BL'):
-            tags.append("INT")
-        # RES se RESERVED_BL
-        if row.get('RESERVED_BL'):
-            tags.append("RES")
-        # GEN se c'è figlio con SET_PARENT_TRUE_BL
-        crows = df_all[df_all['PARENT_ID'] == row['ID']]
-        if not crows.empty and any(crows['SET_PARENT_TRUE_BL']):
-            tags.append("GEN")
-        # W se WARNING_BL
-        if row.get('WARNING_BL'):
-            tags.append("W")
-        # Depth
-        depth_val = row.get('DEPTH', 0)
-        tags.append(f"Depth {depth_val}")
-
-        if tags:
-            return "[" + ",".join(tags) + "]"
-        return ""
+        return get_kb_cache().display_tags_by_id.get(row['ID'], "")
 
     def get_rules_for_conclusion(self, code_int):
-        df_rules = data_structures.KB_Rules_DF
-        sub = df_rules[df_rules['CONCLUSION_CODE'] == code_int].sort_values('RANK')
+        h = get_kb_hierarchy()
         results = []
-        for _, rowr in sub.iterrows():
-            rid = rowr['ID']
-            rstr = rowr['STR'] or "(no rule name)"
+        for rpos in h.rule_positions(code_int):
+            rid = h.rules_df['ID'].iat[rpos]
+            rstr = h.rules_df['STR'].iat[rpos] or "(no rule name)"
             results.append((rid, rstr))
         return results
 
     def get_conditions_for_rule(self, rule_id):
-        df_cond = data_structures.KB_Conditions_DF
-        csub = df_cond[df_cond['RULE_ID'] == rule_id].sort_values('RANK')
-        return csub
+        h = get_kb_hierarchy()
+        return h.conditions_df.iloc[h.condition_positions(rule_id)]
 
-    def expand_children(self, parent_id, df, level, max_level, show_rules):
-        """
-        Espansione ricorsiva dei figli in base a max_level ("1","2","3","all").
-        Ritorna una lista di tuple (lvl, text, code, extratag, kind).
-        """
-        lines = []
-        child_rows = df[df['PARENT_ID'] == parent_id]
-        for _, child in child_rows.iterrows():
-            c_code = child['CODE']
-            name = child['STR'] or "NoName"
-            tagp = self.compose_tags_for_conclusion(child, df)
-            lines.append((level, name, c_code, tagp, "conclusion"))
-
-            if show_rules:
-                rlist = self.get_rules_for_conclusion(c_code)
-                for (rid, rstr) in rlist:
-                    lines.append((level+1, f"Rule: {rstr}", rid, "", "rule"))
-                    cdf = self.get_conditions_for_rule(rid)
-                    for _, crow in cdf.iterrows():
-                        lines.append((level+2, crow['DESCR'] or "(no descr)", None, "", "condition"))
-
-            if max_level == "all" or (max_level.isdigit() and level < int(max_level)):
-                lines.extend(self.expand_children(child['ID'], df, level+1, max_level, show_rules))
-        return lines
+
+class CriterionImpactWindow(tk.Toplevel):
+    """
+    Impact analysis: dati uno o più CRITERIUM_CODE, elenca le regole che li
+    usano e le conclusioni prodotte, con il numero di studi che le riportano.
+    Doppio click su una riga: mostra la regola / conclusione nell'albero.
+    """
+    def __init__(self, page):
+        super().__init__(page)
+        self.page = page
+        self.result = None
+        self.title("Criterion Impact")
+        self.geometry("900x500")
+
+        top = ttk.Frame(self)
+        top.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Label(top, text="Criterion codes:").pack(side=tk.LEFT)
+        self.entry = ttk.Entry(top, width=30)
+        self.entry.pack(side=tk.LEFT, padx=5)
+        self.entry.bind("<Return>", lambda e: self.run())
+        ttk.Button(top, text="Analyze", command=self.run).pack(side=tk.LEFT)
+        self.summary_var = tk.StringVar(value="")
+        ttk.Label(top, textvariable=self.summary_var).pack(side=tk.LEFT, padx=10)
+
+        self.conclusions_list = self._make_list("Conclusions (CODE, studies, rules, name)")
+        self.rules_list = self._make_list("Rules (ID, number, conclusion, criteria, name)")
+        self.conclusions_list.bind("<Double-Button-1>", self.on_conclusion)
+        self.rules_list.bind("<Double-Button-1>", self.on_rule)
+        self.entry.focus_set()
+
+    def _make_list(self, title):
+        ttk.Label(self, text=title).pack(anchor=tk.W, padx=5)
+        frame = ttk.Frame(self)
+        frame.pack(fill=tk.BOTH, expand=True)
+        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        listbox = tk.Listbox(frame, yscrollcommand=scrollbar.set, font=("Courier", 10))
+        listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.config(command=listbox.yview)
+        return listbox
+
+    def run(self):
+        try:
+            criteria = parse_criteria(self.entry.get())
+        except ValueError as e:
+            self.summary_var.set(str(e))
+            return
+        r = impact_analysis(criteria)
+        self.result = r
+        self.conclusions_list.delete(0, tk.END)
+        self.rules_list.delete(0, tk.END)
+        for code, name, n_rules, n_studies in r['conclusions'][['CODE', 'STR', 'N_RULES', 'N_STUDIES']].itertuples(index=False):
+            self.conclusions_list.insert(tk.END, f"{code:>6}  {n_studies:>8}  {n_rules:>4}  {name}")
+        for row in r['rules'].itertuples(index=False):
+            active = "" if row.ACTIVE_BL else " (inactive)"
+            self.rules_list.insert(
+                tk.END,
+                f"{row.RULE_ID:>7}  {row.RULE_NUMBER!s:>6}  {row.CONCLUSION_CODE:>6}  "
+                f"[{row.CRITERIA}]  {row.STR}{active}"
+            )
+        summary = (f"{len(r['rules'])} rule(s), {len(r['conclusions'])} conclusion(s), "
+                   f"{r['n_studies']} studies ({r['elapsed'] * 1000:.0f} ms)")
+        if r['missing']:
+            summary += f" - unused: {', '.join(str(c) for c in r['missing'])}"
+        self.summary_var.set(summary)
+
+    def on_conclusion(self, event=None):
+        sel = self.conclusions_list.curselection()
+        if not sel or self.result is None:
+            return
+        page = self.page
+        if page.hierarchy is not get_kb_hierarchy():
+            page.show_kb()
+        pos = page.hierarchy.pos_by_code.get(self.result['conclusions']['CODE'].iat[sel[0]])
+        if pos is not None:
+            page.reveal_conclusion(pos)
+
+    def on_rule(self, event=None):
+        sel = self.rules_list.curselection()
+        if not sel or self.result is None:
+            return
+        page = self.page
+        if page.hierarchy is not get_kb_hierarchy():
+            page.show_kb()
+        rule_id = self.result['rules']['RULE_ID'].iat[sel[0]]
+        rule_pos = np.flatnonzero(page.hierarchy.rules_df['ID'].to_numpy() == rule_id)
+        if len(rule_pos):
+            page.reveal_rule(int(rule_pos[0]))
 
 # End of explore_kb_page.py
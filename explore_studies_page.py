@@ -10,8 +10,10 @@ Scopo:
 Procedures/Functions/Classi Principali:
 - ExploreStudiesPage(ttk.Frame):
     * Radiobutton per All/Only in report, Show/Hide muscle/nerve, Show/Hide warning.
-    * Goto Study, pulsanti di navigazione (first, prev, next, last).
+    * Ricerca studi (Search), pulsanti di navigazione (first, prev, next, last).
     * show_record() che filtra e stampa i dati.
+- SearchResultsWindow(tk.Toplevel): elenco dei risultati dell'ultima ricerca.
+- PatientTimelineWindow(tk.Toplevel): studi di un paziente affiancati.
 
 Modifiche recenti:
 - 2025-01-14:
@@ -54,25 +56,71 @@ Note:
 - Se i tasti freccia non funzionano, potrebbe essere necessario 
   cliccare manualmente sul Frame. O in Windows, a volte bisogna 
   cliccare dentro la Text area. 
+
+Modifiche recenti (2026-10-19):
+ 1) on_enter_page() non converte più Studies_DF con to_dict('records'):
+    i record sono letti dal DF colonnare con StudyRecordAccessor.
+ 2) La posizione corrente è mantenuta tra un cambio tab e l'altro;
+    l'accessor si ricostruisce solo se cambia la generazione di Studies_DF.
+ 3) "Go to Study" sostituito da una casella di ricerca su StudyLookupIndex:
+    STUDY_NUMBER (senza limite di cifre), rico:, anag:, study:, una data
+    o un intervallo date:a..b. Con più risultati (stesso paziente,
+    intervallo di date, STUDY_NUMBER ripetuti) si scorre con ◀ Match / Match ▶.
+ 4) Ricerca full-text nei referti con "text:<query>" (fulltext_functions):
+    i risultati sono ordinati per punteggio e scorribili con ◀ Match / Match ▶;
+    "Results" mostra l'elenco (SearchResultsWindow), doppio click apre lo studio.
+ 5) show_record() non copia più RulesConclusions_DF e non ricalcola i codici
+    validi dal KB: i filtri All/Only in Report e Show/Hide Warning usano
+    le LUT per CODE di kb_cache_functions (un gather per studio).
+ 6) Il testo dello studio è composto da study_report_functions.compose_study()
+    e inserito con una sola insert() + tag_add() per range. I testi sono in
+    una RenderCache (RICO_ID, modalità, generazioni dei DF) e gli studi vicini
+    (±PREFETCH_DISTANCE) sono precomposti con after_idle: tenendo premute
+    le frecce la navigazione non ricalcola nulla.
+ 7) "Export...": export di tutti gli studi (o dei risultati della ricerca)
+    in text/HTML/JSONL con study_report_functions.export_studies() (pool di
+    processi, blocchi di RICO_ID); a fine export è mostrato il throughput.
+ 8) "Patient Timeline": tutte le visite del paziente (ANAG_ID) in ordine di
+    data, con le conclusioni finali affiancate e le variazioni tra visite
+    (study_report_functions.patient_timeline). Click sull'intestazione di
+    una visita: mostra lo studio.
 """
 
+import os
+import queue
+import threading
 import tkinter as tk
-from tkinter import ttk
+from tkinter import ttk, filedialog, messagebox
+import numpy as np
 import pandas as pd
-import data_structures
-from utils import (
-    interpret_side_code,
-    get_conclusion_str,
-    get_muscle_str,
-    get_nerve_str
+from study_functions import StudyRecordAccessor, get_lookup_index
+from fulltext_functions import search_studies
+from study_report_functions import (
+    compose_study,
+    render_generations,
+    RenderCache,
+    export_studies,
+    patient_timeline
 )
+from memory_profiler_functions import begin_operation, end_operation
+
+# Numero di studi precomposti prima e dopo quello corrente
+PREFETCH_DISTANCE = 3
+
+EXPORT_EXTENSIONS = {".txt": "text", ".html": "html", ".htm": "html", ".jsonl": "jsonl"}
 
 class ExploreStudiesPage(ttk.Frame):
     def __init__(self, parent):
         super().__init__(parent)
-        self.data = []
+        # Accessor colonnare su Studies_DF (niente to_dict('records'))
+        self.records = StudyRecordAccessor()
         self.index = 0
 
+        # Testi composti (RenderCache) e prefetch degli studi vicini
+        self.render_cache = RenderCache()
+        self.prefetch_queue = []
+        self.prefetch_job = None
+
         self.mode_var = tk.StringVar(value="ONLY_FINAL")
         self.muscle_nerve_var = tk.StringVar(value="HIDE_MN")
         self.warning_var = tk.StringVar(value="HIDE_WARN")
@@ -93,12 +141,44 @@ class ExploreStudiesPage(ttk.Frame):
         self.last_btn = ttk.Button(self.top_frame, text="⏭", command=self.show_last, state=tk.DISABLED)
         self.last_btn.pack(side=tk.LEFT, padx=5)
 
-        self.study_entry = ttk.Entry(self.top_frame, width=6)
+        # Ricerca: STUDY_NUMBER, rico:, anag:, study:, data o date:a..b
+        self.study_entry = ttk.Entry(self.top_frame, width=28)
         self.study_entry.pack(side=tk.LEFT, padx=5)
+        self.study_entry.bind("<Return>", lambda e: self.goto_study())
 
-        self.goto_study_btn = ttk.Button(self.top_frame, text="Go to Study", command=self.goto_study)
+        self.goto_study_btn = ttk.Button(self.top_frame, text="Search", command=self.goto_study)
         self.goto_study_btn.pack(side=tk.LEFT, padx=5)
 
+        self.prev_match_btn = ttk.Button(self.top_frame, text="◀ Match", command=lambda: self.show_match(-1), state=tk.DISABLED)
+        self.prev_match_btn.pack(side=tk.LEFT, padx=2)
+
+        self.next_match_btn = ttk.Button(self.top_frame, text="Match ▶", command=lambda: self.show_match(1), state=tk.DISABLED)
+        self.next_match_btn.pack(side=tk.LEFT, padx=2)
+
+        self.results_btn = ttk.Button(self.top_frame, text="Results", command=self.show_results, state=tk.DISABLED)
+        self.results_btn.pack(side=tk.LEFT, padx=2)
+
+        self.export_btn = ttk.Button(self.top_frame, text="Export...", command=self.do_export)
+        self.export_btn.pack(side=tk.RIGHT, padx=5)
+
+        self.timeline_btn = ttk.Button(self.top_frame, text="Patient Timeline", command=self.show_patient_timeline)
+        self.timeline_btn.pack(side=tk.RIGHT, padx=5)
+
+        self.match_var = tk.StringVar(value="e.g. 123, rico:456, anag:78, 2024-03-01..2024-03-31, text:\"tunnel carpale\"")
+        self.match_label = ttk.Label(self.top_frame, textvariable=self.match_var)
+        self.match_label.pack(side=tk.LEFT, padx=5)
+
+        # Risultati dell'ultima ricerca (posizioni in Studies_DF)
+        self.search_hits = []
+        self.search_scores = None
+        self.hit_index = 0
+        self.search_desc = ""
+        self.results_window = None
+
+        # Export in background (thread + coda letta con after)
+        self.export_queue = queue.Queue()
+        self.export_thread = None
+
         # bottom rbuttons
         self.bottom_rbuttons_frame = ttk.Frame(self)
         self.bottom_rbuttons_frame.pack(side=tk.TOP, fill=tk.X, pady=5)
@@ -178,9 +258,15 @@ class ExploreStudiesPage(ttk.Frame):
         self.focus_set()
         self.event_generate("<FocusIn>")
 
-        df = data_structures.Studies_DF
-        self.data = df.to_dict('records')
-        self.index = 0
+        # Ricostruiamo l'accessor solo se Studies_DF è cambiato;
+        # in quel caso restiamo (se possibile) sullo stesso RICO_ID.
+        current_rico = None
+        if 0 <= self.index < len(self.records):
+            current_rico = self.records.value(self.index, 'RICO_ID')
+        if self.records.refresh():
+            self.set_search_hits([], "")
+            pos = self.records.find_position('RICO_ID', current_rico)
+            self.index = pos if pos is not None else 0
         self.show_record()
 
     def on_left_arrow(self, event):
@@ -190,18 +276,72 @@ class ExploreStudiesPage(ttk.Frame):
         self.show_next()
 
     def goto_study(self):
-        val_str = self.study_entry.get().strip()
-        self.text.delete("1.0", tk.END)
-        if not val_str.isdigit() or len(val_str) > 5:
-            self.text.insert(tk.END, "Invalid STUDY_NUMBER (max 5 digits)\n")
+        """
+        Cerca con StudyLookupIndex (hash map / indice date) e mostra il
+        primo risultato; con più risultati si scorre con ◀ Match / Match ▶.
+        """
+        query = self.study_entry.get().strip()
+        self.records.refresh()
+        scores = None
+        try:
+            if query.lower().startswith("text:"):
+                # Full-text sui referti: risultati ordinati per punteggio
+                result = search_studies(query[len("text:"):])
+                hits, scores = result['POSITION'].tolist(), result['SCORE'].tolist()
+                desc = f"text {query[len('text:'):].strip()}"
+            else:
+                hits, desc = get_lookup_index().search(query)
+        except ValueError as E:
+            self.set_search_hits([], "")
+            self.text.delete("1.0", tk.END)
+            self.text.insert(tk.END, f"{E}\n")
+            return
+        self.set_search_hits(list(hits), desc, scores)
+        if not self.search_hits:
+            self.text.delete("1.0", tk.END)
+            self.text.insert(tk.END, f"No study found with {desc}\n")
+            return
+        self.show_match(0)
+
+    def set_search_hits(self, hits, desc, scores=None):
+        self.search_hits = hits
+        self.search_scores = scores
+        self.hit_index = 0
+        self.search_desc = desc
+        state = tk.NORMAL if len(hits) > 1 else tk.DISABLED
+        self.prev_match_btn.config(state=state)
+        self.next_match_btn.config(state=state)
+        self.results_btn.config(state=tk.NORMAL if hits else tk.DISABLED)
+        self.match_var.set(f"{desc}: {len(hits)} match(es)" if desc else "")
+        if self.results_window is not None and self.results_window.winfo_exists():
+            self.results_window.destroy()
+        self.results_window = None
+
+    def show_results(self):
+        """
+        Apre l'elenco dei risultati dell'ultima ricerca.
+        """
+        if not self.search_hits:
             return
-        val_int = int(val_str)
-        for i, rec in enumerate(self.data):
-            if rec.get('STUDY_NUMBER') == val_int:
-                self.index = i
-                self.show_record()
-                return
-        self.text.insert(tk.END, f"No study found with STUDY_NUMBER={val_int}\n")
+        if self.results_window is not None and self.results_window.winfo_exists():
+            self.results_window.lift()
+            return
+        self.results_window = SearchResultsWindow(self)
+
+    def show_match(self, step, absolute=False):
+        """
+        Si sposta di step risultati (ciclico) e mostra lo studio;
+        con absolute=True step è l'indice del risultato.
+        """
+        if not self.search_hits:
+            return
+        if absolute:
+            self.hit_index = step
+        else:
+            self.hit_index = (self.hit_index + step) % len(self.search_hits)
+        self.index = int(self.search_hits[self.hit_index])
+        self.match_var.set(f"{self.search_desc}: match {self.hit_index + 1}/{len(self.search_hits)}")
+        self.show_record()
 
     def show_first(self):
         self.index = 0
@@ -213,139 +353,282 @@ class ExploreStudiesPage(ttk.Frame):
             self.show_record()
 
     def show_next(self):
-        if self.index < len(self.data) - 1:
+        if self.index < len(self.records) - 1:
             self.index += 1
             self.show_record()
 
     def show_last(self):
-        self.index = len(self.data) - 1
+        self.index = len(self.records) - 1
         self.show_record()
 
-    def show_record(self):
-        if not (0 <= self.index < len(self.data)):
+    def show_patient_timeline(self):
+        """
+        Apre la timeline del paziente (ANAG_ID) dello studio corrente.
+        """
+        if not (0 <= self.index < len(self.records)):
             return
+        anag_id = self.records.value(self.index, 'ANAG_ID')
+        if anag_id is None:
+            messagebox.showinfo("Patient Timeline", "This study has no ANAG_ID.")
+            return
+        PatientTimelineWindow(self, int(anag_id))
 
-        record = self.data[self.index]
-        self.text.delete("1.0", tk.END)
-
-        study_number = record.get('STUDY_NUMBER')
-        self.text.insert(tk.END, "\n")
-        self.text.insert(tk.END, f"Study Number: {study_number}\n", "title_tag")
-
-        only_in_report = (self.mode_var.get() == "ONLY_FINAL")
-        show_mn = (self.muscle_nerve_var.get() == "ALL_MN")
-        show_warn = (self.warning_var.get() == "SHOW_WARN")
-
-        rc_df = data_structures.RulesConclusions_DF.copy()
-        if 'CONCLUSION_CODE' in rc_df.columns and 'CODE' not in rc_df.columns:
-            rc_df.rename(columns={'CONCLUSION_CODE': 'CODE'}, inplace=True)
-        subset = rc_df[rc_df['RICO_ID'] == record.get('RICO_ID')]
-
-        df_kb = data_structures.KB_Conclusions_DF
-        if not df_kb.empty:
-            if only_in_report:
-                valid_codes = df_kb[df_kb['SHOW_IN_REPORTS_BL'] == True]['CODE'].unique()
-                subset = subset[subset['CODE'].isin(valid_codes)]
-            if not show_warn:
-                non_warn_codes = df_kb[df_kb['WARNING_BL'] == False]['CODE'].unique()
-                subset = subset[subset['CODE'].isin(non_warn_codes)]
-
-        final_impressions = record.get('FINAL_IMPRESSIONS') or ""
-        c_df = data_structures.ClinicalDiagnoses_DF
-        csub = c_df[c_df['RICO_ID'] == record.get('RICO_ID')]
-        clinical_list = []
-        for _, rowd in csub.iterrows():
-            side_str = interpret_side_code(rowd.get('SIDE_CODE', None))
-            diag_str = rowd.get('STR', "(no clinical diag)")
-            if side_str:
-                diag_str += side_str
-            clinical_list.append(diag_str)
-
-        f_df = data_structures.FinalDiagnoses_DF
-        fsub = f_df[f_df['RICO_ID'] == record.get('RICO_ID')]
-        finaldiag_list = []
-        for _, rowd in fsub.iterrows():
-            side_str = interpret_side_code(rowd.get('SIDE_CODE', None))
-            diag_str = rowd.get('STR', "(no final diag)")
-            if side_str:
-                diag_str += side_str
-            finaldiag_list.append(diag_str)
-
-        final_rows = subset[subset.get('GROUP_CODE', 0) == 1]
-        final_list = []
-        for _, rowc in final_rows.iterrows():
-            c_str = get_conclusion_str(rowc['CODE'])
-            side_str = interpret_side_code(rowc.get('SIDE_CODE', None))
-            item = c_str
-            if side_str:
-                item += side_str
-            final_list.append(item)
-
-        muscle_list = []
-        nerve_list = []
-        if show_mn:
-            muscle_rows = subset[subset.get('GROUP_CODE', 0) == 2]
-            for _, rowc in muscle_rows.iterrows():
-                c_str = get_conclusion_str(rowc['CODE'])
-                side_str = interpret_side_code(rowc.get('SIDE_CODE', None))
-                site_code = rowc.get('SITE_CODE', None)
-                if pd.notna(site_code):
-                    muscle_name = get_muscle_str(site_code)
-                else:
-                    muscle_name = "UnknownMuscle"
-                text_item = c_str + f", {muscle_name}"
-                if side_str:
-                    text_item += side_str
-                muscle_list.append(text_item)
-
-            nerve_rows = subset[subset.get('GROUP_CODE', 0) == 3]
-            for _, rowc in nerve_rows.iterrows():
-                c_str = get_conclusion_str(rowc['CODE'])
-                side_str = interpret_side_code(rowc.get('SIDE_CODE', None))
-                site_code = rowc.get('SITE_CODE', None)
-                if pd.notna(site_code):
-                    nerve_name = get_nerve_str(site_code)
-                else:
-                    nerve_name = "UnknownNerve"
-                text_item = c_str + f", {nerve_name}"
-                if side_str:
-                    text_item += side_str
-                nerve_list.append(text_item)
-
-        final_report = record.get('FINAL_REPORT') or ""
-
-        def print_title(tt, tag="title_tag"):
-            self.text.insert(tk.END, "\n")
-            self.text.insert(tk.END, tt + "\n", tag)
-
-        # Stampa
-        print_title("FINAL IMPRESSIONS")
-        self.text.insert(tk.END, final_impressions + "\n")
-
-        print_title("CLINICAL DIAGNOSES")
-        self.text.insert(tk.END, "\n".join(clinical_list) + "\n")
-
-        print_title("FINAL DIAGNOSES")
-        self.text.insert(tk.END, "\n".join(finaldiag_list) + "\n")
-
-        print_title("FINAL CONCLUSIONS", "red_title")
-        self.text.insert(tk.END, "\n".join(final_list) + "\n")
+    def goto_position(self, pos):
+        self.index = int(pos)
+        self.show_record()
 
-        if show_mn:
-            print_title("SINGLE MUSCLE CONCLUSIONS", "red_title")
-            if muscle_list:
-                self.text.insert(tk.END, "\n".join(muscle_list) + "\n")
+    def do_export(self):
+        """
+        Esporta tutti gli studi (o i risultati della ricerca) in text/HTML/JSONL
+        con la modalità di visualizzazione corrente, in un thread secondario
+        (export_studies usa un pool di processi).
+        """
+        if self.export_thread is not None and self.export_thread.is_alive():
+            return
+        filename = filedialog.asksaveasfilename(
+            title="Export Studies", defaultextension=".txt",
+            filetypes=[("Text", "*.txt"), ("HTML", "*.html"), ("JSON Lines", "*.jsonl")]
+        )
+        if not filename:
+            return
+        fmt = EXPORT_EXTENSIONS.get(os.path.splitext(filename)[1].lower(), "text")
+        positions = None
+        if self.search_hits and messagebox.askyesno(
+            "Export Studies",
+            f"Export only the {len(self.search_hits)} search results?\n(No = all studies)"
+        ):
+            positions = list(self.search_hits)
+
+        kwargs = {
+            'fmt': fmt,
+            'positions': positions,
+            'only_in_report': self.mode_var.get() == "ONLY_FINAL",
+            'show_mn': self.muscle_nerve_var.get() == "ALL_MN",
+            'show_warn': self.warning_var.get() == "SHOW_WARN",
+            'progress': lambda done, total: self.export_queue.put(('progress', done, total))
+        }
+
+        def run():
+            token = begin_operation("Export Studies")
+            try:
+                self.export_queue.put(('done', export_studies(filename, **kwargs)))
+            except Exception as E:
+                self.export_queue.put(('error', str(E)))
+            finally:
+                end_operation(token)
+
+        self.export_btn.config(state=tk.DISABLED)
+        self.match_var.set(f"Exporting to {os.path.basename(filename)}...")
+        self.export_thread = threading.Thread(target=run, name="StudyExport", daemon=True)
+        self.export_thread.start()
+        self.after(200, self.poll_export)
+
+    def poll_export(self):
+        finished = False
+        while True:
+            try:
+                item = self.export_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item[0] == 'progress':
+                self.match_var.set(f"Exporting... {item[1]}/{item[2]} studies")
+            elif item[0] == 'done':
+                r = item[1]
+                self.match_var.set(
+                    f"Exported {r['studies']} studies in {r['elapsed']:.1f}s "
+                    f"({r['rate']:.0f} studies/s, {r['workers']} workers)"
+                )
+                finished = True
+            else:
+                self.match_var.set(f"Export error: {item[1]}")
+                finished = True
+        if finished:
+            self.export_btn.config(state=tk.NORMAL)
+        else:
+            self.after(200, self.poll_export)
+
+    def render_key(self, pos):
+        """
+        Chiave della RenderCache per lo studio in posizione pos
+        con la modalità di visualizzazione corrente.
+        """
+        return (
+            self.records.value(pos, 'RICO_ID'),
+            self.mode_var.get() == "ONLY_FINAL",
+            self.muscle_nerve_var.get() == "ALL_MN",
+            self.warning_var.get() == "SHOW_WARN",
+            render_generations()
+        )
 
-            print_title("SINGLE NERVE CONCLUSIONS", "red_title")
-            if nerve_list:
-                self.text.insert(tk.END, "\n".join(nerve_list) + "\n")
+    def render(self, pos):
+        """
+        (text, tags) dello studio in posizione pos, dalla cache o composto.
+        """
+        key = self.render_key(pos)
+        rendered = self.render_cache.get(key)
+        if rendered is None:
+            _, only_in_report, show_mn, show_warn, _ = key
+            rendered = compose_study(self.records.get(pos), only_in_report, show_mn, show_warn)
+            self.render_cache.put(key, rendered)
+        return rendered
 
-        print_title("FINAL REPORT")
-        self.text.insert(tk.END, final_report + "\n")
+    def show_record(self):
+        if not (0 <= self.index < len(self.records)):
+            return
 
-        print_title("VARIABLES")
-        for k in ["RICO_ID", "ANAG_ID", "SERVICE_ID"]:
-            val = record.get(k, "")
-            self.text.insert(tk.END, f"{k}: {val}\n")
+        text, tags = self.render(self.index)
+        # Una sola insert del testo composto, poi i tag per range di caratteri
+        self.text.delete("1.0", tk.END)
+        self.text.insert("1.0", text)
+        for tag, start, end in tags:
+            self.text.tag_add(tag, f"1.0+{start}c", f"1.0+{end}c")
+        self.schedule_prefetch()
+
+    def schedule_prefetch(self):
+        """
+        Accoda la composizione degli studi vicini (±PREFETCH_DISTANCE)
+        da eseguire con after_idle, uno per callback.
+        """
+        if self.prefetch_job is not None:
+            self.after_cancel(self.prefetch_job)
+        n = len(self.records)
+        self.prefetch_queue = [
+            self.index + d
+            for k in range(1, PREFETCH_DISTANCE + 1)
+            for d in (k, -k)
+            if 0 <= self.index + d < n
+        ]
+        self.prefetch_job = self.after_idle(self.prefetch_step)
+
+    def prefetch_step(self):
+        self.prefetch_job = None
+        while self.prefetch_queue:
+            pos = self.prefetch_queue.pop(0)
+            if self.render_key(pos) not in self.render_cache:
+                self.render(pos)
+                break
+        if self.prefetch_queue:
+            self.prefetch_job = self.after_idle(self.prefetch_step)
+
+class SearchResultsWindow(tk.Toplevel):
+    """
+    Elenco dei risultati dell'ultima ricerca di ExploreStudiesPage
+    (numero studio, data, RICO_ID, punteggio, inizio delle impressioni).
+    Doppio click o Invio: mostra lo studio nella pagina.
+    """
+    MAX_ROWS = 1000
+    SNIPPET_LEN = 80
+
+    def __init__(self, page):
+        super().__init__(page)
+        self.page = page
+        self.title(f"Search Results - {page.search_desc}")
+        self.geometry("900x400")
+
+        hits = page.search_hits[:self.MAX_ROWS]
+        ttk.Label(self, text=f"{len(page.search_hits)} match(es)"
+                  + (f", first {len(hits)} shown" if len(hits) < len(page.search_hits) else "")).pack(anchor=tk.W, padx=5)
+
+        frame = ttk.Frame(self)
+        frame.pack(fill=tk.BOTH, expand=True)
+        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox = tk.Listbox(frame, yscrollcommand=scrollbar.set, font=("Courier", 10))
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.config(command=self.listbox.yview)
+
+        records = page.records
+        for i, pos in enumerate(hits):
+            date = records.value(pos, 'STUDY_DATE')
+            date_str = date.strftime("%Y-%m-%d") if date is not None else "----------"
+            impressions = (records.value(pos, 'FINAL_IMPRESSIONS') or "").replace("\n", " ")
+            score = f"{page.search_scores[i]:6.2f}" if page.search_scores else ""
+            self.listbox.insert(
+                tk.END,
+                f"Study {records.value(pos, 'STUDY_NUMBER')!s:>6}  {date_str}  "
+                f"RICO {records.value(pos, 'RICO_ID')!s:>8}  {score}  {impressions[:self.SNIPPET_LEN]}"
+            )
+
+        self.listbox.bind("<Double-Button-1>", self.on_open)
+        self.listbox.bind("<Return>", self.on_open)
+
+    def on_open(self, event=None):
+        sel = self.listbox.curselection()
+        if sel:
+            self.page.show_match(sel[0], absolute=True)
+
+
+class PatientTimelineWindow(tk.Toplevel):
+    """
+    Timeline di un paziente: una colonna per visita (data + numero studio),
+    una riga per conclusione finale. Celle:
+      "●"  presente            "+●" comparsa rispetto alla visita precedente
+      "−"  scomparsa rispetto alla visita precedente
+    Sotto, l'elenco testuale delle variazioni tra visite consecutive.
+    Usa la modalità di visualizzazione (in report / warning) della pagina.
+    """
+    def __init__(self, page, anag_id):
+        super().__init__(page)
+        self.page = page
+        self.title(f"Patient Timeline - ANAG_ID {anag_id}")
+        self.geometry("1100x600")
+
+        tl = patient_timeline(
+            anag_id,
+            page.mode_var.get() == "ONLY_FINAL",
+            page.warning_var.get() == "SHOW_WARN"
+        )
+        visits = tl['visits']
+        matrix, added, removed = tl['matrix'], tl['added'], tl['removed']
+
+        ttk.Label(self, text=f"{len(visits)} studies, {len(tl['labels'])} distinct final conclusions "
+                             "(click a study header to open it)").pack(anchor=tk.W, padx=5, pady=2)
+
+        tree_frame = ttk.Frame(self)
+        tree_frame.pack(fill=tk.BOTH, expand=True)
+        columns = [f"v{i}" for i in range(len(visits))]
+        self.tree = ttk.Treeview(tree_frame, columns=columns, show="tree headings")
+        self.tree.heading("#0", text="Conclusion")
+        self.tree.column("#0", width=320, stretch=False)
+        for i, row in visits.iterrows():
+            date = row['STUDY_DATE']
+            date_str = pd.Timestamp(date).strftime("%Y-%m-%d") if pd.notna(date) else "?"
+            self.tree.heading(
+                columns[i], text=f"{date_str} #{row['STUDY_NUMBER']}",
+                command=lambda pos=row['POSITION']: self.page.goto_position(pos)
+            )
+            self.tree.column(columns[i], width=110, anchor=tk.CENTER, stretch=False)
+
+        for j, label in enumerate(tl['labels']):
+            cells = []
+            for i in range(len(visits)):
+                if matrix[i, j]:
+                    cells.append("+●" if i > 0 and added[i - 1, j] else "●")
+                elif i > 0 and removed[i - 1, j]:
+                    cells.append("−")
+                else:
+                    cells.append("")
+            self.tree.insert("", tk.END, text=label, values=cells)
+
+        xscroll = ttk.Scrollbar(tree_frame, orient=tk.HORIZONTAL, command=self.tree.xview)
+        yscroll = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(xscrollcommand=xscroll.set, yscrollcommand=yscroll.set)
+        yscroll.pack(side=tk.RIGHT, fill=tk.Y)
+        xscroll.pack(side=tk.BOTTOM, fill=tk.X)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.text = tk.Text(self, height=10, wrap=tk.WORD)
+        self.text.pack(fill=tk.X)
+        labels = tl['labels']
+        for i in range(1, len(visits)):
+            plus = [labels[j] for j in np.flatnonzero(added[i - 1])]
+            minus = [labels[j] for j in np.flatnonzero(removed[i - 1])]
+            if not plus and not minus:
+                continue
+            heading = self.tree.heading(columns[i], "text")
+            self.text.insert(tk.END, f"{heading}: " + "; ".join(
+                [f"+ {x}" for x in plus] + [f"- {x}" for x in minus]) + "\n")
+        if len(visits) < 2:
+            self.text.insert(tk.END, "Only one study for this patient.\n")
 
 # End of explore_studies_page.py
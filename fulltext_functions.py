@@ -0,0 +1,398 @@
+"""
+Filename: fulltext_functions.py
+===============================
+
+Scopo:
+  - Ricerca full-text sui testi dei referti (FINAL_IMPRESSIONS + FINAL_REPORT
+    di Studies_DF, già convertiti da RTF in fase di import).
+  - Indice invertito colonnare (termine -> studi, frequenze), aggiornato in
+    modo incrementale: vengono ritokenizzati solo gli studi nuovi o con
+    testo cambiato, quelli non più presenti sono rimossi.
+  - L'indice è salvato su disco accanto ai file FEATHER dello snapshot
+    (FULLTEXT_FILE) e riletto al primo utilizzo.
+
+Procedures/Functions/Classi Principali:
+  - tokenize(text): lista di token normalizzati (minuscolo, \\w+).
+  - FullTextIndex: indice invertito (update, search, save, load).
+  - parse_fulltext_query(text): clausole OR di termini/frasi/negazioni.
+  - get_fulltext_index(): indice allineato allo Studies_DF corrente.
+  - update_fulltext_index(persist): aggiornamento dopo l'import (messaggio).
+  - save_fulltext_index(snapshot_name): salva l'indice nello snapshot.
+
+Sintassi query:
+  - parole separate da spazio: AND   (es. neuropatia assonale)
+  - "..." : frase esatta             (es. "sindrome del tunnel carpale")
+  - OR    : alternativa tra clausole (es. radicolopatia OR plessopatia)
+  - -parola o NOT parola: esclusione (es. neuropatia -diabetica)
+  - parola* : prefisso               (es. demielin*)
+  I risultati sono ordinati per punteggio BM25.
+
+Modifiche recenti:
+  - 2026-10-19: Creazione del modulo.
+
+Note:
+  - Le frasi sono risolte come AND dei termini sull'indice e poi
+    verificate sul testo normalizzato dei soli studi candidati.
+  - Ogni documento è identificato da RICO_ID e ha un hash del testo
+    (pd.util.hash_pandas_object): così l'indice su disco si riallinea
+    da solo anche se appartiene a un import diverso da quello caricato.
+"""
+
+import os
+import re
+import itertools
+import time
+import logging
+
+import numpy as np
+import pandas as pd
+
+import data_structures
+from snapshot_functions import snapshot_folder, get_active_snapshot
+
+logger = logging.getLogger(__name__)
+
+FULLTEXT_FILE = "fulltext_index.npz"
+FULLTEXT_VERSION = 1
+TEXT_COLUMNS = ["FINAL_IMPRESSIONS", "FINAL_REPORT"]
+MAX_TOKEN_LEN = 40
+
+# Parametri BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_RE = re.compile(r"\w+")
+QUERY_RE = re.compile(r'(-?)"([^"]*)"|(\S+)')
+
+
+def tokenize(text):
+    """
+    Token normalizzati del testo (minuscolo, sequenze \\w+ fino a MAX_TOKEN_LEN).
+    """
+    if not text:
+        return []
+    return [t for t in TOKEN_RE.findall(text.lower()) if len(t) <= MAX_TOKEN_LEN]
+
+
+def study_texts(df):
+    """
+    Series (stesso indice di df) con il testo indicizzato di ogni studio.
+    """
+    texts = pd.Series("", index=df.index, dtype=object)
+    for col in TEXT_COLUMNS:
+        if col in df.columns:
+            texts = texts + " " + df[col].fillna("").astype(str)
+    return texts
+
+
+class FullTextIndex:
+    """
+    Indice invertito colonnare:
+      - documenti: rico_ids, doc_len (numero di token), doc_hash (hash del testo);
+      - vocabolario: terms (ordinato);
+      - postings ordinati per (termine, documento): post_term, post_doc, post_tf;
+      - offsets[t]:offsets[t+1] è l'intervallo dei postings del termine t.
+    generation è la generazione di Studies_DF con cui l'indice è allineato.
+    """
+    def __init__(self):
+        self.rico_ids = np.empty(0, dtype=np.int64)
+        self.doc_len = np.empty(0, dtype=np.int32)
+        self.doc_hash = np.empty(0, dtype=np.uint64)
+        self.terms = np.empty(0, dtype=str)
+        self.post_term = np.empty(0, dtype=np.int32)
+        self.post_doc = np.empty(0, dtype=np.int32)
+        self.post_tf = np.empty(0, dtype=np.int32)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.generation = None
+
+    def __len__(self):
+        return len(self.rico_ids)
+
+    # ------------------------------------------------------------------
+    # COSTRUZIONE / AGGIORNAMENTO
+    # ------------------------------------------------------------------
+    def update(self, df, generation=None):
+        """
+        Allinea l'indice a df (Studies_DF). Ritorna (added, removed):
+        numero di studi ritokenizzati e di studi rimossi.
+        """
+        df = df.dropna(subset=['RICO_ID']) if 'RICO_ID' in df.columns else df.iloc[0:0]
+        texts = study_texts(df)
+        ricos = df['RICO_ID'].astype('int64').to_numpy() if len(df) else np.empty(0, dtype=np.int64)
+        hashes = pd.util.hash_pandas_object(texts, index=False).to_numpy() if len(df) else np.empty(0, dtype=np.uint64)
+
+        # Documenti da tenere: stesso RICO_ID e stesso hash del testo
+        last = ~pd.Series(ricos).duplicated(keep='last').to_numpy()
+        current = pd.Index(ricos[last])
+        pos = current.get_indexer(self.rico_ids)
+        keep = pos >= 0
+        keep[keep] = hashes[last][pos[keep]] == self.doc_hash[keep]
+        removed = int((~keep).sum())
+
+        # Un solo documento per RICO_ID (l'ultimo), se non già tenuto
+        new_mask = last & ~np.isin(ricos, self.rico_ids[keep])
+        new_texts = texts[new_mask]
+        added = int(new_mask.sum())
+
+        # Postings dei documenti tenuti, con id documento rinumerati
+        doc_remap = np.cumsum(keep) - 1
+        post_keep = keep[self.post_doc]
+        old_terms = self.terms[self.post_term[post_keep]]
+        old_docs = doc_remap[self.post_doc[post_keep]]
+        old_tf = self.post_tf[post_keep]
+
+        # Tokenizzazione dei soli documenti nuovi/cambiati
+        n_kept = int(keep.sum())
+        tokens = new_texts.map(tokenize)
+        doc_len_new = tokens.map(len).to_numpy(dtype=np.int32)
+        pairs = pd.DataFrame({
+            'TERM': list(itertools.chain.from_iterable(tokens)),
+            'DOC': np.repeat(np.arange(n_kept, n_kept + added), doc_len_new)
+        })
+        tf = pairs.groupby(['TERM', 'DOC'], sort=False).size()
+        new_terms = tf.index.get_level_values('TERM').to_numpy(dtype=str)
+        new_docs = tf.index.get_level_values('DOC').to_numpy(dtype=np.int64)
+        new_tf = tf.to_numpy(dtype=np.int32)
+
+        all_terms_str = np.concatenate([old_terms.astype(str), new_terms])
+        self.terms = np.unique(all_terms_str)
+        term_ids = np.searchsorted(self.terms, all_terms_str).astype(np.int32)
+        docs = np.concatenate([old_docs, new_docs]).astype(np.int32)
+        tfs = np.concatenate([old_tf, new_tf]).astype(np.int32)
+        order = np.lexsort((docs, term_ids))
+        self.post_term = term_ids[order]
+        self.post_doc = docs[order]
+        self.post_tf = tfs[order]
+        self.offsets = np.searchsorted(self.post_term, np.arange(len(self.terms) + 1)).astype(np.int64)
+
+        self.rico_ids = np.concatenate([self.rico_ids[keep], ricos[new_mask]]).astype(np.int64)
+        self.doc_len = np.concatenate([self.doc_len[keep], doc_len_new]).astype(np.int32)
+        self.doc_hash = np.concatenate([self.doc_hash[keep], hashes[new_mask]]).astype(np.uint64)
+        self.generation = generation
+        return added, removed
+
+    # ------------------------------------------------------------------
+    # PERSISTENZA
+    # ------------------------------------------------------------------
+    def save(self, filename):
+        """
+        Salva l'indice (npz non compresso, scrittura atomica).
+        """
+        tmp_path = filename + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            version=np.array([FULLTEXT_VERSION]),
+            rico_ids=self.rico_ids, doc_len=self.doc_len, doc_hash=self.doc_hash,
+            terms=self.terms, post_term=self.post_term,
+            post_doc=self.post_doc, post_tf=self.post_tf
+        )
+        os.replace(tmp_path, filename)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Legge l'indice salvato con save(). Ritorna None se il file non esiste
+        o è di una versione diversa.
+        """
+        if not os.path.exists(filename):
+            return None
+        with np.load(filename, allow_pickle=False) as data:
+            if int(data['version'][0]) != FULLTEXT_VERSION:
+                return None
+            index = cls()
+            for key in ('rico_ids', 'doc_len', 'doc_hash', 'terms', 'post_term', 'post_doc', 'post_tf'):
+                setattr(index, key, data[key])
+        index.offsets = np.searchsorted(index.post_term, np.arange(len(index.terms) + 1)).astype(np.int64)
+        return index
+
+    # ------------------------------------------------------------------
+    # INTERROGAZIONE
+    # ------------------------------------------------------------------
+    def term_ids(self, term):
+        """
+        Id dei termini: esatto, oppure tutti i termini con il prefisso se term finisce con '*'.
+        """
+        if term.endswith("*"):
+            prefix = term[:-1]
+            if not prefix:
+                return np.empty(0, dtype=np.int64)
+            i = np.searchsorted(self.terms, prefix, side='left')
+            j = np.searchsorted(self.terms, prefix + "\uffff", side='left')
+            return np.arange(i, j)
+        i = np.searchsorted(self.terms, term)
+        if i < len(self.terms) and self.terms[i] == term:
+            return np.array([i])
+        return np.empty(0, dtype=np.int64)
+
+    def postings(self, term):
+        """
+        (documenti, tf) del termine (con prefisso: tf sommati per documento).
+        """
+        ids = self.term_ids(term)
+        if len(ids) == 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+        if len(ids) == 1:
+            a, b = self.offsets[ids[0]], self.offsets[ids[0] + 1]
+            return self.post_doc[a:b], self.post_tf[a:b]
+        idx = np.concatenate([np.arange(self.offsets[t], self.offsets[t + 1]) for t in ids])
+        docs, inv = np.unique(self.post_doc[idx], return_inverse=True)
+        return docs, np.bincount(inv, weights=self.post_tf[idx]).astype(np.int32)
+
+    def search(self, query, texts_by_rico=None, limit=None):
+        """
+        Esegue la query. texts_by_rico(ricos) -> testi, usato per verificare le frasi.
+        Ritorna un DataFrame (RICO_ID, SCORE) ordinato per punteggio decrescente.
+        """
+        clauses = parse_fulltext_query(query)
+        n_docs = len(self.rico_ids)
+        scores = np.zeros(n_docs, dtype=np.float64)
+        matched = np.zeros(n_docs, dtype=bool)
+        avg_len = self.doc_len.mean() if n_docs else 0.0
+
+        for clause in clauses:
+            mask = np.ones(n_docs, dtype=bool)
+            clause_scores = np.zeros(n_docs, dtype=np.float64)
+            has_positive = False
+            for negated, words, is_phrase in clause:
+                term_mask = np.ones(n_docs, dtype=bool)
+                for word in words:
+                    docs, tf = self.postings(word)
+                    word_mask = np.zeros(n_docs, dtype=bool)
+                    word_mask[docs] = True
+                    term_mask &= word_mask
+                    if not negated and len(docs):
+                        idf = np.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len[docs] / max(avg_len, 1e-9))
+                        clause_scores[docs] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+                if is_phrase and len(words) > 1 and texts_by_rico is not None:
+                    cand = np.flatnonzero(term_mask & mask)
+                    phrase = " " + " ".join(words) + " "
+                    texts = texts_by_rico(self.rico_ids[cand])
+                    ok = np.array([phrase in " " + " ".join(tokenize(t)) + " " for t in texts], dtype=bool)
+                    term_mask = np.zeros(n_docs, dtype=bool)
+                    term_mask[cand[ok]] = True
+                if negated:
+                    mask &= ~term_mask
+                else:
+                    mask &= term_mask
+                    has_positive = True
+            if not has_positive:
+                continue  # solo negazioni: clausola ignorata
+            matched |= mask
+            scores = np.where(mask, np.maximum(scores, clause_scores), scores)
+
+        hits = np.flatnonzero(matched)
+        order = hits[np.argsort(-scores[hits], kind='stable')]
+        if limit is not None:
+            order = order[:limit]
+        return pd.DataFrame({'RICO_ID': self.rico_ids[order], 'SCORE': scores[order]})
+
+
+def parse_fulltext_query(text):
+    """
+    Ritorna la lista delle clausole (OR); ogni clausola è una lista di
+    (negated, words, is_phrase). Solleva ValueError se la query è vuota.
+    """
+    clauses = [[]]
+    negate_next = False
+    for m in QUERY_RE.finditer(text or ""):
+        neg_phrase, phrase, word = m.groups()
+        if word is not None:
+            if word == "OR":
+                clauses.append([])
+                continue
+            if word == "NOT":
+                negate_next = True
+                continue
+            negated = negate_next or word.startswith("-")
+            word = word.lstrip("-").lower()
+            words = [word] if word.endswith("*") else tokenize(word)
+            if words:
+                clauses[-1].append((negated, words, len(words) > 1))
+        else:
+            words = tokenize(phrase)
+            if words:
+                clauses[-1].append((negate_next or neg_phrase == "-", words, True))
+        negate_next = False
+    clauses = [c for c in clauses if c]
+    if not clauses:
+        raise ValueError("Empty full-text query")
+    return clauses
+
+
+_fulltext_index = None
+
+
+def fulltext_filename(snapshot_name=None):
+    if snapshot_name is None:
+        snapshot_name = get_active_snapshot()
+    return os.path.join(snapshot_folder(snapshot_name), FULLTEXT_FILE)
+
+
+def get_fulltext_index():
+    """
+    Indice allineato a Studies_DF corrente. Al primo utilizzo legge
+    l'indice dello snapshot attivo (se esiste); poi aggiorna in modo
+    incrementale solo se la generazione di Studies_DF è cambiata.
+    """
+    global _fulltext_index
+    gen = data_structures.get_generation("Studies_DF")
+    if _fulltext_index is None:
+        t0 = time.perf_counter()
+        _fulltext_index = FullTextIndex.load(fulltext_filename()) or FullTextIndex()
+        logger.info("Full-text index loaded (%d studies) in %.2fs", len(_fulltext_index), time.perf_counter() - t0)
+    if _fulltext_index.generation != gen:
+        t0 = time.perf_counter()
+        added, removed = _fulltext_index.update(data_structures.Studies_DF, gen)
+        logger.info("Full-text index updated (+%d/-%d studies) in %.2fs", added, removed, time.perf_counter() - t0)
+    return _fulltext_index
+
+
+def save_fulltext_index(snapshot_name=None):
+    """
+    Salva l'indice corrente nella cartella dello snapshot. Ritorna il nome file.
+    """
+    filename = fulltext_filename(snapshot_name)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    get_fulltext_index().save(filename)
+    return filename
+
+
+def update_fulltext_index(persist=True):
+    """
+    Da chiamare dopo l'import di Studies_DF: aggiorna l'indice
+    (solo studi nuovi/cambiati) e, se persist, lo salva nello snapshot attivo.
+    Ritorna un messaggio di esito.
+    """
+    try:
+        start_time = time.time()
+        index = get_fulltext_index()
+        if persist:
+            save_fulltext_index()
+        elapsed = time.time() - start_time
+        return f"Full-text index: {len(index)} studies, {len(index.terms)} terms in {elapsed:.2f}s."
+    except Exception as E:
+        return f"Error update_fulltext_index: {E}"
+
+
+def search_studies(query, limit=None):
+    """
+    Cerca negli studi di Studies_DF. Ritorna DataFrame (RICO_ID, SCORE, POSITION)
+    con POSITION = posizione in Studies_DF (per Explore Studies).
+    """
+    from study_functions import get_lookup_index
+    lookup = get_lookup_index()
+    df = data_structures.Studies_DF
+
+    def positions_of(ricos):
+        return [int(lookup.lookup('RICO_ID', int(r))[0]) for r in ricos]
+
+    def texts_by_rico(ricos):
+        # Solo i candidati: si leggono le righe puntuali del DF colonnare
+        return study_texts(df.iloc[positions_of(ricos)]).tolist()
+
+    result = get_fulltext_index().search(query, texts_by_rico, limit=limit)
+    result['POSITION'] = positions_of(result['RICO_ID'])
+    return result
+
+# End of fulltext_functions.py
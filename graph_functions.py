@@ -11,24 +11,39 @@ Scopo:
 
 Procedures/Functions:
   - build_graph(): Ritorna un DiGraph con nodi conc_ID e case_rico.
-  - save_graph(G, filename): Salva G con pickle.
-  - load_graph(filename): Ritorna un graph dal pickle.
+  - update_graph(G): Aggiorna sul posto un grafo di build_graph dopo un import.
+  - save_graph(G, filename): Salva G con pickle (formato precedente).
+  - load_graph(filename): Ritorna un graph dal pickle (solo file fidati).
   - get_graph_stats(G): Ritorna stringa con statistiche (num nodi, archi, etc.).
 
 Modifiche Recenti:
   - 2025-01-14: Aggiunta la sezione usage_count (study_set) per i concetti.
     Arricchiti i commenti e docstring in stile Pascal.
+  - 2026-10-19: networkx importato dentro build_graph() (import differito).
+  - 2026-10-19: build_graph() vettoriale: un join CODE -> ID al posto della
+    scansione del KB per ogni riga di RulesConclusions_DF, study_set con un
+    groupby, add_nodes_from/add_edges_from. La versione precedente è in
+    benchmark_functions (build_graph_legacy) per il confronto.
+  - 2026-10-19: build_graph() è una vista networkx della matrice di
+    incidenza studi x concetti (graph_matrix_functions.ConceptMatrix).
+  - 2026-10-19: Il salvataggio del grafo usa ConceptMatrix.save/load
+    (formato colonnare versionato); save_graph/load_graph restano per i
+    vecchi file pickle.
+  - 2026-10-19: update_graph(G): dopo un import delta il grafo è
+    aggiornato sul posto (ConceptMatrix.update + patch_networkx) invece di
+    essere ricostruito; G.graph['generation'] indica i dati che riflette.
 
 Note:
   - Per completare la mappatura CODE->ID si usa il KB_Conclusions_DF 
     (campo CODE e ID). Le relazioni "IS-A" e "CASE-OF" sono dirette in un DiGraph.
   - L’utente può poi usare networkx per altre analisi.
+  - Le righe di RulesConclusions_DF con RICO_ID nullo sono escluse (prima
+    generavano un nodo "case_<NA>" e contavano in usage_count).
 """
 
-import networkx as nx
 import pickle
-import pandas as pd
 import data_structures
+from graph_matrix_functions import get_concept_matrix
 
 def build_graph():
     """
@@ -38,82 +53,40 @@ def build_graph():
       - Nodi "case_{rico}" (type="case") -> provenienti da RulesConclusions_DF
       - Archi "IS-A" (tra conc_{pid} e conc_{cid}) e "CASE-OF" (tra case_{rico} e conc_{cid}).
       - usage_count = len(study_set) per ogni conc_{cid}.
+    Il grafo è una vista della matrice di incidenza (get_concept_matrix).
     """
-    G = nx.DiGraph()
+    import networkx as nx
 
     kb_df = data_structures.KB_Conclusions_DF
     rc_df = data_structures.RulesConclusions_DF
 
     # Se mancano dati, grafo vuoto
     if kb_df.empty or rc_df.empty:
-        return G
+        return nx.DiGraph()
 
-    # 1) calcoliamo usage_count = n distinct RICO_ID per each CODE
-    rccopy = rc_df.copy()
-    if 'CONCLUSION_CODE' in rccopy.columns and 'CODE' not in rccopy.columns:
-        rccopy.rename(columns={'CONCLUSION_CODE': 'CODE'}, inplace=True)
-    grp = rccopy.groupby('CODE')['RICO_ID'].nunique().reset_index(name='distinct_rico')
-    rc_count = pd.Series(grp.distinct_rico.values, index=grp['CODE']).to_dict()
-
-    # 2) Creiamo nodi concept
-    for _, row in kb_df.iterrows():
-        cid = row['ID']
-        code_ = row.get('CODE', None)
-        usage = rc_count.get(code_, 0) if code_ else 0
-
-        node_name = f"conc_{cid}"
-        G.add_node(
-            node_name,
-            type="concept",
-            STR = row.get('STR', f"Concept {cid}"),
-            CODE = code_ if code_ else "?",
-            SHOW_IN_REPORTS_BL = bool(row.get('SHOW_IN_REPORTS_BL', False)),
-            GENERALIZATION_BL = bool(row.get('GENERALIZATION_BL', False)),
-            SET_PARENT_TRUE_BL = bool(row.get('SET_PARENT_TRUE_BL', False)),
-            RESERVED_BL = bool(row.get('RESERVED_BL', False)),
-            PARENT_ID = row.get('PARENT_ID', 0),
-            study_set = set(),
-            usage_count = usage
-        )
-
-    # 3) Archi IS-A
-    for _, row in kb_df.iterrows():
-        cid = row['ID']
-        pid = row.get('PARENT_ID', 0)
-        if pid and pid>0:
-            parent_node = f"conc_{pid}"
-            child_node  = f"conc_{cid}"
-            if parent_node in G and child_node in G:
-                G.add_edge(parent_node, child_node, relation="IS-A")
-
-    # 4) Nodi case_{rico} e archi CASE-OF
-    if 'CONCLUSION_CODE' in rc_df.columns and 'CODE' not in rc_df.columns:
-        rc_df = rc_df.rename(columns={'CONCLUSION_CODE': 'CODE'})
-
-    for rico in rc_df['RICO_ID'].unique():
-        case_node = f"case_{rico}"
-        G.add_node(case_node, type="case")
-
-    for _, row in rc_df.iterrows():
-        rico = row['RICO_ID']
-        code_val = row.get('CODE', None)
-        if code_val is None:
-            continue
-        sub_kb = kb_df[kb_df['CODE']==code_val]
-        if sub_kb.empty:
-            continue
-        cid = sub_kb.iloc[0]['ID']
-        conc_node = f"conc_{cid}"
-        if conc_node in G:
-            case_node = f"case_{rico}"
-            G.add_edge(case_node, conc_node, relation="CASE-OF")
-            G.nodes[conc_node]['study_set'].add(rico)
-
-    # 5) Se vogliamo usage_count esatto => len(study_set)
-    for n, d in G.nodes(data=True):
-        if d.get('type')=='concept':
-            d['usage_count'] = len(d['study_set'])
+    return get_concept_matrix().to_networkx()
 
+def update_graph(G):
+    """
+    Porta il grafo G (costruito da build_graph) ai DF correnti modificando
+    solo nodi e archi coinvolti dall'ultimo aggiornamento della matrice.
+    Se G non riflette la generazione da cui parte l'aggiornamento (ad es.
+    grafo caricato da file) è ricostruito. Ritorna G.
+    """
+    kb_df = data_structures.KB_Conclusions_DF
+    rc_df = data_structures.RulesConclusions_DF
+    if kb_df.empty or rc_df.empty:
+        G.clear()
+        return G
+
+    M = get_concept_matrix()
+    if G.graph.get('generation') == M.generation:
+        return G
+    delta = M.last_update
+    if delta is not None and delta['from_generation'] == G.graph.get('generation'):
+        return M.patch_networkx(G, delta)
+    G.clear()
+    G.update(M.to_networkx())
     return G
 
 def save_graph(G, filename):
@@ -0,0 +1,726 @@
+"""
+Filename: graph_matrix_functions.py
+===================================
+
+Scopo:
+  - Rappresentazione compatta del knowledge graph:
+    * matrice di incidenza sparsa studi x concetti (SciPy CSR, con la CSC
+      calcolata al bisogno) al posto di un nodo networkx per studio e di un
+      set di RICO_ID (study_set) per concetto;
+    * mappe ID intere (RICO_ID -> riga, ID concetto -> colonna);
+    * array dei genitori IS-A (posizione del concetto padre, -1 = nessuno).
+  - API per usage count, studi di un concetto, concetti di uno studio e
+    co-occorrenze, senza cicli Python sugli studi.
+  - Il grafo networkx (build_graph) è una vista costruita da questa matrice.
+
+Procedures/Functions/Classi Principali:
+  - case_of_pairs(kb_df, rc_df): coppie distinte (RICO_ID, ID concetto).
+  - ConceptMatrix: matrice + attributi dei concetti.
+      usage_counts(), studies_of(cid), concepts_of(rico), co_occurrence(cid),
+      children_of(pid), to_networkx(), study_subgraph(rico, max_depth),
+      stats_lines(), from_networkx(G), save(folder), load(folder, mmap).
+  - ConceptMatrix.update(kb_df, rc_df, generation): nuova matrice
+    aggiornata in modo incrementale dopo un import; patch_networkx(G, delta)
+    applica il delta a un grafo networkx; update_summary() lo descrive.
+  - concept_frame(kb_df), code_id_map(kb_df), rc_pair_keys(rc_df).
+  - build_concept_matrix(kb_df, rc_df): costruzione vettoriale.
+  - get_concept_matrix(): matrice corrente (aggiornata se cambiano KB o RC).
+
+Modifiche recenti:
+  - 2026-10-19: Creazione del modulo (case_of_pairs spostata qui da graph_functions).
+  - 2026-10-19: Formato su disco colonnare e versionato (save/load): header
+    JSON con schema, array .npy mappabili in memoria, concetti in FEATHER.
+  - 2026-10-19: Aggiornamento incrementale (update/patch_networkx): gli
+    studi coinvolti da un import sono ricavati confrontando gli hash delle
+    coppie (RICO_ID, codice) e le mappe CODE -> ID; solo le loro righe sono
+    ricalcolate, le altre riusate. Oltre UPDATE_REBUILD_FRACTION degli studi
+    si ricostruisce da zero.
+  - 2026-10-19: update() ritorna una nuova ConceptMatrix invece di
+    modificare quella in cache: le posizioni tenute da ConceptTreeWindow
+    restano valide sulla matrice che la finestra ha ricevuto.
+
+Note:
+  - scipy e networkx sono importati solo dentro le funzioni (import differito).
+  - Con ID di concetto duplicati valgono gli attributi dell'ultima riga
+    (come add_node sul grafo networkx); CODE -> ID usa la prima riga del KB.
+  - Le righe di RulesConclusions_DF con RICO_ID nullo sono escluse.
+  - Una matrice letta da file (load/from_networkx) non ha lo stato di
+    origine (kb_df, rc_keys): get_concept_matrix la ricostruisce.
+  - Dopo update() gli studi aggiunti sono in coda a study_ids (non ordinati).
+  - Il formato su disco non usa pickle (np.load con allow_pickle=False):
+    un file non valido produce un errore, non l'esecuzione di codice.
+"""
+
+import os
+import json
+import time
+import shutil
+import logging
+import datetime
+
+import numpy as np
+import pandas as pd
+
+import data_structures
+
+logger = logging.getLogger(__name__)
+
+# Attributi booleani dei nodi concept (default False se la colonna manca)
+CONCEPT_BOOL_ATTRS = ['SHOW_IN_REPORTS_BL', 'GENERALIZATION_BL', 'SET_PARENT_TRUE_BL', 'RESERVED_BL']
+
+_EMPTY_IDS = np.empty(0, dtype=np.int64)
+
+# Formato su disco (cartella con header JSON + array .npy + FEATHER)
+GRAPH_FORMAT = "concept_matrix"
+GRAPH_FORMAT_VERSION = 1
+GRAPH_HEADER_FILE = "header.json"
+GRAPH_CONCEPTS_FILE = "concepts.feather"
+
+# Aggiornamento incrementale: oltre questa frazione di studi coinvolti si ricostruisce
+UPDATE_REBUILD_FRACTION = 0.5
+UPDATE_DELTA_KEYS = ['added_studies', 'removed_studies', 'relinked_studies',
+                     'added_concepts', 'removed_concepts', 'changed_concepts', 'touched_concepts']
+
+
+def _rc_columns(rc_df):
+    """RICO_ID e codice (CODE o CONCLUSION_CODE) di RulesConclusions_DF come float64 (NaN = nullo)."""
+    code_col = 'CODE' if 'CODE' in rc_df.columns else 'CONCLUSION_CODE'
+    return (rc_df['RICO_ID'].to_numpy(dtype='float64', na_value=np.nan),
+            rc_df[code_col].to_numpy(dtype='float64', na_value=np.nan))
+
+
+def code_id_map(kb_df):
+    """Series CODE (float64) -> ID della prima riga del KB con quel CODE."""
+    if kb_df.empty or 'CODE' not in kb_df.columns:
+        return pd.Series([], index=pd.Index([], dtype='float64'), dtype='int64')
+    code_map = pd.DataFrame({
+        'CODE': kb_df['CODE'].to_numpy(dtype='float64', na_value=np.nan),
+        'ID': kb_df['ID'].to_numpy(dtype='int64')
+    }).dropna(subset=['CODE']).drop_duplicates('CODE', keep='first')
+    return code_map.set_index('CODE')['ID']
+
+
+def case_of_pairs(kb_df, rc_df):
+    """
+    Coppie distinte (RICO_ID, ID concetto) di RulesConclusions_DF:
+    CONCLUSION_CODE (o CODE) -> ID della prima riga del KB con quel CODE,
+    con un solo join. Le righe con RICO_ID o codice nullo sono escluse.
+    """
+    rico, code = _rc_columns(rc_df)
+    rc = pd.DataFrame({'RICO_ID': rico, 'CODE': code}).dropna()
+    code_map = code_id_map(kb_df).reset_index()
+    pairs = rc.merge(code_map, on='CODE', how='inner', sort=False)[['RICO_ID', 'ID']]
+    pairs = pairs.drop_duplicates()
+    pairs['RICO_ID'] = pairs['RICO_ID'].astype('int64')
+    return pairs.reset_index(drop=True)
+
+
+def rc_pair_keys(rc_df):
+    """
+    Chiavi (hash uint64, ordinate) delle coppie distinte (RICO_ID, codice)
+    di RulesConclusions_DF e RICO_ID di ogni chiave. Codice nullo = -1 (lo
+    studio è comunque una riga della matrice); righe con RICO_ID nullo escluse.
+    Due versioni di RulesConclusions_DF si confrontano con np.isin sulle chiavi.
+    """
+    if rc_df.empty:
+        return np.empty(0, dtype=np.uint64), _EMPTY_IDS
+    rico, code = _rc_columns(rc_df)
+    valid = ~np.isnan(rico)
+    pairs = pd.DataFrame({
+        'RICO_ID': rico[valid].astype(np.int64),
+        'CODE': np.nan_to_num(code[valid], nan=-1.0)
+    })
+    keys, first = np.unique(pd.util.hash_pandas_object(pairs, index=False).to_numpy(), return_index=True)
+    return keys, pairs['RICO_ID'].to_numpy()[first]
+
+
+def concept_frame(kb_df):
+    """
+    Attributi dei concetti (ID, STR, CODE, PARENT_ID, flag, RANK_ABS se
+    presente) da KB_Conclusions_DF, una riga per ID (vale l'ultima).
+    """
+    concepts = pd.DataFrame({'ID': kb_df['ID'].to_numpy(dtype='int64')})
+    concepts['STR'] = kb_df['STR'].to_numpy() if 'STR' in kb_df.columns else \
+        [f"Concept {cid}" for cid in concepts['ID'].tolist()]
+    concepts['CODE'] = kb_df['CODE'].to_numpy() if 'CODE' in kb_df.columns else None
+    concepts['PARENT_ID'] = kb_df['PARENT_ID'].to_numpy() if 'PARENT_ID' in kb_df.columns else 0
+    for col in CONCEPT_BOOL_ATTRS:
+        concepts[col] = kb_df[col].to_numpy() if col in kb_df.columns else False
+    if 'RANK_ABS' in kb_df.columns:
+        concepts['RANK_ABS'] = kb_df['RANK_ABS'].to_numpy()
+    return concepts.drop_duplicates('ID', keep='last')
+
+
+class ConceptMatrix:
+    """
+    Knowledge graph in forma matriciale:
+      concepts     DataFrame degli attributi (ID, STR, CODE, PARENT_ID, flag,
+                   RANK_ABS se presente), una riga per concetto = colonna
+      concept_ids  ID dei concetti (int64), study_ids RICO_ID (int64; ordinati
+                   dopo build, gli studi aggiunti da update() sono in coda)
+      parent       posizione del concetto padre (int64, -1 = radice o padre assente)
+      csr          matrice bool n_studi x n_concetti (CASE-OF)
+    """
+    def __init__(self, concepts, study_ids, csr, generation=None):
+        self.generation = generation
+        self.csr = csr
+        self.versions = {}
+        self._csc = None
+        # stato per update(): KB e chiavi delle coppie (RICO_ID, codice) di origine
+        self.kb_df = None
+        self.rc_keys = None
+        self.rc_key_ricos = None
+        self.last_update = None
+        self.concepts = concepts.reset_index(drop=True)
+        self.concept_ids = self.concepts['ID'].to_numpy(dtype='int64')
+        self.study_ids = np.asarray(study_ids, dtype=np.int64)
+        self._attr_lists = None
+        self._concept_index = pd.Index(self.concept_ids)
+        self._study_index = pd.Index(self.study_ids)
+        parent_ids = self.concepts['PARENT_ID'].to_numpy(dtype='float64', na_value=np.nan)
+        parent = self._concept_index.get_indexer(np.where(parent_ids > 0, parent_ids, -1).astype(np.int64))
+        parent[~(parent_ids > 0)] = -1
+        self.parent = parent.astype(np.int64)
+
+    # ------------------------------------------------------------
+    # Dimensioni e mappe ID
+    # ------------------------------------------------------------
+    @property
+    def n_concepts(self):
+        return len(self.concept_ids)
+
+    @property
+    def n_studies(self):
+        return len(self.study_ids)
+
+    @property
+    def n_edges(self):
+        return int(self.csr.nnz)
+
+    @property
+    def csc(self):
+        if self._csc is None:
+            self._csc = self.csr.tocsc()
+        return self._csc
+
+    def concept_index(self, ids):
+        """Posizioni (colonne) degli ID concetto; -1 se assenti."""
+        return self._concept_index.get_indexer(np.atleast_1d(np.asarray(ids, dtype=np.int64)))
+
+    def study_index(self, ricos):
+        """Posizioni (righe) dei RICO_ID; -1 se assenti."""
+        return self._study_index.get_indexer(np.atleast_1d(np.asarray(ricos, dtype=np.int64)))
+
+    # ------------------------------------------------------------
+    # Interrogazioni
+    # ------------------------------------------------------------
+    def usage_counts(self):
+        """Numero di studi per concetto (allineato a concept_ids)."""
+        return np.diff(self.csc.indptr).astype(np.int64)
+
+    def usage_count(self, cid):
+        pos = self.concept_index(cid)[0]
+        return int(self.csc.indptr[pos + 1] - self.csc.indptr[pos]) if pos >= 0 else 0
+
+    def _study_rows(self, pos):
+        return self.csc.indices[self.csc.indptr[pos]:self.csc.indptr[pos + 1]]
+
+    def studies_of(self, cid):
+        """RICO_ID (ordinati) degli studi con il concetto."""
+        pos = self.concept_index(cid)[0]
+        return np.sort(self.study_ids[self._study_rows(pos)]) if pos >= 0 else _EMPTY_IDS
+
+    def concepts_of(self, rico):
+        """ID dei concetti di uno studio."""
+        row = self.study_index(rico)[0]
+        if row < 0:
+            return _EMPTY_IDS
+        return self.concept_ids[np.sort(self.csr.indices[self.csr.indptr[row]:self.csr.indptr[row + 1]])]
+
+    def co_occurrence(self, cid):
+        """
+        Per ogni concetto, numero di studi in comune con cid (allineato a
+        concept_ids): un bincount sulle colonne delle righe degli studi di cid.
+        """
+        pos = self.concept_index(cid)[0]
+        if pos < 0:
+            return np.zeros(self.n_concepts, dtype=np.int64)
+        sub = self.csr[self._study_rows(pos)]
+        return np.bincount(sub.indices, minlength=self.n_concepts).astype(np.int64)
+
+    def children_of(self, pos):
+        """Posizioni dei figli IS-A del concetto in posizione pos."""
+        return np.flatnonzero(self.parent == pos)
+
+    # ------------------------------------------------------------
+    # Vista networkx
+    # ------------------------------------------------------------
+    def concept_attrs(self, pos):
+        """
+        Attributi del nodo conc_{ID} come in build_graph (study_set incluso).
+        """
+        if self._attr_lists is None:
+            self._attr_lists = {col: self.concepts[col].tolist()
+                                for col in ['STR', 'CODE', 'PARENT_ID'] + CONCEPT_BOOL_ATTRS}
+        lists = self._attr_lists
+        code = lists['CODE'][pos]
+        study_set = set(self.study_ids[self._study_rows(pos)].tolist())
+        return {
+            'type': "concept",
+            'STR': lists['STR'][pos],
+            'CODE': code if code else "?",
+            **{col: bool(lists[col][pos]) for col in CONCEPT_BOOL_ATTRS},
+            'PARENT_ID': lists['PARENT_ID'][pos],
+            'study_set': study_set,
+            'usage_count': len(study_set)
+        }
+
+    def to_networkx(self):
+        """
+        nx.DiGraph equivalente a build_graph(): nodi conc_{ID} e case_{rico},
+        archi IS-A (padre -> figlio) e CASE-OF (caso -> concetto).
+        """
+        import networkx as nx
+        G = nx.DiGraph()
+        G.add_nodes_from(
+            (f"conc_{cid}", self.concept_attrs(pos))
+            for pos, cid in enumerate(self.concept_ids.tolist())
+        )
+        child = np.flatnonzero(self.parent >= 0)
+        names = [f"conc_{cid}" for cid in self.concept_ids.tolist()]
+        G.add_edges_from(((names[p], names[c]) for p, c in zip(self.parent[child].tolist(), child.tolist())),
+                         relation="IS-A")
+        case_names = [f"case_{rico}" for rico in self.study_ids.tolist()]
+        G.add_nodes_from(case_names, type="case")
+        coo = self.csr.tocoo()
+        G.add_edges_from(((case_names[r], names[c]) for r, c in zip(coo.row.tolist(), coo.col.tolist())),
+                         relation="CASE-OF")
+        G.graph['generation'] = self.generation
+        G.graph['versions'] = dict(self.versions)
+        return G
+
+    def study_subgraph(self, rico, max_depth=2):
+        """
+        Sottografo di uno studio (come build_study_subgraph): il caso, i suoi
+        concetti e gli antenati IS-A fino a max_depth livelli.
+        """
+        import networkx as nx
+        sub = nx.DiGraph()
+        row = self.study_index(rico)[0]
+        if row < 0:
+            return sub
+        case_node = f"case_{rico}"
+        sub.add_node(case_node, type="case")
+        frontier = []
+        depth_map = {}
+        for pos in self.csr.indices[self.csr.indptr[row]:self.csr.indptr[row + 1]].tolist():
+            node = f"conc_{self.concept_ids[pos]}"
+            sub.add_node(node, **self.concept_attrs(pos))
+            sub.add_edge(case_node, node, relation="CASE-OF")
+            frontier.append(pos)
+            depth_map[pos] = 0
+        while frontier:
+            pos = frontier.pop(0)
+            if depth_map[pos] >= max_depth:
+                continue
+            p = int(self.parent[pos])
+            if p < 0:
+                continue
+            p_node = f"conc_{self.concept_ids[p]}"
+            if p_node not in sub:
+                sub.add_node(p_node, **self.concept_attrs(p))
+                sub.add_edge(p_node, f"conc_{self.concept_ids[pos]}", relation="IS-A")
+                depth_map[p] = depth_map[pos] + 1
+                frontier.append(p)
+        return sub
+
+    def stats_lines(self):
+        """Stesse righe di graph_functions.get_graph_stats, senza networkx."""
+        is_a = int((self.parent >= 0).sum())
+        return [
+            f"Total nodes: {self.n_concepts + self.n_studies}",
+            f"Total edges: {is_a + self.n_edges}",
+            f"Concept nodes: {self.n_concepts}",
+            f"Case nodes: {self.n_studies}",
+            f"IS-A edges: {is_a}",
+            f"CASE-OF edges: {self.n_edges}"
+        ]
+
+    # ------------------------------------------------------------
+    # Aggiornamento incrementale (import delta)
+    # ------------------------------------------------------------
+    def can_update(self):
+        """True se la matrice conserva lo stato di origine richiesto da update()."""
+        return self.kb_df is not None and self.rc_keys is not None
+
+    def update(self, kb_df, rc_df, generation=None):
+        """
+        Nuova ConceptMatrix per i nuovi KB_Conclusions_DF / RulesConclusions_DF,
+        ricalcolando solo gli studi coinvolti: quelli con coppie (RICO_ID,
+        codice) aggiunte o rimosse e quelli con un codice che nel KB punta
+        ora a un altro concetto. Le righe degli altri studi sono riusate con
+        le colonne rimappate sui nuovi concetti. Se gli studi coinvolti sono
+        più di UPDATE_REBUILD_FRACTION la matrice è ricostruita da zero.
+        self non è modificata (finestre aperte e pagina possono tenerla);
+        il delta usato da patch_networkx() è in last_update della nuova matrice.
+        """
+        t0 = time.perf_counter()
+        if not self.can_update():
+            raise ValueError("concept matrix has no source state: rebuild it")
+        keys, key_ricos = rc_pair_keys(rc_df)
+        affected = [self.rc_key_ricos[~np.isin(self.rc_keys, keys, assume_unique=True)],
+                    key_ricos[~np.isin(keys, self.rc_keys, assume_unique=True)]]
+        codes = pd.concat([code_id_map(self.kb_df).rename('OLD'), code_id_map(kb_df).rename('NEW')], axis=1)
+        changed_codes = codes.index[codes['OLD'].fillna(-1).ne(codes['NEW'].fillna(-1))].to_numpy()
+        if len(changed_codes) and not rc_df.empty:
+            rico, code = _rc_columns(rc_df)
+            hit = np.isin(code, changed_codes) & ~np.isnan(rico)
+            affected.append(rico[hit].astype(np.int64))
+        affected = np.unique(np.concatenate(affected))
+
+        old_ids = self.concept_ids
+        if len(affected) > UPDATE_REBUILD_FRACTION * max(self.n_studies, 1):
+            matrix = build_concept_matrix(kb_df, rc_df, generation)
+            matrix.versions = dict(self.versions)
+            matrix.last_update = _update_delta(
+                self.generation, generation, t0, full_rebuild=True,
+                added_studies=np.setdiff1d(matrix.study_ids, self.study_ids),
+                removed_studies=np.setdiff1d(self.study_ids, matrix.study_ids),
+                relinked_studies=affected,
+                added_concepts=np.setdiff1d(matrix.concept_ids, old_ids),
+                removed_concepts=np.setdiff1d(old_ids, matrix.concept_ids))
+            return matrix
+
+        # concetti: nuova tabella, colonne vecchie -> nuove
+        concepts = concept_frame(kb_df)
+        new_index = pd.Index(concepts['ID'].to_numpy(dtype='int64'))
+        col_map = new_index.get_indexer(old_ids)
+        removed_concepts = old_ids[col_map < 0]
+        added_concepts = new_index.to_numpy()[~new_index.isin(old_ids)]
+        common = col_map >= 0
+        if self.concepts.columns.equals(concepts.columns):
+            old_hash = pd.util.hash_pandas_object(self.concepts, index=False).to_numpy()
+            new_hash = pd.util.hash_pandas_object(concepts, index=False).to_numpy()
+            changed = common & (old_hash != new_hash[np.where(common, col_map, 0)])
+        else:
+            changed = common
+        changed_concepts = old_ids[changed]
+
+        # studi: rimossi (non più in RulesConclusions_DF), aggiunti in coda
+        old_row = self.study_index(affected)
+        present = np.isin(affected, key_ricos)
+        removed_studies = affected[~present & (old_row >= 0)]
+        added_studies = affected[present & (old_row < 0)]
+        relinked_studies = affected[present]
+        n_old = self.n_studies
+        hit_row = np.zeros(n_old, dtype=bool)
+        hit_row[old_row[old_row >= 0]] = True
+        keep_row = np.ones(n_old, dtype=bool)
+        keep_row[self.study_index(removed_studies)] = False
+        row_map = np.full(n_old, -1, dtype=np.int64)
+        row_map[keep_row] = np.arange(int(keep_row.sum()))
+        if len(removed_studies) or len(added_studies):
+            study_ids = np.concatenate([self.study_ids[keep_row], added_studies])
+        else:
+            study_ids = self.study_ids  # stesso array (sola lettura)
+        matrix = ConceptMatrix(concepts, study_ids, None, generation)
+
+        # link: quelli degli studi non coinvolti + i nuovi degli studi coinvolti
+        coo = self.csr.tocoo()
+        hit = hit_row[coo.row]
+        keep = ~hit & common[coo.col]
+        if len(relinked_studies) and not kb_df.empty:
+            rico, _ = _rc_columns(rc_df)
+            pairs = case_of_pairs(kb_df, rc_df[np.isin(rico, relinked_studies)])
+        else:
+            pairs = pd.DataFrame({'RICO_ID': _EMPTY_IDS, 'ID': _EMPTY_IDS})
+        rows = np.concatenate([row_map[coo.row[keep]], matrix.study_index(pairs['RICO_ID'].to_numpy())])
+        cols = np.concatenate([col_map[coo.col[keep]], matrix.concept_index(pairs['ID'].to_numpy())])
+        matrix.csr = _incidence(rows, cols, matrix.n_studies, matrix.n_concepts)
+        touched = np.unique(np.concatenate([old_ids[np.unique(coo.col[hit])],
+                                            pairs['ID'].to_numpy(dtype=np.int64)]))
+
+        matrix.kb_df = kb_df
+        matrix.rc_keys, matrix.rc_key_ricos = keys, key_ricos
+        matrix.versions = dict(self.versions)
+        matrix.last_update = _update_delta(
+            self.generation, generation, t0, full_rebuild=False,
+            added_studies=added_studies, removed_studies=removed_studies,
+            relinked_studies=relinked_studies, added_concepts=added_concepts,
+            removed_concepts=removed_concepts, changed_concepts=changed_concepts,
+            touched_concepts=touched[np.isin(touched, matrix.concept_ids)])
+        return matrix
+
+    def patch_networkx(self, G, delta):
+        """
+        Applica a G (grafo di to_networkx della versione precedente) il delta
+        di update(): rimuove casi e concetti eliminati, ricollega gli archi
+        CASE-OF degli studi coinvolti, aggiorna attributi, study_set e
+        usage_count dei concetti toccati e gli archi IS-A dei concetti
+        aggiunti o cambiati. Con full_rebuild il grafo è ricostruito.
+        """
+        if delta['full_rebuild']:
+            G.clear()
+            G.update(self.to_networkx())
+            return G
+        G.remove_nodes_from(f"case_{rico}" for rico in delta['removed_studies'].tolist())
+        G.remove_nodes_from(f"conc_{cid}" for cid in delta['removed_concepts'].tolist())
+
+        refresh = np.unique(np.concatenate([delta['added_concepts'], delta['changed_concepts'],
+                                            delta['touched_concepts']]))
+        for cid, pos in zip(refresh.tolist(), self.concept_index(refresh).tolist()):
+            if pos < 0:
+                continue
+            node = f"conc_{cid}"
+            if node in G:
+                G.nodes[node].clear()
+                G.nodes[node].update(self.concept_attrs(pos))
+            else:
+                G.add_node(node, **self.concept_attrs(pos))
+
+        # IS-A: arco dal padre per i concetti aggiunti/cambiati, verso i figli per gli aggiunti
+        for cid in np.concatenate([delta['added_concepts'], delta['changed_concepts']]).tolist():
+            node = f"conc_{cid}"
+            G.remove_edges_from([(u, node) for u in list(G.predecessors(node))
+                                 if G[u][node].get('relation') == "IS-A"])
+            p = int(self.parent[self.concept_index(cid)[0]])
+            if p >= 0:
+                G.add_edge(f"conc_{self.concept_ids[p]}", node, relation="IS-A")
+        for cid in delta['added_concepts'].tolist():
+            node = f"conc_{cid}"
+            G.add_edges_from(((node, f"conc_{self.concept_ids[c]}")
+                              for c in self.children_of(self.concept_index(cid)[0]).tolist()),
+                             relation="IS-A")
+
+        for rico in delta['relinked_studies'].tolist():
+            case_node = f"case_{rico}"
+            if case_node in G:
+                G.remove_edges_from(list(G.out_edges(case_node)))
+            else:
+                G.add_node(case_node, type="case")
+            G.add_edges_from(((case_node, f"conc_{cid}") for cid in self.concepts_of(rico).tolist()),
+                             relation="CASE-OF")
+        G.graph['generation'] = self.generation
+        G.graph['versions'] = dict(self.versions)
+        return G
+
+    def update_summary(self):
+        """Testo (inglese) dell'ultimo aggiornamento: incrementale o da zero."""
+        d = self.last_update
+        if d is None:
+            return f"Graph built from scratch (generation {self.generation})."
+        kind = "rebuilt from scratch" if d['full_rebuild'] else "updated incrementally"
+        return (f"Graph {kind} in {d['elapsed']:.2f}s (generation {d['from_generation']} -> "
+                f"{d['generation']}): studies +{len(d['added_studies'])} / -{len(d['removed_studies'])}, "
+                f"{len(d['relinked_studies'])} relinked; concepts +{len(d['added_concepts'])} / "
+                f"-{len(d['removed_concepts'])}, {len(d['changed_concepts'])} changed.")
+
+    # ------------------------------------------------------------
+    # Persistenza colonnare (GRAPH_HEADER_FILE + .npy + FEATHER)
+    # ------------------------------------------------------------
+    def save(self, folder):
+        """
+        Salva la matrice nella cartella folder: array .npy (study_ids,
+        parent, indptr/indices della CSR), attributi dei concetti in FEATHER
+        non compresso e GRAPH_HEADER_FILE con formato, versione, schema e
+        versioni dei DF di origine. Scrittura in una cartella temporanea poi
+        rinominata. Ritorna il nome del file header.
+        """
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        tmp = folder.rstrip("/\\") + ".tmp"
+        if os.path.isdir(tmp):
+            shutil.rmtree(tmp)
+        os.makedirs(tmp)
+
+        csr = self.csr
+        arrays = {
+            'study_ids': self.study_ids,
+            'parent': self.parent,
+            'indptr': csr.indptr,
+            'indices': csr.indices
+        }
+        schema = {}
+        for name, arr in arrays.items():
+            file = f"{name}.npy"
+            np.save(os.path.join(tmp, file), np.ascontiguousarray(arr), allow_pickle=False)
+            schema[name] = {'file': file, 'dtype': str(arr.dtype), 'shape': list(arr.shape)}
+        table = pa.Table.from_pandas(self.concepts, preserve_index=False)
+        feather.write_feather(table, os.path.join(tmp, GRAPH_CONCEPTS_FILE), compression='uncompressed')
+
+        header = {
+            'format': GRAPH_FORMAT,
+            'version': GRAPH_FORMAT_VERSION,
+            'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'shape': [self.n_studies, self.n_concepts],
+            'nnz': self.n_edges,
+            'versions': self.versions,
+            'arrays': schema,
+            'concepts': {'file': GRAPH_CONCEPTS_FILE,
+                         'columns': {f.name: str(f.type) for f in table.schema}}
+        }
+        with open(os.path.join(tmp, GRAPH_HEADER_FILE), "w", encoding="utf-8") as f:
+            json.dump(header, f, indent=1)
+
+        # sostituzione della cartella precedente
+        old = folder.rstrip("/\\") + ".old"
+        if os.path.isdir(folder):
+            if os.path.isdir(old):
+                shutil.rmtree(old)
+            os.rename(folder, old)
+        os.rename(tmp, folder)
+        if os.path.isdir(old):
+            shutil.rmtree(old)
+        return os.path.join(folder, GRAPH_HEADER_FILE)
+
+    @classmethod
+    def load(cls, folder, mmap=True):
+        """
+        Legge una matrice salvata con save(). Con mmap gli array .npy sono
+        mappati in memoria (sola lettura) e il FEATHER è letto con memory map.
+        Ritorna None se la cartella non contiene GRAPH_HEADER_FILE; solleva
+        ValueError se formato, versione o dimensioni non corrispondono.
+        """
+        import scipy.sparse as sp
+        import pyarrow.feather as feather
+        header_file = os.path.join(folder, GRAPH_HEADER_FILE)
+        if not os.path.isfile(header_file):
+            return None
+        with open(header_file, "r", encoding="utf-8") as f:
+            header = json.load(f)
+        if header.get('format') != GRAPH_FORMAT:
+            raise ValueError(f"{header_file}: not a {GRAPH_FORMAT} file")
+        if header.get('version') != GRAPH_FORMAT_VERSION:
+            raise ValueError(f"{header_file}: unsupported version {header.get('version')} "
+                             f"(expected {GRAPH_FORMAT_VERSION})")
+
+        arrays = {}
+        for name, spec in header['arrays'].items():
+            arr = np.load(os.path.join(folder, spec['file']), mmap_mode='r' if mmap else None,
+                          allow_pickle=False)
+            if str(arr.dtype) != spec['dtype'] or list(arr.shape) != spec['shape']:
+                raise ValueError(f"{spec['file']}: dtype/shape do not match the header")
+            arrays[name] = arr
+        concepts = feather.read_feather(os.path.join(folder, header['concepts']['file']),
+                                        memory_map=mmap)
+        n_studies, n_concepts = header['shape']
+        if len(arrays['study_ids']) != n_studies or len(concepts) != n_concepts \
+                or int(arrays['indptr'][-1]) != header['nnz']:
+            raise ValueError(f"{header_file}: array sizes do not match the header")
+
+        csr = sp.csr_matrix((np.ones(header['nnz'], dtype=bool), arrays['indices'], arrays['indptr']),
+                            shape=(n_studies, n_concepts), copy=False)
+        matrix = cls(concepts, arrays['study_ids'], csr)
+        matrix.parent = arrays['parent']
+        matrix.versions = header.get('versions', {})
+        return matrix
+
+    @classmethod
+    def from_networkx(cls, G):
+        """
+        Matrice da un grafo networkx (ad es. un grafo salvato con pickle).
+        """
+        import scipy.sparse as sp
+        concept_rows = []
+        for n, d in G.nodes(data=True):
+            if d.get('type') == "concept":
+                row = {'ID': int(n[len("conc_"):]), 'STR': d.get('STR'), 'CODE': d.get('CODE'),
+                       'PARENT_ID': d.get('PARENT_ID', 0)}
+                row.update({col: d.get(col, False) for col in CONCEPT_BOOL_ATTRS})
+                if 'RANK_ABS' in d:
+                    row['RANK_ABS'] = d['RANK_ABS']
+                concept_rows.append(row)
+        columns = ['ID', 'STR', 'CODE', 'PARENT_ID'] + CONCEPT_BOOL_ATTRS
+        if any('RANK_ABS' in row for row in concept_rows):
+            columns.append('RANK_ABS')
+        concepts = pd.DataFrame(concept_rows, columns=columns)
+        concepts['CODE'] = concepts['CODE'].where(concepts['CODE'] != "?", None)
+        study_ids = np.sort(np.array([int(n[len("case_"):]) for n, d in G.nodes(data=True)
+                                      if d.get('type') == "case" and n[len("case_"):].lstrip("-").isdigit()],
+                                     dtype=np.int64))
+        edges = [(int(u[len("case_"):]), int(v[len("conc_"):])) for u, v, e in G.edges(data=True)
+                 if e.get('relation') == "CASE-OF" and u[len("case_"):].lstrip("-").isdigit()]
+        matrix = cls(concepts, study_ids, sp.csr_matrix((len(study_ids), len(concepts)), dtype=bool))
+        if edges:
+            ricos, cids = np.array(edges, dtype=np.int64).T
+            matrix.csr = _incidence(matrix.study_index(ricos), matrix.concept_index(cids),
+                                    len(study_ids), len(concepts))
+            matrix._csc = None
+        return matrix
+
+
+def _update_delta(from_generation, generation, t0, full_rebuild, **arrays):
+    """Delta di ConceptMatrix.update(): array di ID (vuoti se non indicati) + tempi."""
+    delta = {name: _EMPTY_IDS for name in UPDATE_DELTA_KEYS}
+    delta.update({name: np.asarray(ids, dtype=np.int64) for name, ids in arrays.items()})
+    delta.update({'full_rebuild': full_rebuild, 'from_generation': from_generation,
+                  'generation': generation, 'elapsed': time.perf_counter() - t0})
+    return delta
+
+
+def _incidence(rows, cols, n_rows, n_cols):
+    """Matrice CSR bool (righe, colonne) con duplicati sommati in un solo 1."""
+    import scipy.sparse as sp
+    keep = (rows >= 0) & (cols >= 0)
+    csr = sp.csr_matrix((np.ones(int(keep.sum()), dtype=bool), (rows[keep], cols[keep])),
+                        shape=(n_rows, n_cols))
+    csr.sum_duplicates()
+    csr.sort_indices()
+    return csr
+
+
+def build_concept_matrix(kb_df, rc_df, generation=None):
+    """
+    ConceptMatrix da KB_Conclusions_DF e RulesConclusions_DF: un join
+    CODE -> ID (case_of_pairs) e la matrice costruita in blocco.
+    Righe = tutti i RICO_ID di RulesConclusions_DF (anche senza concetti nel KB).
+    """
+    t0 = time.perf_counter()
+    concepts = concept_frame(kb_df)
+
+    if rc_df.empty:
+        study_ids = _EMPTY_IDS
+    else:
+        study_ids = np.unique(rc_df['RICO_ID'].dropna().to_numpy(dtype='int64'))
+    matrix = ConceptMatrix(concepts, study_ids, None, generation)
+    if kb_df.empty or rc_df.empty:
+        pairs = pd.DataFrame({'RICO_ID': _EMPTY_IDS, 'ID': _EMPTY_IDS})
+    else:
+        pairs = case_of_pairs(kb_df, rc_df)
+    matrix.csr = _incidence(matrix.study_index(pairs['RICO_ID'].to_numpy()),
+                            matrix.concept_index(pairs['ID'].to_numpy()),
+                            matrix.n_studies, matrix.n_concepts)
+    matrix.kb_df = kb_df
+    matrix.rc_keys, matrix.rc_key_ricos = rc_pair_keys(rc_df)
+    logger.info("Concept matrix: %d studies x %d concepts, %d links in %.2fs",
+                matrix.n_studies, matrix.n_concepts, matrix.n_edges, time.perf_counter() - t0)
+    return matrix
+
+
+GRAPH_DF_NAMES = ["KB_Conclusions_DF", "RulesConclusions_DF"]
+_concept_matrix = None
+
+
+def get_concept_matrix():
+    """
+    ConceptMatrix sui DF correnti. Se cambia la generazione di
+    KB_Conclusions_DF o di RulesConclusions_DF la matrice in cache è
+    sostituita da quella di ConceptMatrix.update (delta in last_update),
+    o ricostruita se non ha lo stato di origine.
+    """
+    global _concept_matrix
+    gen = tuple(data_structures.get_generation(n) for n in GRAPH_DF_NAMES)
+    if _concept_matrix is not None and _concept_matrix.generation == gen:
+        return _concept_matrix
+    kb_df = data_structures.KB_Conclusions_DF
+    rc_df = data_structures.RulesConclusions_DF
+    if _concept_matrix is not None and _concept_matrix.can_update():
+        # nuova matrice: quella precedente resta valida per chi la tiene
+        _concept_matrix = _concept_matrix.update(kb_df, rc_df, gen)
+        logger.info(_concept_matrix.update_summary())
+    else:
+        _concept_matrix = build_concept_matrix(kb_df, rc_df, gen)
+    _concept_matrix.versions = {n: data_structures.get_version(n) for n in GRAPH_DF_NAMES}
+    return _concept_matrix
+
+# End of graph_matrix_functions.py
@@ -13,21 +13,51 @@ Procedures/Functions:
   - show_kb_stats(): Statistiche su KB_Conclusions, KB_Rules, KB_Conditions
   - show_rulesconc_stats(): Statistiche su RulesConclusions (insieme a KB_Conclusions, Studies_DF)
   - show_studies_stats(): Statistiche su Studies (males/females, stats by working day, etc.)
+  - show_stats(name): Testo dalla cache se i DF non sono cambiati,
+    altrimenti calcolo nel thread secondario (poll_stats() lo mostra).
+  - prefetch_stats(): Calcola in background le statistiche non in cache.
+  - export_studies_stats(): Salva in CSV la tabella (YEAR, DAY, SEX_CODE) delle Studies Stats.
+  - show_range_stats(): Report dell'intervallo From/To dal cubo giornaliero.
+  - on_frames_ready(ready, loading): abilita i pulsanti quando i DF sono caricati.
 
 Modifiche recenti:
   - 2025-01-14: Aggiunta la logica “Compattare output” per Studies Stats,
     e rifiniti i commenti in stile Pascal.
+  - 2026-10-19: Pulsanti abilitati solo quando i DF da cui dipendono sono
+    stati caricati (avvio asincrono).
+  - 2026-10-19: Le statistiche sono registrate come operazioni nel Memory Profiler.
+  - 2026-10-19: RulesConclusions Stats calcolate da stats_functions
+    (bitmask per CODE + un solo groupby) senza merge con KB_Conclusions_DF.
+  - 2026-10-19: Studies Stats da stats_functions.studies_stats (un solo
+    groupby su YEAR/DAY/SEX_CODE, DAY e AGE in cache per generazione)
+    invece del ciclo per anno; pulsante "Export Studies Stats" (CSV).
+  - 2026-10-19: Statistiche calcolate in un thread secondario e in cache
+    per versione/generazione dei DF letti (stats_functions.HomeStatsCache):
+    mostrate subito se i dati non sono cambiati, ricalcolate solo dopo un
+    import o un load FEATHER. La cache è salvata accanto allo snapshot ed
+    è disponibile subito dopo il riavvio.
+  - 2026-10-19: L'operazione nel Memory Profiler inizia quando il thread
+    secondario avvia il calcolo, non quando la statistica entra in coda.
+  - 2026-10-19: Campi From/To e pulsante "Range Stats": studi, conclusioni
+    e diagnosi di un intervallo di date dalle somme prefisse del cubo
+    giornaliero (cube_functions).
 
 Note:
-  - Evitare KeyError su GROUP_CODE => usiamo merge con suffixes.
+  - GROUP_CODE e i flag delle conclusioni sono presi dal KB
+    (LUT per CODE), non dalla colonna GROUP_CODE di RulesConclusions_DF.
   - Output in inglese con separatori di migliaia per coerenza.
+  - Il thread secondario legge soltanto i DF globali (sostituiti, mai
+    modificati, da set_dataframe) e non tocca Tk: i risultati passano
+    da una queue consumata con after().
 """
 
+import queue
+import threading
 import tkinter as tk
-from tkinter import ttk
+from tkinter import ttk, filedialog
 import data_structures
-import pandas as pd
-import numpy as np
+from memory_profiler_functions import track_operation, begin_operation, end_operation
+from stats_functions import export_studies_stats_csv, get_home_stats_cache, range_stats_text
 
 class HomePage(ttk.Frame):
     """
@@ -37,8 +67,32 @@ class HomePage(ttk.Frame):
      - RulesConclusions
      - Studies
     """
+    # Pulsante -> DF necessari (abilitato appena pronti all'avvio)
+    BUTTON_DEPENDENCIES = {
+        'kb_stats_btn': ["KB_Conclusions_DF", "KB_Rules_DF", "KB_Conditions_DF"],
+        'rulesconc_stats_btn': ["RulesConclusions_DF", "KB_Conclusions_DF", "Studies_DF"],
+        'studies_stats_btn': ["Studies_DF"],
+        'export_studies_stats_btn': ["Studies_DF"],
+        'range_stats_btn': ["Studies_DF", "RulesConclusions_DF", "KB_Conclusions_DF",
+                            "FinalDiagnoses_DF", "ClinicalDiagnoses_DF"]
+    }
+
+    # Statistica (stats_functions.HOME_STATS) -> (pulsante, nome operazione)
+    STATS = {
+        'kb': ('kb_stats_btn', "KB Stats"),
+        'rulesconc': ('rulesconc_stats_btn', "RulesConclusions Stats"),
+        'studies': ('studies_stats_btn', "Studies Stats")
+    }
+
     def __init__(self, parent):
         super().__init__(parent)
+        self.cache = get_home_stats_cache()
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.worker = None
+        self.pending = set()
+        self.polling = False
+        self.requested = None
 
         # text + scrollbar
         self.text_frame = ttk.Frame(self)
@@ -76,240 +130,164 @@ class HomePage(ttk.Frame):
         )
         self.studies_stats_btn.pack(side=tk.LEFT, padx=5)
 
-    # ----------------------------------------------------------------
-    # KB Stats
-    # ----------------------------------------------------------------
-    def show_kb_stats(self):
-        """
-        Statistiche su KB_Conclusions, KB_Rules, KB_Conditions (in inglese).
-        """
-        self.text.delete("1.0", tk.END)
-        df = data_structures.KB_Conclusions_DF
-        if df.empty:
-            self.text.insert(tk.END, "KB_Conclusions_DF is empty.\n")
-            return
-
-        lines = []
-        lines.append("CONCLUSIONS:\n")
+        self.export_studies_stats_btn = ttk.Button(
+            self.button_frame, text="Export Studies Stats",
+            command=self.export_studies_stats
+        )
+        self.export_studies_stats_btn.pack(side=tk.LEFT, padx=5)
+
+        # Intervallo di date (YYYY-MM-DD; vuoto = senza limite)
+        ttk.Label(self.button_frame, text="From:").pack(side=tk.LEFT, padx=(10, 2))
+        self.range_from_entry = ttk.Entry(self.button_frame, width=11)
+        self.range_from_entry.pack(side=tk.LEFT)
+        ttk.Label(self.button_frame, text="To:").pack(side=tk.LEFT, padx=(5, 2))
+        self.range_to_entry = ttk.Entry(self.button_frame, width=11)
+        self.range_to_entry.pack(side=tk.LEFT)
+        self.range_stats_btn = ttk.Button(
+            self.button_frame, text="Range Stats",
+            command=self.show_range_stats
+        )
+        self.range_stats_btn.pack(side=tk.LEFT, padx=5)
 
-        total_conc = len(df)
-        lines.append(f"Total: {format(total_conc, ',d')}")
+        self.status_var = tk.StringVar(value="")
+        self.status_label = ttk.Label(self.button_frame, textvariable=self.status_var)
+        self.status_label.pack(side=tk.LEFT, padx=10)
 
-        final_count = df[df['GROUP_CODE'] == 1].shape[0]
-        muscle_count = df[df['GROUP_CODE'] == 2].shape[0]
-        nerve_count = df[df['GROUP_CODE'] == 3].shape[0]
-        lines.append(f"Final: {format(final_count, ',d')}")
-        lines.append(f"Single Muscle: {format(muscle_count, ',d')}")
-        lines.append(f"Single Nerve: {format(nerve_count, ',d')}")
+    def on_frames_ready(self, ready, loading):
+        """
+        Chiamato dalla MainApplication durante il caricamento in background:
+        abilita ogni pulsante quando i suoi DF sono pronti; a caricamento
+        terminato prepara in background le statistiche non in cache.
+        """
+        for btn_name, deps in self.BUTTON_DEPENDENCIES.items():
+            enabled = (not loading) or all(n in ready for n in deps)
+            getattr(self, btn_name).config(state=tk.NORMAL if enabled else tk.DISABLED)
+        if not loading:
+            self.prefetch_stats()
 
-        lines.append("")
-        max_depth = df['DEPTH'].max()
-        for d in range(max_depth+1):
-            c = df[df['DEPTH'] == d].shape[0]
-            lines.append(f"Depth {d}: {format(c, ',d')}")
+    # ----------------------------------------------------------------
+    # Statistiche (cache + thread secondario)
+    # ----------------------------------------------------------------
+    def show_kb_stats(self):
+        self.show_stats('kb')
 
-        lines.append("")
-        show_in_report_count = df[df['SHOW_IN_REPORTS_BL'] == True].shape[0]
-        reserved_count       = df[df['RESERVED_BL'] == True].shape[0]
-        general_count        = df[df['GENERALIZATION_BL'] == True].shape[0]
-        warning_count        = df[df['WARNING_BL'] == True].shape[0]
-        lines.append(f"In Report: {format(show_in_report_count, ',d')}")
-        lines.append(f"Reserved: {format(reserved_count, ',d')}")
-        lines.append(f"Generalization: {format(general_count, ',d')}")
-        lines.append(f"Warning: {format(warning_count, ',d')}")
-        lines.append("")
+    def show_rulesconc_stats(self):
+        self.show_stats('rulesconc')
 
-        # RULES
-        df_rules = data_structures.KB_Rules_DF
-        lines.append("RULES:")
-        if df_rules.empty:
-            lines.append("No rules loaded.")
-        else:
-            total_rules = len(df_rules)
-            lines.append(f"Total number of rules: {format(total_rules, ',d')}")
+    def show_studies_stats(self):
+        self.show_stats('studies')
 
-            conc_with_rules = df_rules['CONCLUSION_CODE'].nunique()
-            lines.append(f"Total number of conclusions that have rules: {format(conc_with_rules, ',d')}")
+    def show_stats(self, name):
+        """
+        Mostra subito il testo in cache se i DF letti non sono cambiati,
+        altrimenti lo calcola nel thread secondario.
+        """
+        self.requested = name
+        entry = self.cache.lookup(name)
+        if entry is not None:
+            self.display(name, entry, cached=True)
+            return
+        self.text.delete("1.0", tk.END)
+        self.text.insert(tk.END, f"Computing {self.STATS[name][1]}...\n")
+        self.status_var.set("")
+        self.submit(name)
 
-            group_conc = df_rules.groupby('CONCLUSION_CODE').size()
-            avg_per_conc = group_conc.mean() if len(group_conc) > 0 else 0
-            max_per_conc = group_conc.max() if len(group_conc) > 0 else 0
-            lines.append(f"Average rules per conclusion: {avg_per_conc:.2f}")
-            lines.append(f"Max rules per conclusion: {format(max_per_conc, ',d')}")
+    def prefetch_stats(self):
+        for name in self.STATS:
+            if self.cache.lookup(name) is None:
+                self.submit(name)
 
-        lines.append("")
-        # CONDITIONS
-        df_cond = data_structures.KB_Conditions_DF
-        lines.append("CONDITIONS:")
-        if df_cond.empty:
-            lines.append("No conditions loaded.")
+    def submit(self, name):
+        if name in self.pending:
+            return
+        self.pending.add(name)
+        self.jobs.put(name)
+        if self.worker is None or not self.worker.is_alive():
+            self.worker = threading.Thread(target=self.worker_loop, name="HomeStats", daemon=True)
+            self.worker.start()
+        if not self.polling:
+            self.polling = True
+            self.after(100, self.poll_stats)
+
+    def worker_loop(self):
+        # Thread secondario (daemon, attende i job): nessun accesso a Tk
+        while True:
+            name = self.jobs.get()
+            # operazione registrata solo per il calcolo, senza l'attesa in coda
+            token = begin_operation(self.STATS[name][1])
+            try:
+                self.results.put(('done', name, self.cache.compute(name)))
+            except Exception as E:
+                self.results.put(('error', name, str(E)))
+            finally:
+                end_operation(token)
+
+    def poll_stats(self):
+        while True:
+            try:
+                kind, name, payload = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.pending.discard(name)
+            if name != self.requested:
+                continue
+            if kind == 'done':
+                self.display(name, payload, cached=False)
+            else:
+                self.text.delete("1.0", tk.END)
+                self.text.insert(tk.END, f"Error computing {self.STATS[name][1]}: {payload}\n")
+        if self.pending:
+            self.after(100, self.poll_stats)
         else:
-            total_cond = len(df_cond)
-            lines.append(f"Total number of conditions: {format(total_cond, ',d')}")
+            self.polling = False
 
-            group_rule = df_cond.groupby('RULE_ID').size()
-            avg_cond_rule = group_rule.mean() if len(group_rule) > 0 else 0
-            max_cond_rule = group_rule.max() if len(group_rule) > 0 else 0
-            lines.append(f"Average conditions per rule: {avg_cond_rule:.2f}")
-            lines.append(f"Max conditions per rule: {format(max_cond_rule, ',d')}")
-
-        final_text = "\n".join(lines)
-        self.text.insert(tk.END, final_text)
+    def display(self, name, entry, cached):
+        self.text.delete("1.0", tk.END)
+        self.text.insert(tk.END, entry['text'])
+        source = "cached" if cached else f"computed in {entry.get('elapsed', 0):.2f}s"
+        self.status_var.set(f"{self.STATS[name][1]}: {source} ({entry.get('computed_at')})")
 
     # ----------------------------------------------------------------
-    # RulesConclusions Stats
+    # Range Stats (cubo giornaliero)
     # ----------------------------------------------------------------
-    def show_rulesconc_stats(self):
+    def show_range_stats(self):
         """
-        Statistiche su RulesConclusions insieme a KB_Conclusions e Studies_DF.
-        Usa suffixes=('_rc','_kb') e filtra GROUP_CODE_kb.
+        Report dell'intervallo From/To: ogni totale è letto dalle somme
+        prefisse del cubo, senza scorrere i DF di dettaglio.
         """
+        start = self.range_from_entry.get().strip() or None
+        end = self.range_to_entry.get().strip() or None
+        self.requested = None
         self.text.delete("1.0", tk.END)
-        df_rc = data_structures.RulesConclusions_DF
-        df_kb = data_structures.KB_Conclusions_DF
-        df_st = data_structures.Studies_DF
-
-        if df_rc.empty:
-            self.text.insert(tk.END, "RulesConclusions_DF is empty.\n")
-            return
-        if df_kb.empty:
-            self.text.insert(tk.END, "KB_Conclusions_DF is empty.\n")
+        try:
+            with track_operation("Range Stats"):
+                text = range_stats_text(start, end)
+        except ValueError as E:
+            self.text.insert(tk.END, f"Invalid date: {E}\n")
             return
-
-        lines = []
-        total_rc = len(df_rc)
-        lines.append(f"Total number of rule conclusions in database: {format(total_rc, ',d')}")
-
-        total_studies = len(df_st['RICO_ID'].unique()) if not df_st.empty else 0
-        lines.append(f"Total number of studies: {format(total_studies, ',d')}")
-        lines.append("")
-
-        lines.append("Average number of conclusions per study:")
-
-        group = df_rc.groupby('RICO_ID').size()
-        avg_all = group.mean() if len(group)>0 else 0
-
-        merged = df_rc.merge(
-            df_kb, 
-            left_on='CONCLUSION_CODE', 
-            right_on='CODE', 
-            how='left',
-            suffixes=('_rc','_kb')
-        )
-
-        df_final = merged[merged['GROUP_CODE_kb'] == 1]
-        grp_final = df_final.groupby('RICO_ID').size()
-        avg_final = grp_final.mean() if len(grp_final)>0 else 0
-
-        df_muscle = merged[merged['GROUP_CODE_kb'] == 2]
-        grp_musc = df_muscle.groupby('RICO_ID').size()
-        avg_musc = grp_musc.mean() if len(grp_musc)>0 else 0
-
-        df_nerve = merged[merged['GROUP_CODE_kb'] == 3]
-        grp_nerve = df_nerve.groupby('RICO_ID').size()
-        avg_nerve = grp_nerve.mean() if len(grp_nerve)>0 else 0
-
-        # In report
-        col_inrep = 'SHOW_IN_REPORTS_BL_kb' if 'SHOW_IN_REPORTS_BL_kb' in merged.columns else 'SHOW_IN_REPORTS_BL'
-        df_in_report = merged[merged[col_inrep] == True]
-        grp_in_report = df_in_report.groupby('RICO_ID').size()
-        avg_in_report = grp_in_report.mean() if len(grp_in_report)>0 else 0
-
-        # reserved
-        col_res = 'RESERVED_BL_kb' if 'RESERVED_BL_kb' in merged.columns else 'RESERVED_BL'
-        df_reserved = merged[merged[col_res] == True]
-        grp_reserved = df_reserved.groupby('RICO_ID').size()
-        avg_reserved = grp_reserved.mean() if len(grp_reserved)>0 else 0
-
-        # generalization
-        col_gen = 'GENERALIZATION_BL_kb' if 'GENERALIZATION_BL_kb' in merged.columns else 'GENERALIZATION_BL'
-        df_general = merged[merged[col_gen] == True]
-        grp_general = df_general.groupby('RICO_ID').size()
-        avg_general = grp_general.mean() if len(grp_general)>0 else 0
-
-        # warning
-        col_warn = 'WARNING_BL_kb' if 'WARNING_BL_kb' in merged.columns else 'WARNING_BL'
-        df_warning = merged[merged[col_warn] == True]
-        grp_warning = df_warning.groupby('RICO_ID').size()
-        avg_warning = grp_warning.mean() if len(grp_warning)>0 else 0
-
-        lines.append(f"Total: {int(round(avg_all))}")
-        lines.append(f"Final: {int(round(avg_final))}")
-        lines.append(f"Single Muscle: {int(round(avg_musc))}")
-        lines.append(f"Single Nerve: {int(round(avg_nerve))}")
-        lines.append(f"In Report: {int(round(avg_in_report))}")
-        lines.append(f"Reserved: {int(round(avg_reserved))}")
-        lines.append(f"Generalization: {int(round(avg_general))}")
-        lines.append(f"Warning: {int(round(avg_warning))}")
-
-        final_text = "\n".join(lines)
-        self.text.insert(tk.END, final_text)
+        self.text.insert(tk.END, text)
+        self.status_var.set("")
 
     # ----------------------------------------------------------------
-    # Studies Stats
+    # Export Studies Stats
     # ----------------------------------------------------------------
-    def show_studies_stats(self):
+    def export_studies_stats(self):
         """
-        Stampa statistiche su Studies:
-         - Totale, M/F
-         - Average by working day (e max)
-         - Age min, max, average
-         - Per ogni year, #studies, M/F, min in a day, max in a day, average.
+        Salva in CSV la tabella (YEAR, DAY, SEX_CODE, STUDIES, età) da cui
+        derivano le Studies Stats.
         """
-        self.text.delete("1.0", tk.END)
-        df_st = data_structures.Studies_DF
-        if df_st.empty:
+        if data_structures.Studies_DF.empty:
+            self.text.delete("1.0", tk.END)
             self.text.insert(tk.END, "Studies_DF is empty.\n")
             return
-
-        lines = []
-
-        total_st = len(df_st)
-        males = df_st[df_st['SEX_CODE'] == 1].shape[0]
-        females = df_st[df_st['SEX_CODE'] == 2].shape[0]
-        lines.append(f"Total studies: {format(total_st, ',d')} (Males: {format(males, ',d')} Females: {format(females, ',d')})")
-
-        df_st2 = df_st.dropna(subset=['STUDY_DATE']).copy()
-        df_st2['DAY'] = df_st2['STUDY_DATE'].dt.date
-        group_day = df_st2.groupby('DAY').size()
-        avg_by_day = group_day.mean() if len(group_day)>0 else 0
-        max_by_day = group_day.max() if len(group_day)>0 else 0
-        lines.append(f"Average studies by working day: {int(round(avg_by_day))} (Max: {int(max_by_day)})")
-
-        df_st2['AGE'] = (df_st2['STUDY_DATE'] - df_st2['BIRTH_DATE']).dt.days / 365.25
-        day_age_mean = df_st2.groupby('DAY')['AGE'].mean()
-        if len(day_age_mean) == 0:
-            lines.append("Min age 0, Max: 0, Average: 0")
-        else:
-            min_age = day_age_mean.min()
-            max_age = day_age_mean.max()
-            avg_age = day_age_mean.mean()
-            lines.append(f"Min age {int(round(min_age))}, Max: {int(round(max_age))}, Average: {int(round(avg_age))}")
-
-        lines.append("")
-        df_st2['YEAR'] = df_st2['STUDY_DATE'].dt.year
-        all_years = sorted(df_st2['YEAR'].dropna().unique())
-
-        for yr in all_years:
-            sub = df_st2[df_st2['YEAR'] == yr]
-            total_yr = len(sub)
-            male_yr = sub[sub['SEX_CODE'] == 1].shape[0]
-            female_yr = sub[sub['SEX_CODE'] == 2].shape[0]
-            lines.append(f"Year {int(yr)}:")
-            lines.append(f"  Studies: {format(total_yr, ',d')} (M={format(male_yr, ',d')}, F={format(female_yr, ',d')})")
-
-            sub['DAY'] = sub['STUDY_DATE'].dt.date
-            group_day_yr = sub.groupby('DAY').size()
-            if len(group_day_yr)==0:
-                lines.append("  No working days.")
-            else:
-                min_st = group_day_yr.min()
-                max_st = group_day_yr.max()
-                avg_st = group_day_yr.mean()
-                lines.append(f"  Min in a day: {int(min_st)}  Max: {int(max_st)}  Average: {int(round(avg_st))}")
-            lines.append("")
-
-        final_text = "\n".join(lines)
-        self.text.insert(tk.END, final_text)
+        filename = filedialog.asksaveasfilename(
+            title="Export Studies Stats", defaultextension=".csv",
+            filetypes=[("CSV", "*.csv")]
+        )
+        if not filename:
+            return
+        with track_operation("Export Studies Stats"):
+            n_rows = export_studies_stats_csv(filename)
+        self.text.insert(tk.END, f"\n\nStudies stats table: {format(n_rows, ',d')} rows -> {filename}\n")
 
 # End of home_page.py
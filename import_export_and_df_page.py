@@ -14,12 +14,19 @@ Procedures/Functions/Metodi Principali:
   - do_import_firebird(): Chiama import_db_data() e mostra esito.
   - do_import_kb(): Chiama import_kb_data() e mostra esito.
   - do_clear_dataframes(): Azzera tutti i DataFrame in data_structures.
-  - do_download_dataframes_feather(): Salva tutti i DF in file .feather.
-  - do_load_dataframes_feather(): Carica i DF da file .feather.
+  - do_download_dataframes_feather(): Salva tutti i DF in file .feather + manifest.
+  - do_load_dataframes_feather(): Valida e carica i DF cambiati dallo snapshot.
+  - do_validate_snapshot(): Mostra esito della validazione e contenuto del manifest.
+  - do_diff_kb(): Confronta il KB corrente con il KB dello snapshot selezionato.
   - do_download_dataframes_json(): Salva i DF in .json.
   - do_show_memory_usage(): Mostra memoria impegnata dai DF, dalla RAM e dalla GPU (se presente).
   - select_df(df_name), show_prev_record(), show_next_record(), show_current_record():
-    navigazione base dei DataFrame.
+    navigazione dei DataFrame nella griglia virtualizzata (record selezionato
+    mostrato per intero nella text area).
+  - do_show_memory_profiler(): Apre MemoryProfilerWindow (memoria per colonna,
+    risparmi stimati, timeline RSS/CPU e crescita per operazione).
+  - VirtualDataFrameGrid(ttk.Frame): Treeview che materializza solo le righe
+    visibili, con sort per colonna, filtro vettoriale e salto a riga.
 
 Modifiche recenti:
   - 2025-01-14: Reinserite funzioni "save_to_json" e "import_kb_data"
@@ -28,7 +35,8 @@ Modifiche recenti:
 
 Note:
   - I DataFrame globali sono in data_structures.py
-  - Per la GPU si fa uso di GPUtil (se disponibile).
+  - Per la GPU si fa uso di GPUtil (se disponibile). psutil e GPUtil sono
+    importati solo in do_show_memory_usage() (import differito).
   - L'uso di FEATHER e JSON avviene in cartelle dedicate.
 
 
@@ -36,6 +44,28 @@ Modifiche recenti:
 - 2025-01-15: Aggiunta scritta "DataFrame: X" in grande, e 
   i pulsanti Prev/Next sono associati ai tasti sinistra e destra 
   (era già presente, ma confermiamo).
+- 2026-10-19: Save/Load FEATHER delegati a snapshot_functions (manifest con
+  hash/schema/watermark, file invariati non riletti). Combobox "Snapshot"
+  per salvare e passare rapidamente tra snapshot con nome.
+- 2026-10-19: Il browser record è ora una griglia virtualizzata
+  (VirtualDataFrameGrid): sort cliccando le intestazioni, filtro per colonna,
+  "Go to row". La memoria deep del DF è calcolata una volta per DF
+  (get_cached_memory_mb) invece che ad ogni Prev/Next.
+- 2026-10-19: Pulsante "Memory Profiler"; import, load e save FEATHER sono
+  registrati come operazioni nel ResourceSampler (memory_profiler_functions).
+- 2026-10-19: on_frames_ready(): comandi disabilitati durante il caricamento
+  in background all'avvio.
+- 2026-10-19: Download FEATHER salva anche l'indice full-text dei referti
+  nella cartella dello snapshot.
+- 2026-10-19: Download FEATHER salva anche la cache delle statistiche
+  della Home (stats_functions.save_home_stats).
+- 2026-10-19: Pulsante "Diff KB": conclusioni, regole e condizioni
+  aggiunte/rimosse/ri-parentate/modificate rispetto allo snapshot
+  selezionato (kb_diff_functions).
+- 2026-10-19: Download FEATHER salva anche il cubo giornaliero
+  (cube_functions.save_cube).
+- 2026-10-19: Cache della memoria dei DF per (nome, generazione), senza
+  riferimenti ai DF già sostituiti.
 
 Note:
 - Usa data_structures.* come archivio di DataFrame globali.
@@ -44,14 +74,33 @@ Note:
 import tkinter as tk
 from tkinter import ttk
 import os
+import numpy as np
 import pandas as pd
-import psutil
-import GPUtil
-import pyarrow.feather as feather
 
 import data_structures
+from snapshot_functions import (
+    DF_NAMES,
+    list_snapshots,
+    snapshot_folder,
+    save_snapshot,
+    load_snapshot,
+    read_manifest,
+    validate_snapshot
+)
+from memory_profiler_functions import (
+    get_sampler,
+    track_operation,
+    dataframes_memory_report,
+    operations_summary
+)
 from db_functions import import_db_data, save_to_json
+from fulltext_functions import save_fulltext_index
+from stats_functions import save_home_stats
+from cube_functions import save_cube
 from kb_functions import import_kb_data
+from kb_diff_functions import diff_kb, format_kb_diff
+
+DEFAULT_SNAPSHOT_LABEL = "(default)"
 
 class ImportExportAndDataFramePage(ttk.Frame):
     def __init__(self, parent):
@@ -60,17 +109,7 @@ class ImportExportAndDataFramePage(ttk.Frame):
         self.current_df_name = None
         self.current_index = 0
 
-        self.df_names = [
-            "Studies_DF",
-            "RulesConclusions_DF",
-            "FinalDiagnoses_DF",
-            "ClinicalDiagnoses_DF",
-            "KB_Conclusions_DF",
-            "KB_Rules_DF",
-            "KB_Conditions_DF",
-            "KB_Muscles_DF",
-            "KB_Nerves_DF"
-        ]
+        self.df_names = list(DF_NAMES)
 
         # Text area + scrollbar
         self.text_frame = ttk.Frame(self)
@@ -79,7 +118,7 @@ class ImportExportAndDataFramePage(ttk.Frame):
         self.scrollbar = ttk.Scrollbar(self.text_frame, orient=tk.VERTICAL)
         self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
-        self.text = tk.Text(self.text_frame, wrap=tk.WORD, yscrollcommand=self.scrollbar.set, height=25)
+        self.text = tk.Text(self.text_frame, wrap=tk.WORD, yscrollcommand=self.scrollbar.set, height=12)
         self.text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         self.scrollbar.config(command=self.text.yview)
 
@@ -121,6 +160,33 @@ class ImportExportAndDataFramePage(ttk.Frame):
                                        command=self.do_show_memory_usage)
         self.show_mem_btn.pack(side=tk.LEFT, padx=5)
 
+        self.mem_profiler_btn = ttk.Button(self.top_frame, text="Memory Profiler",
+                                           command=self.do_show_memory_profiler)
+        self.mem_profiler_btn.pack(side=tk.LEFT, padx=5)
+
+        # Snapshot FEATHER con nome
+        self.snapshot_frame = ttk.Frame(self)
+        self.snapshot_frame.pack(side=tk.TOP, fill=tk.X, pady=5)
+
+        ttk.Label(self.snapshot_frame, text="Snapshot:").pack(side=tk.LEFT, padx=5)
+        self.snapshot_var = tk.StringVar(value=DEFAULT_SNAPSHOT_LABEL)
+        self.snapshot_combo = ttk.Combobox(self.snapshot_frame, textvariable=self.snapshot_var, width=30)
+        self.snapshot_combo.pack(side=tk.LEFT, padx=5)
+        self.snapshot_combo.bind("<<ComboboxSelected>>", lambda e: self.do_load_dataframes_feather())
+        self.refresh_snapshot_list()
+
+        self.validate_snapshot_btn = ttk.Button(self.snapshot_frame, text="Validate Snapshot",
+                                                command=self.do_validate_snapshot)
+        self.validate_snapshot_btn.pack(side=tk.LEFT, padx=5)
+
+        self.reload_snapshot_btn = ttk.Button(self.snapshot_frame, text="Force Reload",
+                                              command=lambda: self.do_load_dataframes_feather(force=True))
+        self.reload_snapshot_btn.pack(side=tk.LEFT, padx=5)
+
+        self.diff_kb_btn = ttk.Button(self.snapshot_frame, text="Diff KB",
+                                      command=self.do_diff_kb)
+        self.diff_kb_btn.pack(side=tk.LEFT, padx=5)
+
         # DF selection + nav
         self.df_button_frame = ttk.Frame(self)
         self.df_button_frame.pack(side=tk.TOP, fill=tk.X, pady=5)
@@ -135,6 +201,21 @@ class ImportExportAndDataFramePage(ttk.Frame):
         self.nav_frame = ttk.Frame(self)
         self.nav_frame.pack(side=tk.TOP, fill=tk.X, pady=5)
 
+        # Griglia virtualizzata del DF selezionato
+        self.grid_header = ttk.Frame(self)
+        self.grid_header.pack(side=tk.TOP, fill=tk.X)
+
+        self.dfname_label = ttk.Label(self.grid_header, text="DataFrame: -", font=("Helvetica", 18, "bold"))
+        self.dfname_label.pack(side=tk.LEFT, padx=5)
+
+        self.grid_info_label = ttk.Label(self.grid_header, text="")
+        self.grid_info_label.pack(side=tk.LEFT, padx=10)
+
+        self.df_grid = VirtualDataFrameGrid(self, on_select=self.on_grid_select,
+                                         on_view_changed=self.on_grid_view_changed)
+        self.df_grid.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        self.mem_cache = {}
+
         self.prev_btn = ttk.Button(self.nav_frame, text="Prev", command=self.show_prev_record)
         self.prev_btn.pack(side=tk.LEFT, padx=5)
         self.prev_btn.bind_all("<Left>", self.on_left_arrow)
@@ -143,6 +224,23 @@ class ImportExportAndDataFramePage(ttk.Frame):
         self.next_btn.pack(side=tk.LEFT, padx=5)
         self.next_btn.bind_all("<Right>", self.on_right_arrow)
 
+        ttk.Label(self.nav_frame, text="Filter:").pack(side=tk.LEFT, padx=(20, 2))
+        self.filter_col_var = tk.StringVar()
+        self.filter_col_combo = ttk.Combobox(self.nav_frame, textvariable=self.filter_col_var,
+                                             state="readonly", width=20)
+        self.filter_col_combo.pack(side=tk.LEFT, padx=2)
+        self.filter_entry = ttk.Entry(self.nav_frame, width=25)
+        self.filter_entry.pack(side=tk.LEFT, padx=2)
+        self.filter_entry.bind("<Return>", lambda e: self.do_apply_filter())
+        ttk.Button(self.nav_frame, text="Apply", command=self.do_apply_filter).pack(side=tk.LEFT, padx=2)
+        ttk.Button(self.nav_frame, text="Clear", command=self.do_clear_filter).pack(side=tk.LEFT, padx=2)
+
+        ttk.Label(self.nav_frame, text="Go to row:").pack(side=tk.LEFT, padx=(20, 2))
+        self.jump_entry = ttk.Entry(self.nav_frame, width=10)
+        self.jump_entry.pack(side=tk.LEFT, padx=2)
+        self.jump_entry.bind("<Return>", lambda e: self.do_jump_to_row())
+        ttk.Button(self.nav_frame, text="Go", command=self.do_jump_to_row).pack(side=tk.LEFT, padx=2)
+
         self.update_buttons_state()
 
     def on_left_arrow(self, event):
@@ -156,8 +254,10 @@ class ImportExportAndDataFramePage(ttk.Frame):
     # ------------------------------------------------------------
     def do_import_firebird(self):
         self.text.delete("1.0", tk.END)
-        msg1 = import_db_data()
+        with track_operation("Import Firebird"):
+            msg1 = import_db_data()
         self.text.insert(tk.END, msg1 + "\n")
+        self.refresh_grid()
         self.update_buttons_state()
 
     # ------------------------------------------------------------
@@ -165,8 +265,10 @@ class ImportExportAndDataFramePage(ttk.Frame):
     # ------------------------------------------------------------
     def do_import_kb(self):
         self.text.delete("1.0", tk.END)
-        msg2 = import_kb_data()
+        with track_operation("Import KB"):
+            msg2 = import_kb_data()
         self.text.insert(tk.END, msg2 + "\n")
+        self.refresh_grid()
         self.update_buttons_state()
 
     # ------------------------------------------------------------
@@ -177,60 +279,105 @@ class ImportExportAndDataFramePage(ttk.Frame):
         for df_name in self.df_names:
             df = getattr(data_structures, df_name, None)
             if df is not None:
-                setattr(data_structures, df_name, df.iloc[0:0])
+                data_structures.set_dataframe(df_name, df.iloc[0:0])
         self.text.insert(tk.END, "All DataFrames cleared.\n")
 
         self.current_df_name = None
         self.current_index = 0
+        for btn in self.df_buttons.values():
+            btn.config(state=tk.NORMAL)
+        self.dfname_label.config(text="DataFrame: -")
+        self.df_grid.set_dataframe(None)
+        self.update_grid_info()
         self.update_buttons_state()
 
+    # ------------------------------------------------------------
+    # SNAPSHOT (nome selezionato nella combobox)
+    # ------------------------------------------------------------
+    def get_snapshot_name(self):
+        """
+        Nome dello snapshot selezionato: "(default)" => "".
+        """
+        name = self.snapshot_var.get().strip()
+        if name == DEFAULT_SNAPSHOT_LABEL:
+            return ""
+        return name
+
+    def refresh_snapshot_list(self):
+        names = [n if n else DEFAULT_SNAPSHOT_LABEL for n in list_snapshots()]
+        self.snapshot_combo.config(values=names)
+
     # ------------------------------------------------------------
     # DOWNLOAD FEATHER
     # ------------------------------------------------------------
     def do_download_dataframes_feather(self):
         self.text.delete("1.0", tk.END)
-        folder = "DataFrame Download FEATHER"
-        if not os.path.exists(folder):
-            os.makedirs(folder)
-
-        self.text.insert(tk.END, f"Downloading all DataFrames to FEATHER in {folder}...\n\n")
-
-        for df_name in self.df_names:
-            df = getattr(data_structures, df_name, None)
-            if df is None or df.empty:
-                self.text.insert(tk.END, f"{df_name} is empty or None. Skipping.\n")
-                continue
-            filename = os.path.join(folder, f"{df_name}.feather")
-            df.reset_index(drop=True, inplace=True)
-            feather.write_feather(df, filename)
-            self.text.insert(tk.END, f"Saved {df_name} -> {filename}\n")
-
+        with track_operation("Save FEATHER"):
+            lines = save_snapshot(self.get_snapshot_name())
+            if not data_structures.Studies_DF.empty:
+                filename = save_fulltext_index(self.get_snapshot_name())
+                lines.append(f"Saved full-text index -> {filename}")
+                filename = save_cube(self.get_snapshot_name())
+                if filename:
+                    lines.append(f"Saved daily cube -> {filename}")
+            filename = save_home_stats(self.get_snapshot_name())
+            if filename:
+                lines.append(f"Saved Home statistics cache -> {filename}")
+        self.text.insert(tk.END, "\n".join(lines) + "\n")
         self.text.insert(tk.END, "\nDone.\n")
+        self.refresh_snapshot_list()
 
     # ------------------------------------------------------------
     # LOAD FEATHER
     # ------------------------------------------------------------
-    def do_load_dataframes_feather(self):
+    def do_load_dataframes_feather(self, force=False):
         self.text.delete("1.0", tk.END)
-        folder = "DataFrame Download FEATHER"
-        self.text.insert(tk.END, f"Loading DataFrames from FEATHER in {folder}...\n\n")
-
-        for df_name in self.df_names:
-            filename = os.path.join(folder, f"{df_name}.feather")
-            if not os.path.exists(filename):
-                self.text.insert(tk.END, f"File {filename} not found, skipping.\n")
-                continue
-            loaded_df = feather.read_feather(filename)
-            setattr(data_structures, df_name, loaded_df)
-            self.text.insert(tk.END, f"Loaded {df_name}: {len(loaded_df)} records.\n")
-
+        with track_operation("Load FEATHER"):
+            lines = load_snapshot(self.get_snapshot_name(), force=force)
+        self.text.insert(tk.END, "\n".join(lines) + "\n")
         self.text.insert(tk.END, "\nDone.\n")
 
-        if self.current_df_name:
-            self.current_index = 0
-            self.select_df(self.current_df_name)
+        self.refresh_grid()
         self.update_buttons_state()
 
+    # ------------------------------------------------------------
+    # VALIDATE SNAPSHOT
+    # ------------------------------------------------------------
+    def do_validate_snapshot(self):
+        self.text.delete("1.0", tk.END)
+        name = self.get_snapshot_name()
+        self.text.insert(tk.END, f"Validating snapshot in {snapshot_folder(name)}...\n\n")
+        errors, warnings = validate_snapshot(name)
+        for e in errors:
+            self.text.insert(tk.END, f"Error: {e}\n", "redbold")
+        for w in warnings:
+            self.text.insert(tk.END, f"Warning: {w}\n")
+        manifest = read_manifest(name)
+        if manifest:
+            self.text.insert(tk.END, f"\nSaved at: {manifest.get('saved_at')}\n")
+            for df_name, entry in manifest['frames'].items():
+                marks = ", ".join(f"{k}={v}" for k, v in entry.get('watermarks', {}).items())
+                self.text.insert(
+                    tk.END,
+                    f"{df_name}: rows={entry['rows']}, size={entry['size'] / 1024**2:.2f} MB, "
+                    f"imported={entry.get('imported_at')} {marks}\n"
+                )
+        if not errors:
+            self.text.insert(tk.END, "\nSnapshot is consistent.\n")
+
+    # ------------------------------------------------------------
+    # DIFF KB (snapshot selezionato -> KB corrente)
+    # ------------------------------------------------------------
+    def do_diff_kb(self):
+        self.text.delete("1.0", tk.END)
+        name = self.get_snapshot_name()
+        try:
+            result = diff_kb(name)
+        except Exception as e:
+            self.text.insert(tk.END, f"Error reading KB from {snapshot_folder(name)}: {e}\n", "redbold")
+            return
+        self.text.insert(tk.END, "\n".join(format_kb_diff(result)) + "\n")
+
     # ------------------------------------------------------------
     # DOWNLOAD JSON
     # ------------------------------------------------------------
@@ -265,7 +412,7 @@ class ImportExportAndDataFramePage(ttk.Frame):
             df = getattr(data_structures, df_name, None)
             if df is not None:
                 c = len(df)
-                mem = df.memory_usage(deep=True).sum() / 1024**2
+                mem = self.get_cached_memory_mb(df_name, df)
                 total_mem_df += mem
                 lines.append(f"{df_name}: records={c}, mem={mem:.2f} MB")
             else:
@@ -274,6 +421,7 @@ class ImportExportAndDataFramePage(ttk.Frame):
         lines.append(f"Total memory usage (all DataFrames): {total_mem_df:.2f} MB")
         lines.append("----------------------------------")
 
+        import psutil
         svmem = psutil.virtual_memory()
         total_ram_gb = svmem.total / (1024**3)
         avail_ram_gb = svmem.available / (1024**3)
@@ -286,6 +434,7 @@ class ImportExportAndDataFramePage(ttk.Frame):
         lines.append(f"Python process usage: {used_by_python_mb:.2f} MB")
 
         try:
+            import GPUtil
             gpus = GPUtil.getGPUs()
             if gpus:
                 for i, gpu in enumerate(gpus):
@@ -300,7 +449,13 @@ class ImportExportAndDataFramePage(ttk.Frame):
         self.text.insert(tk.END, "\n".join(lines))
 
     # ------------------------------------------------------------
-    # NAVIGAZIONE DF
+    # MEMORY PROFILER
+    # ------------------------------------------------------------
+    def do_show_memory_profiler(self):
+        MemoryProfilerWindow(self, self.df_names)
+
+    # ------------------------------------------------------------
+    # NAVIGAZIONE DF (griglia virtualizzata)
     # ------------------------------------------------------------
     def select_df(self, df_name):
         for name, btn in self.df_buttons.items():
@@ -309,26 +464,67 @@ class ImportExportAndDataFramePage(ttk.Frame):
 
         self.current_df_name = df_name
         self.current_index = 0
+        self.dfname_label.config(text=f"DataFrame: {df_name}")
+        self.df_grid.set_dataframe(self.get_df_current())
+        self.update_grid_info()
         self.show_current_record()
 
     def show_prev_record(self):
-        if not self.current_df_name:
-            return
-        df = self.get_df_current()
-        if df is None or len(df) == 0:
+        if not self.current_df_name or self.df_grid.view_len() == 0:
             return
         if self.current_index > 0:
             self.current_index -= 1
+        self.df_grid.select_position(self.current_index)
         self.show_current_record()
 
     def show_next_record(self):
+        if not self.current_df_name or self.df_grid.view_len() == 0:
+            return
+        if self.current_index < self.df_grid.view_len() - 1:
+            self.current_index += 1
+        self.df_grid.select_position(self.current_index)
+        self.show_current_record()
+
+    def refresh_grid(self):
+        """
+        Ricarica nella griglia il DF selezionato (dopo import/load),
+        senza cancellare i messaggi della text area.
+        """
         if not self.current_df_name:
             return
-        df = self.get_df_current()
-        if df is None or len(df) == 0:
+        self.current_index = 0
+        self.df_grid.set_dataframe(self.get_df_current())
+        self.update_grid_info()
+
+    def on_grid_select(self, view_pos):
+        """
+        Callback della griglia: riga selezionata (posizione nella vista).
+        """
+        self.current_index = view_pos
+        self.show_current_record()
+
+    def on_grid_view_changed(self):
+        """
+        Callback della griglia: sort/filtro cambiati.
+        """
+        self.current_index = 0
+        self.update_grid_info()
+        self.show_current_record()
+
+    def do_apply_filter(self):
+        self.df_grid.apply_filter(self.filter_col_var.get(), self.filter_entry.get())
+
+    def do_clear_filter(self):
+        self.filter_entry.delete(0, tk.END)
+        self.df_grid.apply_filter(None, "")
+
+    def do_jump_to_row(self):
+        val_str = self.jump_entry.get().strip()
+        if not val_str.isdigit():
             return
-        if self.current_index < len(df) - 1:
-            self.current_index += 1
+        pos = min(int(val_str), max(self.df_grid.view_len() - 1, 0))
+        self.current_index = pos
+        self.df_grid.select_position(pos)
         self.show_current_record()
 
     def get_df_current(self):
@@ -337,7 +533,39 @@ class ImportExportAndDataFramePage(ttk.Frame):
         df = getattr(data_structures, self.current_df_name, None)
         return df
 
+    def get_cached_memory_mb(self, df_name, df):
+        """
+        Memoria (deep) del DF in MB, calcolata una sola volta per
+        generazione del DF (la cache si invalida quando il DF in
+        data_structures viene sostituito da import/load/clear).
+        La cache non tiene riferimenti ai DF.
+        """
+        key = (df_name, data_structures.get_generation(df_name))
+        mem = self.mem_cache.get(key)
+        if mem is None:
+            mem = df.memory_usage(deep=True).sum() / 1024**2
+            self.mem_cache[key] = mem
+        return mem
+
+    def update_grid_info(self):
+        df = self.get_df_current()
+        cols = list(df.columns) if df is not None else []
+        self.filter_col_combo.config(values=cols)
+        if cols and self.filter_col_var.get() not in cols:
+            self.filter_col_var.set(cols[0])
+        if df is None:
+            self.grid_info_label.config(text="")
+            return
+        mem = self.get_cached_memory_mb(self.current_df_name, df)
+        self.grid_info_label.config(
+            text=f"Total records: {len(df):,d}  Shown: {self.df_grid.view_len():,d}  Memory allocated: {mem:.2f} MB"
+        )
+
     def show_current_record(self):
+        """
+        Mostra nella text area il record selezionato (tutte le colonne,
+        testo completo) con i relativi dtype.
+        """
         self.text.delete("1.0", tk.END)
         if not self.current_df_name:
             self.text.insert(tk.END, "No DF selected.\n")
@@ -348,34 +576,46 @@ class ImportExportAndDataFramePage(ttk.Frame):
             self.text.insert(tk.END, f"{self.current_df_name} not found.\n")
             return
 
-        total_records = len(df)
+        total_records = self.df_grid.view_len()
         if total_records == 0:
-            self.text.insert(tk.END, f"{self.current_df_name} is empty.\n")
+            self.text.insert(tk.END, f"{self.current_df_name} is empty (or no record matches the filter).\n")
             return
 
         if self.current_index < 0 or self.current_index >= total_records:
             self.text.insert(tk.END, "Index out of range.\n")
             return
 
-        # Nuovo: stampa il nome del DF in grande
+        # Nome del DF in grande
         self.text.insert(tk.END, f"{self.current_df_name}\n", "dfname_tag")
 
-        row = df.iloc[self.current_index]
-        row_dict = row.to_dict()
-
-        mem = df.memory_usage(deep=True).sum() / 1024**2
-
+        row_pos = self.df_grid.row_position(self.current_index)
         self.text.insert(tk.END, f"Total records: {total_records} / Current record: ")
         self.text.insert(tk.END, str(self.current_index), "bold")
-        self.text.insert(tk.END, "\n")
-        self.text.insert(tk.END, f"Memory allocated: {mem:.2f} MB\n\n")
+        self.text.insert(tk.END, f" (row {row_pos})\n\n")
 
         for col in df.columns:
             dtype = df[col].dtype
-            val = row_dict.get(col)
+            val = df[col].iat[row_pos]
             self.text.insert(tk.END, f"{col} ({dtype}): ", "redbold")
             self.text.insert(tk.END, f"{val}\n")
 
+    def on_frames_ready(self, ready, loading):
+        """
+        Chiamato dalla MainApplication durante il caricamento in background:
+        i comandi che modificano i DF restano disabilitati finché il
+        caricamento non è terminato.
+        """
+        state = tk.DISABLED if loading else tk.NORMAL
+        for btn in (self.import_firebird_btn, self.import_kb_btn, self.clear_df_btn,
+                    self.load_feather_btn, self.reload_snapshot_btn, self.diff_kb_btn):
+            btn.config(state=state)
+        self.snapshot_combo.config(state=tk.DISABLED if loading else tk.NORMAL)
+        if not loading:
+            self.update_buttons_state()
+        else:
+            self.download_feather_btn.config(state=tk.DISABLED)
+            self.download_json_btn.config(state=tk.DISABLED)
+
     def update_buttons_state(self):
         is_any_populated = False
         for df_name in self.df_names:
@@ -390,5 +630,317 @@ class ImportExportAndDataFramePage(ttk.Frame):
             self.download_feather_btn.config(state=tk.DISABLED)
             self.download_json_btn.config(state=tk.DISABLED)
 
+
+class VirtualDataFrameGrid(ttk.Frame):
+    """
+    Griglia virtualizzata (ttk.Treeview) per DataFrame di milioni di righe.
+     - Il Treeview contiene solo le righe visibili: ad ogni scroll si
+       rimpiazzano gli item leggendo df.iloc[posizioni visibili].
+     - self.order è l'array delle posizioni (righe del DF) nella vista
+       corrente: filtri e sort sono operazioni pandas/numpy vettoriali
+       che producono un nuovo order, senza copiare il DF.
+     - La scrollbar è gestita a mano (frazione offset/len(order)).
+    Callback:
+      on_select(view_pos): riga selezionata (posizione nella vista).
+      on_view_changed(): sort o filtro cambiati.
+    """
+    MAX_CELL_CHARS = 80
+
+    def __init__(self, parent, on_select=None, on_view_changed=None):
+        super().__init__(parent)
+        self.on_select = on_select
+        self.on_view_changed = on_view_changed
+
+        self.df = None
+        self.order = np.arange(0)
+        self.offset = 0
+        self.visible_rows = 20
+        self.sort_col = None
+        self.sort_asc = True
+        self.filter_mask = None
+        self.selected_pos = None
+
+        self.tree = ttk.Treeview(self, show="headings", selectmode="browse", height=self.visible_rows)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.vscroll = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.on_scrollbar)
+        self.vscroll.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.tree.bind("<Configure>", self.on_configure)
+        self.tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll_rows(-3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll_rows(3))
+        self.tree.bind("<<TreeviewSelect>>", self.on_tree_select)
+        self.tree.bind("<Up>", lambda e: self.move_selection(-1))
+        self.tree.bind("<Down>", lambda e: self.move_selection(1))
+        self.tree.bind("<Prior>", lambda e: self.move_selection(-self.visible_rows))
+        self.tree.bind("<Next>", lambda e: self.move_selection(self.visible_rows))
+
+    # ---------------- dati ----------------
+    def set_dataframe(self, df):
+        self.df = df
+        self.sort_col = None
+        self.sort_asc = True
+        self.filter_mask = None
+        self.offset = 0
+        self.selected_pos = None
+
+        cols = ["#"] + (list(df.columns) if df is not None else [])
+        self.tree.config(columns=cols)
+        for col in cols:
+            self.tree.heading(col, text=col, command=lambda c=col: self.sort_by(c))
+            self.tree.column(col, width=60 if col == "#" else 120, stretch=False)
+        self.order = np.arange(len(df)) if df is not None else np.arange(0)
+        self.render()
+
+    def view_len(self):
+        return len(self.order)
+
+    def row_position(self, view_pos):
+        """
+        Posizione nel DF della riga view_pos della vista corrente.
+        """
+        return int(self.order[view_pos])
+
+    def _rebuild_order(self):
+        """
+        Ricalcola order = righe filtrate, ordinate per sort_col (vettoriale).
+        """
+        if self.df is None:
+            self.order = np.arange(0)
+            return
+        if self.filter_mask is None:
+            order = np.arange(len(self.df))
+        else:
+            order = np.flatnonzero(self.filter_mask)
+        if self.sort_col is not None and len(order) > 0:
+            keys = self.df[self.sort_col].take(order).reset_index(drop=True)
+            idx = keys.sort_values(ascending=self.sort_asc, na_position='last', kind='stable').index.to_numpy()
+            order = order[idx]
+        self.order = order
+
+    def sort_by(self, col):
+        if self.df is None or col == "#":
+            self.sort_col = None
+        elif self.sort_col == col:
+            self.sort_asc = not self.sort_asc
+        else:
+            self.sort_col = col
+            self.sort_asc = True
+        self._rebuild_order()
+        self.offset = 0
+        self.selected_pos = None
+        self.render()
+        if self.on_view_changed:
+            self.on_view_changed()
+
+    def apply_filter(self, col, text):
+        """
+        Filtro vettoriale sulla colonna col:
+         - colonne numeriche: uguaglianza se text è un numero;
+         - altre colonne: substring case-insensitive.
+        text vuoto => nessun filtro.
+        """
+        if self.df is None:
+            return
+        text = (text or "").strip()
+        if not col or not text or col not in self.df.columns:
+            self.filter_mask = None
+        else:
+            series = self.df[col]
+            if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+                try:
+                    val = float(text)
+                except ValueError:
+                    val = None
+                mask = (series == val) if val is not None else pd.Series(False, index=series.index)
+            elif pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+                mask = series.str.contains(text, case=False, regex=False, na=False)
+            else:
+                mask = series.astype(str).str.contains(text, case=False, regex=False, na=False)
+            self.filter_mask = mask.fillna(False).to_numpy(dtype=bool)
+        self._rebuild_order()
+        self.offset = 0
+        self.selected_pos = None
+        self.render()
+        if self.on_view_changed:
+            self.on_view_changed()
+
+    # ---------------- rendering ----------------
+    def _format_cell(self, val):
+        if val is None or (not isinstance(val, str) and pd.isna(val)):
+            return ""
+        s = str(val).replace("\n", " ")
+        if len(s) > self.MAX_CELL_CHARS:
+            s = s[:self.MAX_CELL_CHARS] + "..."
+        return s
+
+    def render(self):
+        """
+        Materializza solo le righe visibili [offset, offset+visible_rows).
+        """
+        self.tree.delete(*self.tree.get_children())
+        n = len(self.order)
+        if self.df is None or n == 0:
+            self.vscroll.set(0.0, 1.0)
+            return
+        self.offset = max(0, min(self.offset, max(n - self.visible_rows, 0)))
+        positions = self.order[self.offset:self.offset + self.visible_rows]
+        block = self.df.iloc[positions]
+        columns = [block[c].tolist() for c in block.columns]
+        for i, pos in enumerate(positions):
+            view_pos = self.offset + i
+            values = [view_pos] + [self._format_cell(col_vals[i]) for col_vals in columns]
+            self.tree.insert("", tk.END, iid=str(view_pos), values=values)
+        if self.selected_pos is not None and self.tree.exists(str(self.selected_pos)):
+            self.tree.selection_set(str(self.selected_pos))
+            self.tree.focus(str(self.selected_pos))
+        self.vscroll.set(self.offset / n, min(1.0, (self.offset + len(positions)) / n))
+
+    def scroll_rows(self, delta):
+        self.offset += delta
+        self.render()
+
+    def scroll_to(self, view_pos):
+        """
+        Porta view_pos nella finestra visibile (se non lo è già).
+        """
+        if view_pos < self.offset:
+            self.offset = view_pos
+        elif view_pos >= self.offset + self.visible_rows:
+            self.offset = view_pos - self.visible_rows + 1
+        self.render()
+
+    def select_position(self, view_pos):
+        if not (0 <= view_pos < len(self.order)):
+            return
+        self.selected_pos = view_pos
+        self.scroll_to(view_pos)
+
+    def move_selection(self, delta):
+        if len(self.order) == 0:
+            return "break"
+        current = self.selected_pos if self.selected_pos is not None else self.offset
+        new_pos = max(0, min(current + delta, len(self.order) - 1))
+        self.select_position(new_pos)
+        if self.on_select:
+            self.on_select(new_pos)
+        return "break"
+
+    # ---------------- eventi ----------------
+    def on_scrollbar(self, *args):
+        n = len(self.order)
+        if n == 0:
+            return
+        if args[0] == "moveto":
+            self.offset = int(float(args[1]) * n)
+        elif args[0] == "scroll":
+            step = int(args[1])
+            if args[2] == "pages":
+                step *= self.visible_rows
+            self.offset += step
+        self.render()
+
+    def on_mousewheel(self, event):
+        self.scroll_rows(-3 if event.delta > 0 else 3)
+        return "break"
+
+    def on_configure(self, event):
+        # ~20 px per riga (font di default del Treeview)
+        rows = max(5, (event.height - 25) // 20)
+        if rows != self.visible_rows:
+            self.visible_rows = rows
+            self.tree.config(height=rows)
+            self.render()
+
+    def on_tree_select(self, event):
+        sel = self.tree.selection()
+        if not sel:
+            return
+        view_pos = int(sel[0])
+        if view_pos == self.selected_pos:
+            return
+        self.selected_pos = view_pos
+        if self.on_select:
+            self.on_select(view_pos)
+
+
+class MemoryProfilerWindow(tk.Toplevel):
+    """
+    Finestra "Memory Profiler":
+     - memoria per DF/colonna/dtype con dtype suggerito e risparmio stimato;
+     - crescita RSS aggregata per operazione (import, graph, stats...);
+     - timeline campionata di RSS e CPU (aggiornata ogni 2 secondi).
+    """
+    REFRESH_MS = 2000
+    TIMELINE_ROWS = 40
+
+    def __init__(self, parent, df_names):
+        super().__init__(parent)
+        self.title("Memory Profiler")
+        self.geometry("1000x800")
+        self.df_names = df_names
+
+        self.btn_frame = ttk.Frame(self)
+        self.btn_frame.pack(side=tk.TOP, fill=tk.X, pady=5)
+        ttk.Button(self.btn_frame, text="Refresh Columns",
+                   command=self.show_columns).pack(side=tk.LEFT, padx=5)
+        self.sampler_label = ttk.Label(self.btn_frame, text="")
+        self.sampler_label.pack(side=tk.LEFT, padx=10)
+
+        self.paned = ttk.PanedWindow(self, orient=tk.VERTICAL)
+        self.paned.pack(fill=tk.BOTH, expand=True)
+
+        self.columns_text = tk.Text(self.paned, wrap=tk.NONE, height=20, font=("Courier", 9))
+        self.timeline_text = tk.Text(self.paned, wrap=tk.NONE, height=20, font=("Courier", 9))
+        self.paned.add(self.columns_text, weight=1)
+        self.paned.add(self.timeline_text, weight=1)
+
+        if not get_sampler().start():
+            self.sampler_label.config(text="psutil not installed: no resource timeline.")
+
+        self.show_columns()
+        self.refresh_timeline()
+
+    def show_columns(self):
+        self.columns_text.delete("1.0", tk.END)
+        with track_operation("Memory Profiler"):
+            rep = dataframes_memory_report(self.df_names)
+        if rep.empty:
+            self.columns_text.insert(tk.END, "No DataFrames loaded.\n")
+            return
+        lines = [f"{'DataFrame':<22}{'Column':<22}{'Dtype':<16}{'MB':>10}{'Unique':>10}  "
+                 f"{'Suggested':<10}{'Est. MB':>10}{'Saving MB':>11}"]
+        for _, r in rep.iterrows():
+            uniq = "" if pd.isna(r['UNIQUE']) else f"{int(r['UNIQUE']):,d}"
+            lines.append(f"{r['DF_NAME']:<22}{r['COLUMN']:<22}{r['DTYPE']:<16}{r['MB']:>10.2f}{uniq:>10}  "
+                         f"{r['SUGGESTED']:<10}{r['EST_MB']:>10.2f}{r['SAVING_MB']:>11.2f}")
+        lines.append("")
+        by_df = rep.groupby('DF_NAME', sort=False)[['MB', 'SAVING_MB']].sum()
+        for df_name, r in by_df.iterrows():
+            lines.append(f"{df_name}: {r['MB']:.2f} MB, estimated saving {r['SAVING_MB']:.2f} MB")
+        lines.append(f"TOTAL: {rep['MB'].sum():.2f} MB, estimated saving {rep['SAVING_MB'].sum():.2f} MB")
+        self.columns_text.insert(tk.END, "\n".join(lines) + "\n")
+
+    def refresh_timeline(self):
+        if not self.winfo_exists():
+            return
+        sampler = get_sampler()
+        self.timeline_text.delete("1.0", tk.END)
+        lines = ["RSS GROWTH BY OPERATION:"]
+        summary = operations_summary()
+        if summary.empty:
+            lines.append("  (no operations recorded)")
+        for _, r in summary.iterrows():
+            lines.append(f"  {r['NAME']:<30} x{int(r['COUNT']):<4} delta {r['TOTAL_DELTA_MB']:>+9.1f} MB  "
+                         f"peak {r['MAX_PEAK_DELTA_MB']:>+9.1f} MB  time {r['TOTAL_TIME_S']:.2f}s")
+        lines.append("")
+        lines.append("TIMELINE (last samples):")
+        tl = sampler.timeline(last=self.TIMELINE_ROWS)
+        for _, r in tl.iloc[::-1].iterrows():
+            lines.append(f"  t={r['T_S']:>8.1f}s  RSS={r['RSS_MB']:>9.1f} MB  CPU={r['CPU_PCT']:>5.1f}%  {r['OPERATION']}")
+        self.timeline_text.insert(tk.END, "\n".join(lines) + "\n")
+        self.after(self.REFRESH_MS, self.refresh_timeline)
+
 # End of import_export_and_df_page.py
 
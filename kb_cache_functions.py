@@ -0,0 +1,320 @@
+"""
+Filename: kb_cache_functions.py
+===============================
+
+Scopo:
+  - Cache di strutture derivate da KB_Conclusions_DF, ricostruita solo
+    quando cambia la generazione del DF (data_structures.set_dataframe).
+  - Lookup table (array numpy indicizzati per CODE della conclusione)
+    per i filtri di Explore Studies e per la descrizione (STR):
+    il filtro delle conclusioni di uno studio è un singolo gather
+    lut[codes] invece di unique()/isin() su tutto il KB.
+
+Procedures/Functions/Classi Principali:
+  - KBConclusionCache: LUT per CODE (known, in_report, not_warning,
+    group_code, str) + maschere combinate per le modalità di visualizzazione
+    + colonne derivate dei tag di visualizzazione (DISPLAY_TAGS, CONCEPT_FLAGS).
+  - compute_display_tags(kb_df): tag "[INT,RES,GEN,W,Depth N]" di tutte le
+    conclusioni in un solo passaggio vettoriale.
+  - compute_concept_flags(kb_df): bandierine " [RES] [^] [INT] [GEN]" del
+    Concept Graph, vettoriali.
+  - get_kb_cache(): cache corrente (ricostruita al cambio generazione).
+  - codes_to_index(codes, size): codici -> indici validi per il gather.
+  - KBHierarchy: indici della gerarchia (radici, figli per PARENT_ID,
+    ID -> riga, regole per CONCLUSION_CODE, condizioni per RULE_ID).
+  - get_kb_hierarchy(): gerarchia corrente (ricostruita se cambia il KB).
+
+Modifiche recenti:
+  - 2026-10-19: Creazione del modulo.
+  - 2026-10-19: KBHierarchy per il browser ad albero di Explore KB.
+  - 2026-10-19: DISPLAY_TAGS / CONCEPT_FLAGS precalcolati (GEN con groupby
+    su PARENT_ID), riusati da ExploreKBPage e ConceptTreeWindow.
+  - 2026-10-19: conclusion_str() non solleva eccezioni per codici non
+    numerici o non interi ("ConclusionCode=<code>" come in precedenza).
+
+Note:
+  - Semantica identica ai filtri precedenti: un CODE assente dal KB non
+    passa i filtri "in report" / "no warning"; con più righe KB per lo
+    stesso CODE basta una riga con il flag (come isin sui codici unici).
+  - STR: prima riga del KB con quel CODE (come get_conclusion_str).
+"""
+
+import numpy as np
+import pandas as pd
+
+import data_structures
+
+
+def codes_to_index(codes, size):
+    """
+    Converte un array/Series di codici (anche nullable) in indici int64
+    per il gather sulle LUT: i codici NA, negativi o >= size diventano size
+    (la LUT ha una cella "sentinella" finale a False/-1/None).
+    """
+    values = pd.array(codes, dtype='Int64')
+    idx = values.to_numpy(dtype='int64', na_value=size)
+    idx[(idx < 0) | (idx > size)] = size
+    return idx
+
+
+class KBConclusionCache:
+    """
+    LUT per CODE costruite da KB_Conclusions_DF. Ogni array ha size+1 celle
+    (l'ultima è la sentinella per i codici sconosciuti):
+      known[c]        CODE presente nel KB
+      in_report[c]    SHOW_IN_REPORTS_BL (almeno una riga)
+      not_warning[c]  WARNING_BL == False (almeno una riga)
+      group_code[c]   GROUP_CODE del KB (-1 se assente)
+      str_lut[c]      STR (object, None se assente)
+    mode_mask(only_in_report, show_warn) ritorna la maschera combinata
+    per la modalità di visualizzazione (calcolata una volta).
+    """
+    def __init__(self, kb_df, generation=None):
+        self.generation = generation
+        self.empty = kb_df.empty
+        codes = kb_df['CODE'].to_numpy(dtype='int64') if not kb_df.empty else np.empty(0, dtype='int64')
+        codes_ok = codes >= 0
+        self.size = int(codes[codes_ok].max()) + 1 if codes_ok.any() else 0
+        n = self.size + 1
+
+        def flag(col, value=True):
+            lut = np.zeros(n, dtype=bool)
+            if col in kb_df.columns and len(codes):
+                sel = codes_ok & (kb_df[col].to_numpy() == value)
+                lut[codes[sel]] = True
+            return lut
+
+        self.known = np.zeros(n, dtype=bool)
+        self.known[codes[codes_ok]] = True
+        self.in_report = flag('SHOW_IN_REPORTS_BL')
+        self.not_warning = flag('WARNING_BL', False)
+
+        self.group_code = np.full(n, -1, dtype='int64')
+        self.str_lut = np.full(n, None, dtype=object)
+        if len(codes):
+            # Scrittura in ordine inverso: vince la prima riga del KB per ogni CODE
+            rev = codes_ok[::-1]
+            self.group_code[codes[::-1][rev]] = kb_df['GROUP_CODE'].to_numpy(dtype='int64')[::-1][rev]
+            self.str_lut[codes[::-1][rev]] = kb_df['STR'].astype(str).to_numpy()[::-1][rev]
+
+        self._mode_masks = {}
+
+        # Colonne derivate (allineate alle righe del KB) e accesso per ID
+        self.display_tags = compute_display_tags(kb_df)
+        self.concept_flags = compute_concept_flags(kb_df)
+        ids = kb_df['ID'].to_numpy() if not kb_df.empty else np.empty(0)
+        first = ~pd.Series(ids).duplicated(keep='first').to_numpy()
+        self.display_tags_by_id = dict(zip(ids[first], self.display_tags.to_numpy()[first]))
+        self.concept_flags_by_id = dict(zip(ids[first], self.concept_flags.to_numpy()[first]))
+
+    def index(self, codes):
+        return codes_to_index(codes, self.size)
+
+    def mode_mask(self, only_in_report, show_warn):
+        """
+        LUT booleana delle conclusioni da mostrare per la modalità.
+        Con KB vuoto non si filtra nulla (come in precedenza).
+        """
+        key = (bool(only_in_report), bool(show_warn))
+        mask = self._mode_masks.get(key)
+        if mask is None:
+            mask = np.ones(self.size + 1, dtype=bool)
+            if not self.empty:
+                if only_in_report:
+                    mask &= self.in_report
+                if not show_warn:
+                    mask &= self.not_warning
+            self._mode_masks[key] = mask
+        return mask
+
+    def conclusion_str(self, code):
+        """
+        STR della conclusione o "ConclusionCode=code" se non trovata.
+        La LUT è usata solo per valori interi esatti (12 o 12.0, non 12.5);
+        codici non numerici come "?" (CODE mancante nel grafo) non sono trovati.
+        """
+        try:
+            value = float(code)
+        except (TypeError, ValueError):
+            return f"ConclusionCode={code}"
+        if not value.is_integer():
+            return f"ConclusionCode={code}"
+        pos = int(value)
+        if 0 <= pos < self.size and self.str_lut[pos] is not None:
+            return self.str_lut[pos]
+        return f"ConclusionCode={code}"
+
+
+def _bool_col(df, col):
+    if col not in df.columns:
+        return np.zeros(len(df), dtype=bool)
+    return df[col].fillna(False).to_numpy(dtype=bool)
+
+
+def _has_set_parent_child(df):
+    """
+    True per le conclusioni con almeno un figlio con SET_PARENT_TRUE_BL
+    (groupby su PARENT_ID, poi lookup per ID).
+    """
+    if df.empty or 'SET_PARENT_TRUE_BL' not in df.columns:
+        return np.zeros(len(df), dtype=bool)
+    any_by_parent = pd.Series(_bool_col(df, 'SET_PARENT_TRUE_BL')).groupby(
+        df['PARENT_ID'].to_numpy()
+    ).any()
+    return df['ID'].map(any_by_parent).fillna(False).to_numpy(dtype=bool)
+
+
+def compute_display_tags(kb_df):
+    """
+    Series (stesso indice di kb_df) con il tag di Explore KB di ogni conclusione:
+      INT se non SHOW_IN_REPORTS_BL, RES se RESERVED_BL,
+      GEN se ha un figlio con SET_PARENT_TRUE_BL, W se WARNING_BL, Depth N.
+    Es. "[INT,GEN,Depth 4]".
+    """
+    if kb_df.empty:
+        return pd.Series([], index=kb_df.index, dtype=object)
+    parts = [
+        np.where(~_bool_col(kb_df, 'SHOW_IN_REPORTS_BL'), "INT,", ""),
+        np.where(_bool_col(kb_df, 'RESERVED_BL'), "RES,", ""),
+        np.where(_has_set_parent_child(kb_df), "GEN,", ""),
+        np.where(_bool_col(kb_df, 'WARNING_BL'), "W,", "")
+    ]
+    depth = kb_df['DEPTH'].astype(str) if 'DEPTH' in kb_df.columns else pd.Series("0", index=kb_df.index)
+    prefix = pd.Series(parts[0], index=kb_df.index, dtype=object)
+    for part in parts[1:]:
+        prefix = prefix + part
+    return "[" + prefix + "Depth " + depth + "]"
+
+
+def compute_concept_flags(kb_df):
+    """
+    Series con le bandierine di ConceptTreeWindow (stringa vuota o con spazio
+    iniziale): " [RES] [^] [INT] [GEN]".
+    """
+    if kb_df.empty:
+        return pd.Series([], index=kb_df.index, dtype=object)
+    flags = pd.Series("", index=kb_df.index, dtype=object)
+    for mask, text in [
+        (_bool_col(kb_df, 'RESERVED_BL'), " [RES]"),
+        (_bool_col(kb_df, 'SET_PARENT_TRUE_BL'), " [^]"),
+        (~_bool_col(kb_df, 'SHOW_IN_REPORTS_BL'), " [INT]"),
+        (_bool_col(kb_df, 'GENERALIZATION_BL'), " [GEN]")
+    ]:
+        flags = flags + np.where(mask, text, "")
+    return flags
+
+
+_kb_cache = None
+
+
+def get_kb_cache():
+    """
+    KBConclusionCache su KB_Conclusions_DF corrente; ricostruita solo
+    se la generazione del DF è cambiata.
+    """
+    global _kb_cache
+    gen = data_structures.get_generation("KB_Conclusions_DF")
+    if _kb_cache is None or _kb_cache.generation != gen:
+        _kb_cache = KBConclusionCache(data_structures.KB_Conclusions_DF, gen)
+    return _kb_cache
+
+
+def _group_positions(keys):
+    """
+    dict chiave -> array delle posizioni con quella chiave (ordine originale).
+    Le chiavi NA sono escluse.
+    """
+    keys = pd.Series(keys).reset_index(drop=True)
+    valid = keys.notna().to_numpy(dtype=bool)
+    positions = np.flatnonzero(valid)
+    if len(positions) == 0:
+        return {}
+    groups = pd.Series(positions).groupby(keys[valid].to_numpy(), sort=False).indices
+    return {k: positions[v] for k, v in groups.items()}
+
+
+class KBHierarchy:
+    """
+    Indici della gerarchia del KB, calcolati una volta per generazione:
+      roots                posizioni (iloc) delle conclusioni con PARENT_ID 0/NA
+      children[id]         posizioni dei figli della conclusione con ID=id
+      pos_by_id[id]        posizione della conclusione con ID=id (prima riga)
+      pos_by_code[code]    posizione della conclusione con CODE=code (prima riga)
+      rules[code]          posizioni in KB_Rules_DF delle regole (ordinate per RANK)
+      conditions[rule_id]  posizioni in KB_Conditions_DF (ordinate per RANK)
+    """
+    def __init__(self, conc_df, rules_df, cond_df, generation=None):
+        self.generation = generation
+        self.conclusions = conc_df
+        self.rules_df = rules_df
+        self.conditions_df = cond_df
+
+        parent = conc_df['PARENT_ID'] if len(conc_df) else pd.Series([], dtype='float64')
+        is_root = (parent.isna() | (parent == 0)).to_numpy(dtype=bool)
+        self.roots = np.flatnonzero(is_root)
+        self.children = _group_positions(parent.where(~is_root))
+
+        ids = conc_df['ID'].to_numpy() if len(conc_df) else np.empty(0)
+        codes = conc_df['CODE'].to_numpy() if len(conc_df) else np.empty(0)
+        # Scrittura in ordine inverso: vince la prima riga
+        self.pos_by_id = {k: int(p) for k, p in zip(ids[::-1], np.arange(len(ids))[::-1])}
+        self.pos_by_code = {k: int(p) for k, p in zip(codes[::-1], np.arange(len(codes))[::-1])}
+
+        self.rules = self._sorted_groups(rules_df, 'CONCLUSION_CODE')
+        self.conditions = self._sorted_groups(cond_df, 'RULE_ID')
+
+    @staticmethod
+    def _sorted_groups(df, key_col):
+        if df.empty:
+            return {}
+        order = np.argsort(df['RANK'].to_numpy(), kind='stable') if 'RANK' in df.columns else np.arange(len(df))
+        keys = df[key_col].to_numpy()[order]
+        groups = pd.Series(order).groupby(keys, sort=False).indices
+        return {k: order[v] for k, v in groups.items()}
+
+    def child_positions(self, conc_id):
+        return self.children.get(conc_id, np.empty(0, dtype=np.int64))
+
+    def rule_positions(self, code):
+        return self.rules.get(code, np.empty(0, dtype=np.int64))
+
+    def condition_positions(self, rule_id):
+        return self.conditions.get(rule_id, np.empty(0, dtype=np.int64))
+
+    def ancestors(self, pos):
+        """
+        Catena di posizioni dalla radice fino a pos (inclusa).
+        """
+        chain = []
+        seen = set()
+        while pos is not None and pos not in seen:
+            seen.add(pos)
+            chain.insert(0, pos)
+            parent_id = self.conclusions['PARENT_ID'].iat[pos]
+            if pd.isna(parent_id) or parent_id <= 0:
+                break
+            pos = self.pos_by_id.get(parent_id)
+        return chain
+
+
+KB_HIERARCHY_DF_NAMES = ["KB_Conclusions_DF", "KB_Rules_DF", "KB_Conditions_DF"]
+_kb_hierarchy = None
+
+
+def get_kb_hierarchy():
+    """
+    KBHierarchy sui DF del KB correnti; ricostruita solo se una delle
+    generazioni (conclusioni, regole, condizioni) è cambiata.
+    """
+    global _kb_hierarchy
+    gen = tuple(data_structures.get_generation(n) for n in KB_HIERARCHY_DF_NAMES)
+    if _kb_hierarchy is None or _kb_hierarchy.generation != gen:
+        _kb_hierarchy = KBHierarchy(
+            data_structures.KB_Conclusions_DF,
+            data_structures.KB_Rules_DF,
+            data_structures.KB_Conditions_DF,
+            gen
+        )
+    return _kb_hierarchy
+
+# End of kb_cache_functions.py
@@ -0,0 +1,220 @@
+"""
+Filename: kb_diff_functions.py
+==============================
+
+Scopo:
+  - Confronto veloce tra il KB corrente (o uno snapshot) e uno snapshot
+    FEATHER salvato: conclusioni (CONCLUSIONS_TREE), regole (RULES) e
+    condizioni (RULE_ITEMS).
+  - Per ogni tabella: righe aggiunte, rimosse, ri-parentate (PARENT_ID /
+    CONCLUSION_CODE / RULE_ID cambiato), con testo cambiato (STR / DESCR)
+    e con altri campi cambiati.
+  - Utilizzabile dalla GUI (pagina Import/Export) e da riga di comando:
+      python kb_diff_functions.py --old <snapshot> [--new <snapshot>]
+
+Procedures/Functions:
+  - column_hashes(df, columns): matrice degli hash per colonna (uint64).
+  - diff_frames(old_df, new_df, parent_col, text_col): diff di una tabella.
+  - diff_kb(old_snapshot, new_snapshot=None): diff delle tre tabelle del KB
+    (new_snapshot=None: DF correnti in data_structures).
+  - format_kb_diff(result, max_rows): righe di testo da mostrare.
+  - main(): interfaccia da riga di comando.
+
+Modifiche recenti:
+  - 2026-10-19: Creazione del modulo.
+
+Note:
+  - Hash join su ID: pd.Index(ID vecchi).get_indexer(ID nuovi); le righe
+    in comune sono confrontate per hash di colonna (hash_pandas_object),
+    senza confronti riga per riga in Python.
+  - Con ID duplicati vale la prima riga (come KBHierarchy).
+  - Sono confrontate solo le colonne presenti in entrambe le versioni;
+    le colonne aggiunte/rimosse sono riportate a parte.
+"""
+
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import data_structures
+from snapshot_functions import read_snapshot_frame, snapshot_folder
+
+# (tipo, DF, colonna "genitore", colonna testo)
+KB_DIFF_TABLES = [
+    ("conclusion", "KB_Conclusions_DF", "PARENT_ID", "STR"),
+    ("rule", "KB_Rules_DF", "CONCLUSION_CODE", "STR"),
+    ("condition", "KB_Conditions_DF", "RULE_ID", "DESCR")
+]
+
+DIFF_CATEGORIES = ["added", "removed", "reparented", "retexted", "modified"]
+
+
+def column_hashes(df, columns):
+    """
+    Matrice (n_righe x n_colonne) degli hash uint64 di ogni cella.
+    Lo stesso valore ha lo stesso hash anche con dtype diversi
+    (int64 / Int64 / int32, object / string).
+    """
+    if not columns:
+        return np.zeros((len(df), 0), dtype=np.uint64)
+    return np.column_stack([
+        pd.util.hash_pandas_object(df[col], index=False).to_numpy()
+        for col in columns
+    ])
+
+
+def diff_frames(old_df, new_df, parent_col, text_col):
+    """
+    Diff di una tabella del KB per ID. Ritorna un dict:
+      added       DataFrame (ID, PARENT, TEXT) righe solo nella nuova versione
+      removed     DataFrame (ID, PARENT, TEXT) righe solo nella vecchia
+      reparented  DataFrame (ID, OLD_PARENT, NEW_PARENT, TEXT)
+      retexted    DataFrame (ID, OLD_TEXT, NEW_TEXT)
+      modified    DataFrame (ID, COLUMNS, TEXT): altri campi cambiati
+      unchanged   numero di righe identiche
+      columns_added / columns_removed  differenze di schema
+    """
+    old_df = old_df.drop_duplicates('ID', keep='first')
+    new_df = new_df.drop_duplicates('ID', keep='first')
+    columns = [c for c in new_df.columns if c in old_df.columns and c != 'ID']
+
+    # Hash join su ID
+    old_ids = old_df['ID'].to_numpy()
+    new_ids = new_df['ID'].to_numpy()
+    old_pos = pd.Index(old_ids).get_indexer(new_ids)
+    matched = old_pos >= 0
+    in_new = np.zeros(len(old_df), dtype=bool)
+    in_new[old_pos[matched]] = True
+
+    new_common = np.flatnonzero(matched)
+    old_common = old_pos[matched]
+
+    def parent_text(df, pos):
+        return pd.DataFrame({
+            'ID': df['ID'].to_numpy()[pos],
+            'PARENT': df[parent_col].to_numpy()[pos] if parent_col in df.columns else None,
+            'TEXT': df[text_col].to_numpy()[pos] if text_col in df.columns else None
+        })
+
+    # Hash per colonna solo sulle righe in comune
+    old_h = column_hashes(old_df.iloc[old_common], columns)
+    new_h = column_hashes(new_df.iloc[new_common], columns)
+    changed = old_h != new_h
+    col_idx = {c: i for i, c in enumerate(columns)}
+    parent_changed = changed[:, col_idx[parent_col]] if parent_col in col_idx else np.zeros(len(new_common), dtype=bool)
+    text_changed = changed[:, col_idx[text_col]] if text_col in col_idx else np.zeros(len(new_common), dtype=bool)
+    other_cols = [i for c, i in col_idx.items() if c not in (parent_col, text_col)]
+    other_changed = changed[:, other_cols].any(axis=1) if other_cols else np.zeros(len(new_common), dtype=bool)
+
+    rp = parent_changed
+    reparented = pd.DataFrame({
+        'ID': new_ids[new_common[rp]],
+        'OLD_PARENT': old_df[parent_col].to_numpy()[old_common[rp]] if rp.any() else [],
+        'NEW_PARENT': new_df[parent_col].to_numpy()[new_common[rp]] if rp.any() else [],
+        'TEXT': new_df[text_col].to_numpy()[new_common[rp]] if rp.any() else []
+    })
+    rt = text_changed
+    retexted = pd.DataFrame({
+        'ID': new_ids[new_common[rt]],
+        'OLD_TEXT': old_df[text_col].to_numpy()[old_common[rt]] if rt.any() else [],
+        'NEW_TEXT': new_df[text_col].to_numpy()[new_common[rt]] if rt.any() else []
+    })
+    om = other_changed
+    other_names = np.array([columns[i] for i in other_cols], dtype=object)
+    modified = pd.DataFrame({
+        'ID': new_ids[new_common[om]],
+        'COLUMNS': [",".join(other_names[row]) for row in changed[om][:, other_cols]] if om.any() else [],
+        'TEXT': new_df[text_col].to_numpy()[new_common[om]] if om.any() else []
+    })
+
+    return {
+        'added': parent_text(new_df, np.flatnonzero(~matched)),
+        'removed': parent_text(old_df, np.flatnonzero(~in_new)),
+        'reparented': reparented,
+        'retexted': retexted,
+        'modified': modified,
+        'unchanged': int((~changed.any(axis=1)).sum()),
+        'columns_added': [c for c in new_df.columns if c not in old_df.columns],
+        'columns_removed': [c for c in old_df.columns if c not in new_df.columns]
+    }
+
+
+def diff_kb(old_snapshot, new_snapshot=None):
+    """
+    Diff tra lo snapshot old_snapshot e new_snapshot (None = DF correnti).
+    Ritorna un dict tipo -> risultato di diff_frames, più 'old', 'new'
+    (descrizione delle due versioni) ed 'elapsed' (secondi, lettura esclusa).
+    """
+    frames = []
+    for kind, df_name, parent_col, text_col in KB_DIFF_TABLES:
+        old_df = read_snapshot_frame(old_snapshot, df_name)
+        if new_snapshot is None:
+            new_df = getattr(data_structures, df_name)
+        else:
+            new_df = read_snapshot_frame(new_snapshot, df_name)
+        frames.append((kind, old_df, new_df, parent_col, text_col))
+
+    t0 = time.perf_counter()
+    result = {
+        'old': snapshot_folder(old_snapshot),
+        'new': "current KB" if new_snapshot is None else snapshot_folder(new_snapshot)
+    }
+    for kind, old_df, new_df, parent_col, text_col in frames:
+        result[kind] = diff_frames(old_df, new_df, parent_col, text_col)
+    result['elapsed'] = time.perf_counter() - t0
+    return result
+
+
+def format_kb_diff(result, max_rows=50):
+    """
+    Righe di testo del diff: riepilogo per tabella e al più max_rows
+    righe per categoria.
+    """
+    lines = [f"KB diff: {result['old']} -> {result['new']}", ""]
+    for kind, _, parent_col, _ in KB_DIFF_TABLES:
+        d = result[kind]
+        counts = ", ".join(f"{cat} {len(d[cat])}" for cat in DIFF_CATEGORIES)
+        lines.append(f"{kind.upper()}S: {counts}, unchanged {d['unchanged']}")
+        if d['columns_added'] or d['columns_removed']:
+            lines.append(f"  columns added: {d['columns_added']}, removed: {d['columns_removed']}")
+        for cat in DIFF_CATEGORIES:
+            df = d[cat]
+            if df.empty:
+                continue
+            lines.append(f"  {cat}:")
+            for row in df.head(max_rows).itertuples(index=False):
+                if cat in ("added", "removed"):
+                    lines.append(f"    ID {row.ID} ({parent_col}={row.PARENT}) {row.TEXT}")
+                elif cat == "reparented":
+                    lines.append(f"    ID {row.ID} {parent_col} {row.OLD_PARENT} -> {row.NEW_PARENT} {row.TEXT}")
+                elif cat == "retexted":
+                    lines.append(f"    ID {row.ID} '{row.OLD_TEXT}' -> '{row.NEW_TEXT}'")
+                else:
+                    lines.append(f"    ID {row.ID} [{row.COLUMNS}] {row.TEXT}")
+            if len(df) > max_rows:
+                lines.append(f"    ... {len(df) - max_rows} more")
+        lines.append("")
+    lines.append(f"Diff time: {result['elapsed'] * 1000:.1f} ms")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff of the KB tables between two FEATHER snapshots.")
+    parser.add_argument("--old", required=True, help="Old snapshot name ('' = default folder).")
+    parser.add_argument("--new", default="", help="New snapshot name ('' = default folder).")
+    parser.add_argument("--max-rows", type=int, default=50)
+    args = parser.parse_args()
+
+    result = diff_kb(args.old, args.new)
+    for line in format_kb_diff(result, args.max_rows):
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# End of kb_diff_functions.py
@@ -19,16 +19,27 @@ Modifiche recenti:
   - Aggiunto il campo GENERALIZATION_BL (boolean) nella query su CONCLUSIONS_TREE
     per popolare KB_Conclusions_DF.
   - 2025-01-14: Riorganizzati i commenti e lo stile Pascal-like.
+  - 2026-10-19: fdb importato all'interno delle fetch (import differito).
+  - 2026-10-19: DF pubblicati con data_structures.set_dataframe() (generazione).
+  - 2026-10-19: import_kb_data() registra timestamp e id dell'import
+    (record_import) per il manifest degli snapshot FEATHER.
+  - 2026-10-19: import_kb_data() costruisce l'indice di ricerca testuale
+    del KB (kb_search_functions) subito dopo il caricamento.
+  - 2026-10-19: import_kb_data() costruisce anche l'indice invertito
+    criterio -> regole -> conclusioni (kb_impact_functions).
 
 Note:
-  - L'accesso al DB Firebird avviene tramite fdb.connect.
+  - L'accesso al DB Firebird avviene tramite fdb.connect (fdb importato
+    all'interno di ogni fetch, non all'avvio dell'applicazione).
   - Le variabili globali (DataFrame) sono in data_structures.py.
 """
 
-import fdb
 import pandas as pd
 import time
 import data_structures
+from snapshot_functions import record_import, KB_DF_NAMES
+from kb_search_functions import get_kb_search_index
+from kb_impact_functions import get_criterion_index
 
 database_path = "D:/EuristicDB/EURISTIC.FDB"
 user = "EURISTIC"
@@ -41,6 +52,7 @@ def fetch_conclusions_data():
     """
     start_time = time.time()
     try:
+        import fdb
         with fdb.connect(dsn=database_path, user=user, password=password) as conn:
             cursor = conn.cursor()
             # Eseguiamo la nuova query con GENERALIZATION_BL
@@ -88,7 +100,7 @@ def fetch_conclusions_data():
                     'WARNING_BL': (True if row[14] == 'T' else False),
                     'STR': row[15] or ""
                 })
-        data_structures.KB_Conclusions_DF = pd.DataFrame(data)
+        data_structures.set_dataframe('KB_Conclusions_DF', pd.DataFrame(data))
         elapsed = time.time() - start_time
         return f"KB_Conclusions: {len(data)} records in {elapsed:.2f}s."
     except Exception as E:
@@ -100,6 +112,7 @@ def fetch_rules_data():
     """
     start_time = time.time()
     try:
+        import fdb
         with fdb.connect(dsn=database_path, user=user, password=password) as conn:
             cursor = conn.cursor()
             cursor.execute("""
@@ -125,7 +138,7 @@ def fetch_rules_data():
                     'RULE_NUMBER': int(row[4]) if row[4] else 0,
                     'STR': row[5] or ""
                 })
-        data_structures.KB_Rules_DF = pd.DataFrame(data)
+        data_structures.set_dataframe('KB_Rules_DF', pd.DataFrame(data))
         elapsed = time.time() - start_time
         return f"KB_Rules: {len(data)} records in {elapsed:.2f}s."
     except Exception as E:
@@ -137,6 +150,7 @@ def fetch_conditions_data():
     """
     start_time = time.time()
     try:
+        import fdb
         with fdb.connect(dsn=database_path, user=user, password=password) as conn:
             cursor = conn.cursor()
             cursor.execute("""
@@ -161,7 +175,7 @@ def fetch_conditions_data():
                     'RANK': int(row[3]) if row[3] else 0,
                     'DESCR': row[4] or ""
                 })
-        data_structures.KB_Conditions_DF = pd.DataFrame(data)
+        data_structures.set_dataframe('KB_Conditions_DF', pd.DataFrame(data))
         elapsed = time.time() - start_time
         return f"KB_Conditions: {len(data)} records in {elapsed:.2f}s."
     except Exception as E:
@@ -174,6 +188,7 @@ def fetch_muscles_data():
     """
     start_time = time.time()
     try:
+        import fdb
         with fdb.connect(dsn=database_path, user=user, password=password) as conn:
             cursor = conn.cursor()
             cursor.execute("""
@@ -190,7 +205,7 @@ def fetch_muscles_data():
                     'STR': row[1] or ""
                 })
 
-        data_structures.KB_Muscles_DF = pd.DataFrame(data)
+        data_structures.set_dataframe('KB_Muscles_DF', pd.DataFrame(data))
         elapsed = time.time() - start_time
         return f"KB_Muscles: {len(data)} records in {elapsed:.2f}s."
     except Exception as E:
@@ -203,6 +218,7 @@ def fetch_nerves_data():
     """
     start_time = time.time()
     try:
+        import fdb
         with fdb.connect(dsn=database_path, user=user, password=password) as conn:
             cursor = conn.cursor()
             cursor.execute("""
@@ -219,7 +235,7 @@ def fetch_nerves_data():
                     'STR': row[1] or ""
                 })
 
-        data_structures.KB_Nerves_DF = pd.DataFrame(data)
+        data_structures.set_dataframe('KB_Nerves_DF', pd.DataFrame(data))
         elapsed = time.time() - start_time
         return f"KB_Nerves: {len(data)} records in {elapsed:.2f}s."
     except Exception as E:
@@ -236,9 +252,14 @@ def import_kb_data():
     msg3 = fetch_conditions_data()
     msg4 = fetch_muscles_data()
     msg5 = fetch_nerves_data()
+    record_import(KB_DF_NAMES)
+    search_index = get_kb_search_index()
+    criterion_index = get_criterion_index()
+    msg6 = (f"KB search index: {len(search_index)} texts, "
+            f"{len(criterion_index.rules_by_criterion)} criteria indexed.")
     elapsed = time.time() - start_time
     return (
-        f"{msg1}\n{msg2}\n{msg3}\n{msg4}\n{msg5}\n"
+        f"{msg1}\n{msg2}\n{msg3}\n{msg4}\n{msg5}\n{msg6}\n"
         f"KB import time: {elapsed:.2f}s"
     )
 
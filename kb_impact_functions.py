@@ -0,0 +1,218 @@
+"""
+Filename: kb_impact_functions.py
+================================
+
+Scopo:
+  - Indice invertito criterio -> regole -> conclusioni del KB
+    (KB_Conditions_DF.CRITERIUM_CODE -> KB_Rules_DF -> CONCLUSION_CODE),
+    costruito una volta per caricamento del KB.
+  - "Impact analysis": dati uno o più CRITERIUM_CODE, elenca le regole
+    coinvolte, le conclusioni prodotte e quanti studi (RulesConclusions_DF)
+    riportano quelle conclusioni.
+
+Procedures/Functions/Classi Principali:
+  - CriterionIndex: criterio -> posizioni delle regole; regola -> CONCLUSION_CODE.
+  - get_criterion_index(): indice corrente (ricostruito se cambia il KB).
+  - ConclusionStudyIndex: CONCLUSION_CODE -> RICO_ID (ordinati) di RulesConclusions_DF.
+  - get_conclusion_study_index(): indice corrente (ricostruito se cambia RC).
+  - parse_criteria(text): "12, 34 56" -> [12, 34, 56] (ValueError se non valido).
+  - impact_analysis(criteria): regole, conclusioni e numero di studi coinvolti.
+
+Modifiche recenti:
+  - 2026-10-19: Creazione del modulo.
+
+Note:
+  - I due indici hanno generazioni separate: il reload del KB non
+    ricalcola i conteggi degli studi e viceversa.
+  - N_STUDIES conta i RICO_ID distinti (uno studio con più righe per la
+    stessa conclusione, ad es. lati diversi, conta una volta).
+"""
+
+import re
+import time
+import logging
+
+import numpy as np
+import pandas as pd
+
+import data_structures
+from kb_cache_functions import get_kb_cache
+
+logger = logging.getLogger(__name__)
+
+_EMPTY_POS = np.empty(0, dtype=np.int64)
+
+
+class CriterionIndex:
+    """
+    Indice invertito sui DF del KB:
+      rules_by_criterion[crit]  posizioni (uniche, ordinate) in KB_Rules_DF
+                                delle regole con almeno una condizione su crit
+      rule_pos_by_id[rule_id]   posizione della regola in KB_Rules_DF
+      conclusion_codes          CONCLUSION_CODE per posizione di regola
+    """
+    def __init__(self, rules_df, cond_df, generation=None):
+        t0 = time.perf_counter()
+        self.generation = generation
+        self.rules_df = rules_df
+        self.conditions_df = cond_df
+
+        rule_ids = rules_df['ID'].to_numpy() if len(rules_df) else np.empty(0)
+        # Scrittura in ordine inverso: vince la prima riga
+        self.rule_pos_by_id = {k: int(p) for k, p in zip(rule_ids[::-1], np.arange(len(rule_ids))[::-1])}
+        self.conclusion_codes = rules_df['CONCLUSION_CODE'].to_numpy() if len(rules_df) else np.empty(0)
+
+        self.rules_by_criterion = {}
+        if len(cond_df) and len(rules_df):
+            rule_pos = cond_df['RULE_ID'].map(self.rule_pos_by_id)
+            valid = rule_pos.notna().to_numpy()
+            pairs = pd.DataFrame({
+                'CRIT': cond_df['CRITERIUM_CODE'].to_numpy()[valid],
+                'RULE_POS': rule_pos.to_numpy()[valid].astype(np.int64)
+            }).drop_duplicates()
+            rule_pos_arr = pairs['RULE_POS'].to_numpy()
+            groups = pd.Series(rule_pos_arr).groupby(pairs['CRIT'].to_numpy(), sort=False).indices
+            for crit, pos in groups.items():
+                self.rules_by_criterion[int(crit)] = np.sort(rule_pos_arr[pos])
+        logger.info("Criterion index: %d criteria in %.2fs",
+                    len(self.rules_by_criterion), time.perf_counter() - t0)
+
+    def rule_positions(self, criteria):
+        """
+        Posizioni uniche delle regole che usano almeno uno dei criteri.
+        """
+        arrays = [self.rules_by_criterion.get(int(c), _EMPTY_POS) for c in criteria]
+        return np.unique(np.concatenate(arrays)) if arrays else _EMPTY_POS
+
+
+class ConclusionStudyIndex:
+    """
+    RulesConclusions_DF ordinato per CONCLUSION_CODE:
+      codes, ricos     array allineati (righe duplicate code/rico rimosse)
+      n_studies[code]  numero di RICO_ID distinti per conclusione
+    studies(codes) ritorna i RICO_ID distinti che hanno almeno uno dei codici.
+    """
+    def __init__(self, rc_df, generation=None):
+        self.generation = generation
+        if rc_df.empty:
+            self.codes = np.empty(0, dtype=np.int64)
+            self.ricos = np.empty(0, dtype=np.int64)
+            self.n_studies = {}
+            return
+        pairs = pd.DataFrame({
+            'CODE': rc_df['CONCLUSION_CODE'].to_numpy(dtype='int64', na_value=-1),
+            'RICO': rc_df['RICO_ID'].to_numpy(dtype='int64', na_value=-1)
+        })
+        pairs = pairs[(pairs['CODE'] >= 0) & (pairs['RICO'] >= 0)].drop_duplicates()
+        pairs = pairs.sort_values(['CODE', 'RICO'], kind='stable')
+        self.codes = pairs['CODE'].to_numpy()
+        self.ricos = pairs['RICO'].to_numpy()
+        uniq, counts = np.unique(self.codes, return_counts=True)
+        self.n_studies = dict(zip(uniq.tolist(), counts.tolist()))
+
+    def studies(self, codes):
+        codes = np.asarray(list(codes), dtype=np.int64)
+        if codes.size == 0 or self.codes.size == 0:
+            return _EMPTY_POS
+        lo = np.searchsorted(self.codes, codes, side='left')
+        hi = np.searchsorted(self.codes, codes, side='right')
+        return np.unique(np.concatenate([self.ricos[a:b] for a, b in zip(lo, hi)]))
+
+
+CRITERION_DF_NAMES = ["KB_Rules_DF", "KB_Conditions_DF"]
+_criterion_index = None
+_conclusion_study_index = None
+
+
+def get_criterion_index():
+    """
+    CriterionIndex sui DF del KB correnti; ricostruito solo se cambia la
+    generazione delle regole o delle condizioni.
+    """
+    global _criterion_index
+    gen = tuple(data_structures.get_generation(n) for n in CRITERION_DF_NAMES)
+    if _criterion_index is None or _criterion_index.generation != gen:
+        _criterion_index = CriterionIndex(
+            data_structures.KB_Rules_DF,
+            data_structures.KB_Conditions_DF,
+            gen
+        )
+    return _criterion_index
+
+
+def get_conclusion_study_index():
+    global _conclusion_study_index
+    gen = data_structures.get_generation("RulesConclusions_DF")
+    if _conclusion_study_index is None or _conclusion_study_index.generation != gen:
+        _conclusion_study_index = ConclusionStudyIndex(data_structures.RulesConclusions_DF, gen)
+    return _conclusion_study_index
+
+
+def parse_criteria(text):
+    """
+    Elenco di CRITERIUM_CODE separati da virgole o spazi.
+    Solleva ValueError se vuoto o se un elemento non è un intero.
+    """
+    items = [t for t in re.split(r"[,;\s]+", text.strip()) if t]
+    if not items:
+        raise ValueError("Enter one or more criterion codes.")
+    bad = [t for t in items if not t.isdigit()]
+    if bad:
+        raise ValueError(f"Invalid criterion code(s): {', '.join(bad)}")
+    return list(dict.fromkeys(int(t) for t in items))
+
+
+def impact_analysis(criteria):
+    """
+    Impatto di una modifica ai criteri indicati. Ritorna un dict:
+      criteria     criteri richiesti
+      missing      criteri non usati da nessuna condizione
+      rules        DataFrame (RULE_ID, RULE_NUMBER, CONCLUSION_CODE,
+                   ACTIVE_BL, CRITERIA, STR) delle regole coinvolte
+      conclusions  DataFrame (CODE, STR, N_RULES, N_STUDIES)
+      n_studies    RICO_ID distinti con almeno una delle conclusioni
+      elapsed      secondi
+    """
+    t0 = time.perf_counter()
+    cidx = get_criterion_index()
+    criteria = [int(c) for c in criteria]
+    missing = [c for c in criteria if c not in cidx.rules_by_criterion]
+
+    rule_pos = cidx.rule_positions(criteria)
+    rules_df = cidx.rules_df
+    if len(rule_pos):
+        rules = rules_df.iloc[rule_pos].reindex(
+            columns=['ID', 'RULE_NUMBER', 'CONCLUSION_CODE', 'ACTIVE_BL', 'STR']
+        ).rename(columns={'ID': 'RULE_ID'}).reset_index(drop=True)
+        rules['STR'] = rules['STR'].fillna("")
+        # Criteri richiesti presenti in ciascuna regola
+        matched = {int(p): [] for p in rule_pos}
+        for c in criteria:
+            for p in cidx.rules_by_criterion.get(c, _EMPTY_POS):
+                matched[int(p)].append(str(c))
+        rules.insert(4, 'CRITERIA', [",".join(matched[int(p)]) for p in rule_pos])
+    else:
+        rules = pd.DataFrame(columns=['RULE_ID', 'RULE_NUMBER', 'CONCLUSION_CODE',
+                                      'ACTIVE_BL', 'CRITERIA', 'STR'])
+
+    codes = cidx.conclusion_codes[rule_pos]
+    uniq_codes, n_rules = np.unique(codes, return_counts=True) if len(codes) else (_EMPTY_POS, _EMPTY_POS)
+    sidx = get_conclusion_study_index()
+    kb_cache = get_kb_cache()
+    conclusions = pd.DataFrame({
+        'CODE': uniq_codes,
+        'STR': [kb_cache.conclusion_str(c) for c in uniq_codes],
+        'N_RULES': n_rules,
+        'N_STUDIES': [sidx.n_studies.get(int(c), 0) for c in uniq_codes]
+    }).sort_values(['N_STUDIES', 'CODE'], ascending=[False, True], kind='stable').reset_index(drop=True)
+
+    return {
+        'criteria': criteria,
+        'missing': missing,
+        'rules': rules,
+        'conclusions': conclusions,
+        'n_studies': int(len(sidx.studies(uniq_codes))),
+        'elapsed': time.perf_counter() - t0
+    }
+
+# End of kb_impact_functions.py
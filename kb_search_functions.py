@@ -0,0 +1,158 @@
+"""
+Filename: kb_search_functions.py
+================================
+
+Scopo:
+  - Ricerca testuale veloce nel KB: conclusioni (KB_Conclusions_DF.STR),
+    regole (KB_Rules_DF.STR) e condizioni (KB_Conditions_DF.DESCR).
+  - Indice a trigrammi costruito una volta per caricamento del KB:
+    ricerca per prefisso, sottostringa e approssimata (errori di battitura)
+    con risultati ordinati per punteggio in pochi millisecondi.
+
+Procedures/Functions/Classi Principali:
+  - normalize_text(text): minuscolo, spazi singoli.
+  - trigrams(text): insieme dei trigrammi (con padding di spazi).
+  - KBSearchIndex: indice trigrammi -> documenti; search(query, limit).
+  - get_kb_search_index(): indice corrente (ricostruito se cambia il KB).
+
+Modifiche recenti:
+  - 2026-10-19: Creazione del modulo.
+
+Note:
+  - Documento = (KIND, POSITION, TEXT) con KIND "conclusion"/"rule"/"condition"
+    e POSITION = posizione (iloc) nel rispettivo DF.
+  - Punteggio: similarità dei trigrammi (Dice) più un bonus se il testo
+    inizia con la query (prefisso) o la contiene (sottostringa).
+"""
+
+import re
+import time
+import logging
+
+import numpy as np
+import pandas as pd
+
+import data_structures
+
+logger = logging.getLogger(__name__)
+
+KB_SEARCH_SOURCES = [
+    ("conclusion", "KB_Conclusions_DF", "STR"),
+    ("rule", "KB_Rules_DF", "STR"),
+    ("condition", "KB_Conditions_DF", "DESCR")
+]
+
+PREFIX_BONUS = 1.0
+SUBSTRING_BONUS = 0.5
+MIN_SIMILARITY = 0.2
+
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    if text is None or (not isinstance(text, str) and pd.isna(text)):
+        return ""
+    return _SPACES_RE.sub(" ", str(text).lower()).strip()
+
+
+def trigrams(text):
+    """
+    Trigrammi del testo normalizzato, con due spazi iniziali e uno finale
+    (così anche le parole brevi e i prefissi producono trigrammi).
+    """
+    padded = "  " + text + " "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class KBSearchIndex:
+    """
+    Indice a trigrammi sui testi del KB.
+      docs:      DataFrame (KIND, POSITION, TEXT, NORM)
+      postings:  trigramma -> array degli id documento
+      n_grams:   numero di trigrammi di ogni documento
+    """
+    def __init__(self, generation=None):
+        self.generation = generation
+        t0 = time.perf_counter()
+        frames = []
+        for kind, df_name, col in KB_SEARCH_SOURCES:
+            df = getattr(data_structures, df_name)
+            if df.empty or col not in df.columns:
+                continue
+            frames.append(pd.DataFrame({
+                'KIND': kind,
+                'POSITION': np.arange(len(df)),
+                'TEXT': df[col].to_numpy()
+            }))
+        self.docs = pd.concat(frames, ignore_index=True) if frames else \
+            pd.DataFrame({'KIND': [], 'POSITION': [], 'TEXT': []})
+        self.docs['NORM'] = [normalize_text(t) for t in self.docs['TEXT']]
+
+        postings = {}
+        n_grams = np.zeros(len(self.docs), dtype=np.int32)
+        for doc_id, norm in enumerate(self.docs['NORM']):
+            if not norm:
+                continue
+            grams = trigrams(norm)
+            n_grams[doc_id] = len(grams)
+            for g in grams:
+                postings.setdefault(g, []).append(doc_id)
+        self.postings = {g: np.array(ids, dtype=np.int32) for g, ids in postings.items()}
+        self.n_grams = n_grams
+        logger.info("KB search index: %d texts, %d trigrams in %.2fs",
+                    len(self.docs), len(self.postings), time.perf_counter() - t0)
+
+    def __len__(self):
+        return len(self.docs)
+
+    def search(self, query, limit=50, kinds=None):
+        """
+        Ritorna un DataFrame (KIND, POSITION, TEXT, SCORE) ordinato per
+        punteggio decrescente. kinds: elenco opzionale dei tipi da includere.
+        """
+        norm = normalize_text(query)
+        empty = pd.DataFrame({'KIND': [], 'POSITION': [], 'TEXT': [], 'SCORE': []})
+        if not norm or len(self.docs) == 0:
+            return empty
+        q_grams = [g for g in trigrams(norm) if g in self.postings]
+        if not q_grams:
+            return empty
+
+        # Trigrammi in comune per documento (bincount sulle liste concatenate)
+        hits = np.concatenate([self.postings[g] for g in q_grams])
+        shared = np.bincount(hits, minlength=len(self.docs))
+        cand = np.flatnonzero(shared)
+        n_query = len(trigrams(norm))
+        similarity = 2.0 * shared[cand] / (n_query + self.n_grams[cand])
+
+        norms = self.docs['NORM'].to_numpy()[cand]
+        starts = np.fromiter((t.startswith(norm) for t in norms), dtype=bool, count=len(cand))
+        contains = np.fromiter((norm in t for t in norms), dtype=bool, count=len(cand))
+        score = similarity + PREFIX_BONUS * starts + SUBSTRING_BONUS * contains
+
+        keep = (similarity >= MIN_SIMILARITY) | contains
+        if kinds is not None:
+            keep &= np.isin(self.docs['KIND'].to_numpy()[cand], list(kinds))
+        cand, score = cand[keep], score[keep]
+        top = np.argsort(-score, kind='stable')[:limit]
+        result = self.docs.iloc[cand[top]][['KIND', 'POSITION', 'TEXT']].reset_index(drop=True)
+        result['SCORE'] = score[top]
+        return result
+
+
+KB_SEARCH_DF_NAMES = [df_name for _, df_name, _ in KB_SEARCH_SOURCES]
+_kb_search_index = None
+
+
+def get_kb_search_index():
+    """
+    KBSearchIndex sui DF del KB correnti; ricostruito solo se una delle
+    generazioni (conclusioni, regole, condizioni) è cambiata.
+    """
+    global _kb_search_index
+    gen = tuple(data_structures.get_generation(n) for n in KB_SEARCH_DF_NAMES)
+    if _kb_search_index is None or _kb_search_index.generation != gen:
+        _kb_search_index = KBSearchIndex(gen)
+    return _kb_search_index
+
+# End of kb_search_functions.py
@@ -16,7 +16,6 @@ Scopo:
 
 Procedures/Functions/Classi Principali:
  - KnowledgeGraphPage(ttk.Frame)
- - build_study_subgraph(G, rico_id, max_depth)
  - ConceptTreeWindow(tk.Toplevel)
  - StudyGraphWindow(tk.Toplevel)
 
@@ -71,23 +70,52 @@ Note:
    al giusto study_number. 
  - Gestiamo un “already_entered” booleano in ExploreStudiesPage o 
    richiamiamo manualmente on_enter_page() se serve.
+
+Modifiche recenti (2026-10-19):
+ - networkx importato solo dove serve (sottografo studio, layout).
+ - GoTo Explore Studies delegato a MainApplication.goto_study(), che
+   costruisce la pagina Explore Studies se non ancora visitata.
+ - Build Graph registrato come operazione nel Memory Profiler.
+ - Show Study Graph accetta STUDY_NUMBER, rico: o anag: (StudyLookupIndex)
+   invece del solo RICO_ID; GoTo Explore Studies salta per RICO_ID.
+ - ConceptTreeWindow._make_label() usa le bandierine precalcolate per tutto
+   il KB (kb_cache_functions.compute_concept_flags).
+ - Build Graph costruisce la matrice di incidenza studi x concetti
+   (graph_matrix_functions.ConceptMatrix), senza il grafo networkx
+   (ConceptMatrix.to_networkx() se serve). ConceptTreeWindow, Graph Stats e
+   Show Study Graph (ConceptMatrix.study_subgraph, al posto di
+   build_study_subgraph) lavorano sulla matrice: Show Associations conta le
+   co-occorrenze con un bincount invece di visitare i vicini di ogni studio.
+ - Save/Load Graph usano il formato colonnare versionato della matrice
+   (cartella GRAPH_FOLDER, ConceptMatrix.save/load) invece del pickle del
+   DiGraph; il vecchio graph_data.pkl è ancora leggibile.
+ - Build Graph dopo un import aggiorna la matrice in modo incrementale
+   (ConceptMatrix.update) e riporta studi/concetti aggiunti, rimossi o
+   cambiati, il tempo e la generazione dei dati che il grafo riflette.
 """
 
+import os
 import tkinter as tk
 from tkinter import ttk, simpledialog, messagebox
-import networkx as nx
-
-from graph_functions import build_graph, save_graph, load_graph, get_graph_stats
+from graph_functions import load_graph
+from graph_matrix_functions import get_concept_matrix, ConceptMatrix
 import data_structures
-import pandas as pd
+import numpy as np
 
 from utils import get_conclusion_str
+from memory_profiler_functions import track_operation
+from study_functions import get_lookup_index
+from kb_cache_functions import get_kb_cache
+
+# Grafo salvato (formato colonnare) e vecchio file pickle (solo lettura)
+GRAPH_FOLDER = "graph_data"
+LEGACY_GRAPH_FILE = "graph_data.pkl"
 
 
 class KnowledgeGraphPage(ttk.Frame):
     def __init__(self, parent):
         super().__init__(parent)
-        self.current_graph = None
+        self.current_matrix = None
 
         self.top_frame = ttk.Frame(self)
         self.top_frame.pack(side=tk.TOP, fill=tk.X, pady=5)
@@ -116,96 +144,89 @@ class KnowledgeGraphPage(ttk.Frame):
     def do_build_graph(self):
         self.text_area.delete("1.0", tk.END)
         self.text_area.insert(tk.END, "Building graph...\n")
-        self.current_graph = build_graph()
+        with track_operation("Build Graph"):
+            self.current_matrix = get_concept_matrix()
         self.text_area.insert(tk.END, "Build Graph completed.\n")
+        self.text_area.insert(tk.END, self.current_matrix.update_summary() + "\n")
 
-        if self.current_graph:
+        M = self.current_matrix
+        if M.n_concepts or M.n_studies:
             self.text_area.insert(tk.END, "Sample nodes:\n")
-            ct = 0
-            for n in self.current_graph.nodes():
+            names = [f"conc_{cid}" for cid in M.concept_ids[:30].tolist()]
+            names += [f"case_{rico}" for rico in M.study_ids[:30 - len(names)].tolist()]
+            for n in names:
                 self.text_area.insert(tk.END, f"  {n}\n")
-                ct += 1
-                if ct >= 30:
-                    self.text_area.insert(tk.END, "...(etc)\n")
-                    break
+            if M.n_concepts + M.n_studies > 30:
+                self.text_area.insert(tk.END, "...(etc)\n")
         self.text_area.insert(tk.END, "Done.\n")
 
     def do_save_graph(self):
-        if not self.current_graph:
+        if self.current_matrix is None:
             self.text_area.insert(tk.END, "No graph in memory.\n")
             return
-        filename = "graph_data.pkl"
-        save_graph(self.current_graph, filename)
+        with track_operation("Save Graph"):
+            filename = self.current_matrix.save(GRAPH_FOLDER)
         self.text_area.insert(tk.END, f"Graph saved to {filename}\n")
 
     def do_load_graph(self):
-        filename = "graph_data.pkl"
         try:
-            self.current_graph = load_graph(filename)
-            self.text_area.insert(tk.END, f"Graph loaded from {filename}\n")
+            with track_operation("Load Graph"):
+                matrix = ConceptMatrix.load(GRAPH_FOLDER)
+            if matrix is not None:
+                self.current_matrix = matrix
+                self.text_area.insert(tk.END, f"Graph loaded from {GRAPH_FOLDER}\n")
+                return
+            # grafi salvati con la versione precedente (pickle)
+            if not os.path.isfile(LEGACY_GRAPH_FILE):
+                self.text_area.insert(tk.END, f"No saved graph in {GRAPH_FOLDER}\n")
+                return
+            self.current_matrix = ConceptMatrix.from_networkx(load_graph(LEGACY_GRAPH_FILE))
+            self.text_area.insert(tk.END, f"Graph loaded from {LEGACY_GRAPH_FILE} (legacy pickle; "
+                                          f"use Save Graph to convert it)\n")
         except Exception as e:
             self.text_area.insert(tk.END, f"Error loading graph: {e}\n")
 
     def do_graph_stats(self):
-        if not self.current_graph:
+        if self.current_matrix is None:
             self.text_area.insert(tk.END, "No graph in memory.\n")
             return
-        stats_str = get_graph_stats(self.current_graph)
+        stats_str = "\n".join(self.current_matrix.stats_lines()) + "\n"
         self.text_area.insert(tk.END, f"Graph Stats:\n{stats_str}\n")
 
     def do_show_concept_graph(self):
-        if not self.current_graph:
+        if self.current_matrix is None:
             self.text_area.insert(tk.END, "No graph in memory.\n")
             return
-        ConceptTreeWindow(self, self.current_graph)
+        ConceptTreeWindow(self, self.current_matrix)
 
     def do_show_study_graph(self):
-        if not self.current_graph:
+        if self.current_matrix is None:
             self.text_area.insert(tk.END, "No graph in memory.\n")
             return
-        val_str = simpledialog.askstring("Study Graph", "Enter RICO_ID:")
-        if not val_str or not val_str.isdigit():
+        val_str = simpledialog.askstring(
+            "Study Graph", "Enter STUDY_NUMBER, rico:RICO_ID or anag:ANAG_ID:"
+        )
+        if not val_str:
+            return
+        try:
+            hits, desc = get_lookup_index().search(val_str)
+        except ValueError as E:
+            messagebox.showinfo("Study Graph", str(E))
+            return
+        if len(hits) == 0:
+            messagebox.showinfo("Study Graph", f"No study found with {desc}")
             return
-        rico_id = int(val_str)
-        subg = build_study_subgraph(self.current_graph, rico_id, max_depth=2)
+        rico_ids = data_structures.Studies_DF['RICO_ID'].to_numpy()[hits]
+        rico_id = int(rico_ids[0])
+        if len(hits) > 1:
+            self.text_area.insert(tk.END, f"{desc}: {len(hits)} studies, showing RICO_ID={rico_id}.\n")
+        subg = self.current_matrix.study_subgraph(rico_id, max_depth=2)
         if subg.number_of_nodes() == 0:
             messagebox.showinfo("Study Graph", f"No data for RICO_ID={rico_id}")
             return
         StudyGraphWindow(self, subg)
 
 
-def build_study_subgraph(G, rico_id, max_depth=2):
-    sub = nx.DiGraph()
-    case_node = f"case_{rico_id}"
-    if case_node not in G:
-        return sub
-    sub.add_node(case_node, **G.nodes[case_node])
-
-    for neigh in G.successors(case_node):
-        e = G[case_node][neigh]
-        if e.get('relation') == "CASE-OF":
-            sub.add_node(neigh, **G.nodes[neigh])
-            sub.add_edge(case_node, neigh, **e)
-
-    frontier = [n for n in sub.nodes if n != case_node]
-    depth_map = {x: 0 for x in frontier}
-
-    while frontier:
-        curr = frontier.pop(0)
-        cd = depth_map[curr]
-        if cd >= max_depth:
-            continue
-        for p in G.predecessors(curr):
-            if G[p][curr].get('relation') == "IS-A":
-                if p not in sub:
-                    sub.add_node(p, **G.nodes[p])
-                    sub.add_edge(p, curr, **G[p][curr])
-                    depth_map[p] = cd + 1
-                    frontier.append(p)
-
-    return sub
-
-
 class ConceptTreeWindow(tk.Toplevel):
     """
     Finestra gerarchica 600x800
@@ -216,15 +237,22 @@ class ConceptTreeWindow(tk.Toplevel):
 
     Nel popup_show_assoc, per ogni concetto associato, 
     mostriamo code + get_conclusion_str() + freq/total.
+
+    Lavora sulla matrice di incidenza (ConceptMatrix): gli item "conc_{ID}"
+    sono mappati sulla colonna del concetto (node_pos).
     """
 
-    def __init__(self, parent, G):
+    def __init__(self, parent, M):
         super().__init__(parent)
         self.title("Concept Hierarchy (IS-A)")
         self.geometry("600x800")
-        self.G = G
+        self.M = M
+        self.usage = M.usage_counts()
+        self.attrs = {col: M.concepts[col].tolist() for col in M.concepts.columns}
+        self.node_pos = {f"conc_{cid}": pos for pos, cid in enumerate(M.concept_ids.tolist())}
 
         self.main_tk = self._find_tk_root()
+        self.kb_flags = get_kb_cache().concept_flags_by_id
 
         self.tree = ttk.Treeview(self, show="tree")
         self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
@@ -233,20 +261,14 @@ class ConceptTreeWindow(tk.Toplevel):
         self.scroll.pack(side=tk.RIGHT, fill=tk.Y)
         self.tree.configure(yscrollcommand=self.scroll.set)
 
+        # figli per concetto padre (array IS-A della matrice); radici = PARENT_ID <= 0
         self.children_map = {}
-        for n, d in self.G.nodes(data=True):
-            if d.get('type') == "concept":
-                pid = d.get('PARENT_ID', 0)
-                if pid > 0:
-                    pnode = f"conc_{pid}"
-                    self.children_map.setdefault(pnode, []).append(n)
+        for child, parent in enumerate(M.parent.tolist()):
+            if parent >= 0:
+                self.children_map.setdefault(f"conc_{M.concept_ids[parent]}", []).append(f"conc_{M.concept_ids[child]}")
 
-        root_nodes = []
-        for n, d in self.G.nodes(data=True):
-            if d.get('type') == "concept":
-                pid = d.get('PARENT_ID', 0)
-                if not pid or pid <= 0:
-                    root_nodes.append(n)
+        parent_ids = M.concepts['PARENT_ID'].to_numpy(dtype='float64', na_value=np.nan)
+        root_nodes = [f"conc_{cid}" for cid in M.concept_ids[~(parent_ids > 0)].tolist()]
 
         for rn in root_nodes:
             label = self._make_label(rn)
@@ -279,24 +301,34 @@ class ConceptTreeWindow(tk.Toplevel):
         return None
 
     def _make_label(self, nid):
-        d = self.G.nodes[nid]
+        pos = self.node_pos[nid]
+        d = {col: values[pos] for col, values in self.attrs.items()}
         str_ = d.get('STR', nid)
-        code_ = d.get('CODE', '?')
-        usage = d.get('usage_count', 0)
-
-        # bandierine
-        parts = []
-        if d.get('RESERVED_BL', False):
-            parts.append("[RES]")
-        if d.get('SET_PARENT_TRUE_BL', False):
-            parts.append("[^]")
-        if d.get('SHOW_IN_REPORTS_BL') == False:
-            parts.append("[INT]")
-        if d.get('GENERALIZATION_BL', False):
-            parts.append("[GEN]")
-        flags = " ".join(parts)
-        if flags:
-            flags = " " + flags
+        code_ = d['CODE'] if d.get('CODE') else '?'
+        usage = int(self.usage[pos])
+
+        # bandierine: precalcolate per tutto il KB (kb_cache_functions);
+        # per un grafo caricato da file con concetti non più nel KB
+        # si ricalcolano dagli attributi del concetto
+        flags = None
+        if nid.startswith("conc_"):
+            try:
+                flags = self.kb_flags.get(int(nid[len("conc_"):]))
+            except ValueError:
+                pass
+        if flags is None:
+            parts = []
+            if d.get('RESERVED_BL', False):
+                parts.append("[RES]")
+            if d.get('SET_PARENT_TRUE_BL', False):
+                parts.append("[^]")
+            if d.get('SHOW_IN_REPORTS_BL') == False:
+                parts.append("[INT]")
+            if d.get('GENERALIZATION_BL', False):
+                parts.append("[GEN]")
+            flags = " ".join(parts)
+            if flags:
+                flags = " " + flags
 
         # se usage>0 => "(Studies: usage)"
         usage_str = f" (Studies: {usage})" if usage > 0 else ""
@@ -339,14 +371,11 @@ class ConceptTreeWindow(tk.Toplevel):
 
     # ---------------- STUDIES ----------------
     def popup_show_studies(self):
-        if not self.selected_item:
-            return
-        d = self.G.nodes[self.selected_item]
-        if d.get('type') != "concept":
+        if self.selected_item not in self.node_pos:
             return
         self.remove_children_prefix("assoc_")
-        st_set = d.get('study_set', set())
-        if not st_set:
+        st_set = self.M.studies_of(self.M.concept_ids[self.node_pos[self.selected_item]])
+        if len(st_set) == 0:
             messagebox.showinfo("Show Studies", "No studies for this concept.")
             return
         df_st = data_structures.Studies_DF
@@ -380,19 +409,16 @@ class ConceptTreeWindow(tk.Toplevel):
         Non riportare RES, INT, ^, GEN, usage...
         Invece di "x out of y" -> "x/y".
         """
-        if not self.selected_item:
-            return
-        d = self.G.nodes[self.selected_item]
-        if d.get('type') != "concept":
+        if self.selected_item not in self.node_pos:
             return
         self.remove_children_prefix("study_")
 
-        st_set = d.get('study_set', set())
-        if not st_set:
+        pos = self.node_pos[self.selected_item]
+        total = int(self.usage[pos])
+        if total == 0:
             messagebox.showinfo("Show Associations", "No studies => no assoc.")
             return
 
-        freq_map = {}
         # Cerchiamo final only => group_code=1 => in KB_Conclusions_DF
         df_kb = data_structures.KB_Conclusions_DF
         if df_kb.empty:
@@ -400,35 +426,27 @@ class ConceptTreeWindow(tk.Toplevel):
             return
         final_codes = df_kb[df_kb['GROUP_CODE'] == 1]['CODE'].unique()
 
-        for rico in st_set:
-            cnode = f"case_{rico}"
-            if cnode not in self.G:
-                continue
-            for neigh in self.G.successors(cnode):
-                # must be final
-                neigh_code = self.G.nodes[neigh].get('CODE', None)
-                if neigh != self.selected_item and self.G[cnode][neigh].get('relation') == "CASE-OF":
-                    if neigh_code in final_codes:
-                        freq_map[neigh] = freq_map.get(neigh, 0) + 1
-
-        if not freq_map:
+        # studi in comune con ogni concetto: un bincount sulla matrice
+        freq = self.M.co_occurrence(self.M.concept_ids[pos])
+        codes = self.M.concepts['CODE'].to_numpy(dtype='float64', na_value=np.nan)
+        freq[pos] = 0
+        freq[~np.isin(codes, final_codes) | (codes == 0)] = 0  # CODE 0 = '?'
+        assoc = np.flatnonzero(freq)
+        if len(assoc) == 0:
             messagebox.showinfo("Show Associations", "No final assoc found.")
             return
         self.remove_children_prefix("assoc_")
 
-        total = len(st_set)
-
         # ordiniamo per freq desc, e secondariamente rank_abs
-        def get_rankabs(node_id):
-            return self.G.nodes[node_id].get('RANK_ABS', 999999)
-
-        sorted_items = sorted(freq_map.items(), key=lambda x: (-x[1], get_rankabs(x[0])))
+        rank_abs = self.M.concepts['RANK_ABS'].to_numpy(dtype='float64', na_value=999999) \
+            if 'RANK_ABS' in self.M.concepts.columns else np.full(self.M.n_concepts, 999999.0)
+        order = np.lexsort((assoc, rank_abs[assoc], -freq[assoc]))
 
-        for node_id, freq in sorted_items:
-            codeval = self.G.nodes[node_id].get('CODE', '?')
+        for i in assoc[order].tolist():
+            codeval = self.attrs['CODE'][i] if self.attrs['CODE'][i] else '?'
             cdesc = get_conclusion_str(codeval)
-            suffix = f"{freq}/{total}"
-            assoc_id = f"assoc_{node_id}"
+            suffix = f"{freq[i]}/{total}"
+            assoc_id = f"assoc_conc_{self.M.concept_ids[i]}"
             # Non riportiamo RES, INT, ^, GEN e usage => stampiamo solo code e cdesc
             self.tree.insert(
                 self.selected_item,
@@ -468,20 +486,13 @@ class ConceptTreeWindow(tk.Toplevel):
         self.main_tk.lift()
         self.main_tk.focus_force()
 
-        # Attiviamo la tab Explore Studies e attendiamo un attimo
-        # per eseguire goto_study
-        if hasattr(self.main_tk, "notebook") and hasattr(self.main_tk, "studies_page"):
-            self.main_tk.notebook.select(self.main_tk.studies_page)
-
-            # Scheduliamo l'azione dopo 50ms, per dare tempo alla pagina di attivarsi
-            def delayed_goto():
-                self.main_tk.studies_page.study_entry.delete(0, tk.END)
-                self.main_tk.studies_page.study_entry.insert(0, str(study_num))
-                self.main_tk.studies_page.goto_study()
-
-            self.main_tk.after(50, delayed_goto)
+        # Attiviamo la tab Explore Studies e mostriamo lo studio
+        # (la pagina viene costruita se non ancora visitata)
+        if hasattr(self.main_tk, "goto_study"):
+            # RICO_ID è univoco (STUDY_NUMBER può ripetersi)
+            self.main_tk.goto_study(rico_id, key="rico")
         else:
-            messagebox.showinfo("GoTo Study", "No attribute 'studies_page' or 'notebook' in main root.")
+            messagebox.showinfo("GoTo Study", "No method 'goto_study' in main root.")
 
 
 class StudyGraphWindow(tk.Toplevel):
@@ -499,6 +510,7 @@ class StudyGraphWindow(tk.Toplevel):
         self.canvas = tk.Canvas(self.main_frame, bg="white")
         self.canvas.pack(fill=tk.BOTH, expand=True)
 
+        import networkx as nx
         self.pos = nx.spring_layout(self.subg, k=0.5, iterations=50)
 
         self.canvas.bind("<Configure>", self.on_resize)
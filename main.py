@@ -9,39 +9,93 @@ Scopo:
     3) ExploreKBPage
     4) ImportExportAndDataFramePage
     5) AIToolsPage
-  - All'avvio: dimensiona la finestra, carica i DataFrame da FEATHER
-    e poi seleziona automaticamente la scheda "AI Tools".
+  - All'avvio: dimensiona la finestra, seleziona la scheda "AI Tools",
+    e carica i DataFrame da FEATHER in background (barra di stato).
 
 Procedures/Functions/Metodi Principali:
   - __init__(): Crea le pagine del Notebook, definisce stile, e avvia.
-  - set_initial_geometry_and_load_feather(): imposta dimensioni e carica DF Feather.
-  - on_tab_changed(event): chiama on_enter_page() nelle pagine se serve.
+  - set_initial_geometry(): imposta dimensioni e posizione della finestra.
+  - start_background_load(): misura il time-to-first-interaction e avvia
+    la lettura dei DF Feather in un thread secondario.
+  - poll_background_load(): pubblica i DF letti e abilita pagine/pulsanti.
+  - get_page(text): ritorna la pagina della tab, costruendola alla prima richiesta.
+  - goto_study(study_num): apre "Explore Studies" sullo studio indicato.
+  - on_tab_changed(event): costruisce la pagina (LazyPage) e chiama
+    on_enter_page() nelle pagine se serve.
 
 Modifiche recenti:
   - 2025-01-14: Aggiunta la logica di "Load DataFrames FEATHER" in automatico,
     poi passa alla tab "AI Tools".
+  - 2026-10-19: Avvio asincrono: la finestra viene disegnata subito, i DF
+    sono letti in background (startup_functions.BackgroundSnapshotLoader).
+    Le tab dipendenti dai dati restano disabilitate finché i DF non sono pronti.
+    Time-to-first-interaction e tempo di caricamento sono registrati nel log.
+  - 2026-10-19: Pagine costruite alla prima selezione della tab (LazyPage);
+    i moduli delle pagine e le librerie pesanti sono importati solo quando
+    servono. Report import-time: python startup_functions.py
+  - 2026-10-19: Avvio del campionamento RSS/CPU (Memory Profiler) dopo il
+    primo disegno della finestra; il caricamento iniziale è un'operazione tracciata.
+  - 2026-10-19: goto_study() usa la ricerca di Explore Studies ("study:N",
+    "rico:N", "anag:N").
 
 Note:
   - Viene usato style "TNotebook.Tab" font 14 bold.
-  - Per aggiungere altre pagine, import i moduli e aggiungi nel Notebook.
+  - Per aggiungere altre pagine, aggiungi una factory in PAGES (e le
+    dipendenze dai DF in startup_functions.PAGE_DEPENDENCIES).
 """
 
+import time
+
+# Istante di avvio del processo (prima degli import pesanti)
+START_TIME = time.perf_counter()
+
+import logging
 import tkinter as tk
 from tkinter import ttk
 
-from home_page import HomePage
-from explore_studies_page import ExploreStudiesPage
-from explore_kb_page import ExploreKBPage
-from import_export_and_df_page import ImportExportAndDataFramePage
-from ai_tools_page import AIToolsPage
+from startup_functions import BackgroundSnapshotLoader, LazyPage, PAGE_DEPENDENCIES, frames_ready
+from memory_profiler_functions import get_sampler, begin_operation, end_operation
+
+logger = logging.getLogger(__name__)
+
+
+# Factory delle pagine: il modulo della pagina è importato solo
+# quando la pagina viene costruita (prima selezione della tab).
+def make_home_page(parent):
+    from home_page import HomePage
+    return HomePage(parent)
+
+def make_studies_page(parent):
+    from explore_studies_page import ExploreStudiesPage
+    return ExploreStudiesPage(parent)
+
+def make_kb_page(parent):
+    from explore_kb_page import ExploreKBPage
+    return ExploreKBPage(parent)
+
+def make_import_page(parent):
+    from import_export_and_df_page import ImportExportAndDataFramePage
+    return ImportExportAndDataFramePage(parent)
+
+def make_ai_tools_page(parent):
+    from ai_tools_page import AIToolsPage
+    return AIToolsPage(parent)
+
+PAGES = [
+    ("Home", make_home_page),
+    ("Explore Studies", make_studies_page),
+    ("Explore KB", make_kb_page),
+    ("Import/Export & Data Frame", make_import_page),
+    ("AI Tools", make_ai_tools_page)
+]
 
 class MainApplication(tk.Tk):
     """
     MainApplication:
      - Crea un Notebook con 5 pagine:
        (Home, ExploreStudies, ExploreKB, ImportExport, AI Tools).
-     - All'avvio, dimensiona la finestra, carica DF da FEATHER
-       e passa su "AI Tools" automaticamente.
+     - All'avvio, dimensiona la finestra, passa su "AI Tools"
+       e carica i DF da FEATHER in background.
     """
     def __init__(self):
         super().__init__()
@@ -51,38 +105,39 @@ class MainApplication(tk.Tk):
         style = ttk.Style(self)
         style.configure("TNotebook.Tab", font=("Helvetica", 14, "bold"))
 
+        # Barra di stato (in basso, sotto il Notebook)
+        self.status_var = tk.StringVar(value="Starting...")
+        self.status_bar = ttk.Label(self, textvariable=self.status_var, anchor=tk.W, relief=tk.SUNKEN)
+        self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+
         self.notebook = ttk.Notebook(self, style="TNotebook")
         self.notebook.pack(fill=tk.BOTH, expand=True)
 
-        # Pagina 1: Home
-        self.home_page = HomePage(self.notebook)
-        self.notebook.add(self.home_page, text="Home")
-
-        # Pagina 2: Explore Studies
-        self.studies_page = ExploreStudiesPage(self.notebook)
-        self.notebook.add(self.studies_page, text="Explore Studies")
-
-        # Pagina 3: Explore KB
-        self.kb_page = ExploreKBPage(self.notebook)
-        self.notebook.add(self.kb_page, text="Explore KB")
+        # DF pronti (letti o invariati) durante il caricamento in background
+        self.ready_frames = set()
+        self.loading = True
+        self.loader = None
 
-        # Pagina 4: Import/Export & Data Frame
-        self.import_page = ImportExportAndDataFramePage(self.notebook)
-        self.notebook.add(self.import_page, text="Import/Export & Data Frame")
-
-        # Pagina 5: AI Tools
-        self.ai_tools_page = AIToolsPage(self.notebook)
-        self.notebook.add(self.ai_tools_page, text="AI Tools")
+        # Pagine: contenitori LazyPage, costruiti alla prima selezione
+        self.tabs = {}
+        for text, factory in PAGES:
+            container = LazyPage(self.notebook, factory, text)
+            self.notebook.add(container, text=text)
+            self.tabs[text] = container
 
         self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
 
-        # Dimensioni + caricamento DF Feather all'avvio
-        self.after(0, self.set_initial_geometry_and_load_feather)
+        # Dimensioni subito, "AI Tools" come tab iniziale (non richiede dati)
+        self.set_initial_geometry()
+        self.notebook.select(self.tabs["AI Tools"])
+        self.set_pages_state()
+
+        # Appena la finestra è disegnata, avviamo il caricamento
+        self.after_idle(self.start_background_load)
 
-    def set_initial_geometry_and_load_feather(self):
+    def set_initial_geometry(self):
         """
         Larghezza=1300, altezza=screen_height - 100.
-        Poi carichiamo DF da FEATHER e passiamo a "AI Tools".
         """
         screen_w = self.winfo_screenwidth()
         screen_h = self.winfo_screenheight()
@@ -93,13 +148,119 @@ class MainApplication(tk.Tk):
         y_pos = (screen_h - height) // 2
         self.geometry(f"{width}x{height}+{x_pos}+{y_pos}")
 
-        # Carichiamo i DF in automatico:
-        self.import_page.do_load_dataframes_feather()
-        # Selezioniamo la tab "AI Tools"
-        self.notebook.select(self.ai_tools_page)
+    def get_page(self, text):
+        """
+        Ritorna la pagina della tab "text", costruendola se necessario.
+        """
+        container = self.tabs[text]
+        built_now = not container.is_built()
+        page = container.ensure_built()
+        if built_now and hasattr(page, "on_frames_ready"):
+            page.on_frames_ready(self.ready_frames, self.loading)
+        return page
+
+    @property
+    def home_page(self):
+        return self.get_page("Home")
+
+    @property
+    def studies_page(self):
+        return self.get_page("Explore Studies")
+
+    @property
+    def kb_page(self):
+        return self.get_page("Explore KB")
+
+    @property
+    def import_page(self):
+        return self.get_page("Import/Export & Data Frame")
+
+    @property
+    def ai_tools_page(self):
+        return self.get_page("AI Tools")
+
+    def set_pages_state(self):
+        """
+        Abilita le tab i cui DF sono pronti; le altre restano disabilitate
+        finché il caricamento è in corso. Aggiorna anche i pulsanti
+        delle pagine già costruite che espongono on_frames_ready(ready).
+        """
+        for text, container in self.tabs.items():
+            deps = PAGE_DEPENDENCIES.get(text, [])
+            enabled = (not self.loading) or frames_ready(deps, self.ready_frames)
+            self.notebook.tab(container, state=tk.NORMAL if enabled else tk.DISABLED)
+            if container.is_built() and hasattr(container.page, "on_frames_ready"):
+                container.page.on_frames_ready(self.ready_frames, self.loading)
+
+    def start_background_load(self):
+        """
+        Registra il time-to-first-interaction (finestra disegnata e
+        mainloop attivo) e avvia la lettura dei DF in background.
+        """
+        self.update_idletasks()
+        ttfi = time.perf_counter() - START_TIME
+        logger.info("Time to first interaction: %.2fs", ttfi)
+
+        self.status_var.set(f"Ready in {ttfi:.2f}s - loading DataFrames from FEATHER...")
+        get_sampler().start()
+        self.load_op = begin_operation("Startup Load FEATHER")
+        self.loader = BackgroundSnapshotLoader()
+        self.loader.start()
+        self.after(50, self.poll_background_load)
+
+    def poll_background_load(self):
+        """
+        Consuma i messaggi del loader (thread Tk): pubblica i DF letti,
+        aggiorna barra di stato e abilita pagine/pulsanti.
+        """
+        done = False
+        items = self.loader.poll()
+        for item in items:
+            kind = item[0]
+            if kind == 'frame':
+                self.loader.publish(item)
+                self.ready_frames.add(item[1])
+                self.status_var.set(f"Loaded {item[1]}: {len(item[2])} records")
+            elif kind == 'skip':
+                self.ready_frames.add(item[1])
+            elif kind == 'message':
+                logger.info(item[1])
+            elif kind == 'error':
+                logger.error(item[1])
+                self.status_var.set(f"Error: {item[1]}")
+            elif kind == 'done':
+                done = True
+                end_operation(self.load_op)
+                total = time.perf_counter() - START_TIME
+                logger.info("DataFrames loaded in %.2fs (%.2fs since start)", item[1], total)
+                if not self.status_var.get().startswith("Error"):
+                    self.status_var.set(f"DataFrames loaded in {item[1]:.2f}s ({total:.2f}s since start)")
+
+        if items:
+            self.loading = not done
+            self.set_pages_state()
+        if not done:
+            self.after(50, self.poll_background_load)
+
+    def goto_study(self, study_num, key="study"):
+        """
+        Seleziona la tab "Explore Studies" e mostra lo studio con
+        STUDY_NUMBER=study_num (dopo 50 ms, a pagina attiva).
+        key="rico"/"anag" cerca invece per RICO_ID/ANAG_ID.
+        """
+        self.notebook.select(self.tabs["Explore Studies"])
+
+        def delayed_goto():
+            page = self.studies_page
+            page.study_entry.delete(0, tk.END)
+            page.study_entry.insert(0, f"{key}:{study_num}")
+            page.goto_study()
+
+        self.after(50, delayed_goto)
 
     def on_tab_changed(self, event):
         current_tab = self.notebook.tab(self.notebook.select(), "text")
+        self.get_page(current_tab)
         if current_tab == "Explore Studies":
             self.studies_page.on_enter_page()
         elif current_tab == "Explore KB":
@@ -109,6 +270,7 @@ class MainApplication(tk.Tk):
         # Per "AI Tools" non è necessario fare nulla di speciale.
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s: %(message)s")
     app = MainApplication()
     app.mainloop()
 
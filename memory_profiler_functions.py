@@ -0,0 +1,297 @@
+"""
+Filename: memory_profiler_functions.py
+======================================
+
+Scopo:
+  - Profilazione della memoria dei DataFrame per colonna e dtype,
+    con stima del risparmio ottenibile convertendo a categorical
+    o facendo il downcast dei tipi numerici.
+  - Campionamento in background di RSS e CPU del processo (psutil),
+    con attribuzione della crescita di memoria all'operazione in corso
+    (import, build graph, statistiche, ...).
+
+Procedures/Functions/Classi Principali:
+  - column_memory_report(df): DataFrame con memoria e risparmio stimato per colonna.
+  - dataframes_memory_report(df_names): Report per colonna di tutti i DF indicati.
+  - ResourceSampler: thread di campionamento (timeline RSS/CPU + operazioni).
+  - get_sampler(): Istanza globale del ResourceSampler (avviata su richiesta).
+  - track_operation(name): Context manager che registra inizio/fine di un'operazione.
+  - begin_operation(name) / end_operation(token): Versione esplicita (es. avvio asincrono).
+  - operations_summary(): Crescita RSS aggregata per nome operazione.
+
+Modifiche recenti:
+  - 2026-10-19: Creazione del modulo (profiler per colonna e timeline risorse).
+  - 2026-10-19: ResourceSampler.stop() attende il thread, così start() può
+    riavviare il campionamento.
+
+Note:
+  - psutil è importato solo all'avvio del sampler (import differito);
+    se non disponibile il sampler resta disattivo e track_operation
+    non registra nulla.
+  - Le stime di risparmio sono indicative: per categorical si stimano
+    codici interi + categorie uniche, per il downcast il dtype minimo
+    che contiene min/max della colonna.
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+import data_structures
+
+logger = logging.getLogger(__name__)
+
+# Soglia di cardinalità (unique/len) sotto la quale si suggerisce categorical
+CATEGORY_RATIO = 0.5
+
+_INT_DTYPES = [
+    (np.int8, "int8", "Int8"),
+    (np.int16, "int16", "Int16"),
+    (np.int32, "int32", "Int32"),
+    (np.int64, "int64", "Int64")
+]
+
+
+def _smallest_int_dtype(min_val, max_val, nullable):
+    """
+    Ritorna (nome_dtype, itemsize) del più piccolo intero che contiene [min_val, max_val].
+    """
+    for np_type, name, nullable_name in _INT_DTYPES:
+        info = np.iinfo(np_type)
+        if info.min <= min_val and max_val <= info.max:
+            return (nullable_name if nullable else name), np.dtype(np_type).itemsize
+    return ("Int64" if nullable else "int64"), 8
+
+
+def column_memory_report(df):
+    """
+    Ritorna un DataFrame con una riga per colonna:
+      COLUMN, DTYPE, MB, UNIQUE, SUGGESTED, EST_MB, SAVING_MB
+    SUGGESTED è il dtype consigliato ("" se nessuno).
+    """
+    rows = []
+    n = len(df)
+    mem_by_col = df.memory_usage(deep=True, index=False)
+    for col in df.columns:
+        series = df[col]
+        mb = mem_by_col[col] / 1024**2
+        dtype = series.dtype
+        suggested = ""
+        est_mb = mb
+        nunique = None
+
+        if n > 0 and (pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype)):
+            nunique = series.nunique(dropna=True)
+            if nunique / n < CATEGORY_RATIO:
+                codes_size = _smallest_int_dtype(-1, max(nunique, 1), False)[1]
+                uniques = pd.Series(series.dropna().unique())
+                cat_mb = (n * codes_size + uniques.memory_usage(deep=True, index=False)) / 1024**2
+                if cat_mb < mb:
+                    suggested = "category"
+                    est_mb = cat_mb
+        elif n > 0 and pd.api.types.is_integer_dtype(dtype):
+            nullable = isinstance(dtype, pd.api.extensions.ExtensionDtype)
+            valid = series.dropna()
+            if len(valid) > 0:
+                name, itemsize = _smallest_int_dtype(int(valid.min()), int(valid.max()), nullable)
+                if name.lower() != str(dtype).lower():
+                    suggested = name
+                    est_mb = (n * itemsize + (n if nullable else 0)) / 1024**2
+        elif n > 0 and pd.api.types.is_float_dtype(dtype) and str(dtype) == "float64":
+            suggested = "float32"
+            est_mb = mb / 2
+
+        rows.append({
+            'COLUMN': col,
+            'DTYPE': str(dtype),
+            'MB': mb,
+            'UNIQUE': nunique,
+            'SUGGESTED': suggested,
+            'EST_MB': est_mb,
+            'SAVING_MB': mb - est_mb
+        })
+    return pd.DataFrame(rows, columns=['COLUMN', 'DTYPE', 'MB', 'UNIQUE', 'SUGGESTED', 'EST_MB', 'SAVING_MB'])
+
+
+def dataframes_memory_report(df_names):
+    """
+    Concatena column_memory_report() dei DF in data_structures,
+    con la colonna DF_NAME in testa.
+    """
+    parts = []
+    for df_name in df_names:
+        df = getattr(data_structures, df_name, None)
+        if df is None or df.empty:
+            continue
+        rep = column_memory_report(df)
+        rep.insert(0, 'DF_NAME', df_name)
+        parts.append(rep)
+    if not parts:
+        return pd.DataFrame(columns=['DF_NAME', 'COLUMN', 'DTYPE', 'MB', 'UNIQUE', 'SUGGESTED', 'EST_MB', 'SAVING_MB'])
+    return pd.concat(parts, ignore_index=True)
+
+
+class ResourceSampler:
+    """
+    Thread daemon che ogni interval secondi registra
+    (t, rss_mb, cpu_percent, operazione corrente) in una deque circolare.
+    Le operazioni (begin/end) registrano RSS iniziale, finale e picco,
+    così la crescita di memoria è attribuita all'operazione che l'ha causata.
+    """
+    def __init__(self, interval=0.5, max_samples=7200):
+        self.interval = interval
+        self.samples = deque(maxlen=max_samples)
+        self.operations = []
+        self.active_ops = {}
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.process = None
+        self.t0 = time.perf_counter()
+        self.next_token = 0
+
+    def start(self):
+        """
+        Avvia il campionamento. Ritorna False se psutil non è disponibile.
+        """
+        if self.thread is not None:
+            return True
+        try:
+            import psutil
+        except ImportError:
+            logger.warning("psutil not installed: resource sampling disabled.")
+            return False
+        self.process = psutil.Process()
+        self.process.cpu_percent(None)
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="ResourceSampler", daemon=True)
+        self.thread.start()
+        return True
+
+    def stop(self):
+        """
+        Ferma il campionamento e attende il thread; start() lo può riavviare.
+        """
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def is_running(self):
+        return self.thread is not None and not self.stop_event.is_set()
+
+    def current_rss_mb(self):
+        if self.process is None:
+            return None
+        return self.process.memory_info().rss / 1024**2
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            rss = self.current_rss_mb()
+            cpu = self.process.cpu_percent(None)
+            with self.lock:
+                names = [op['name'] for op in self.active_ops.values()]
+                for op in self.active_ops.values():
+                    op['rss_peak'] = max(op['rss_peak'], rss)
+                self.samples.append((time.perf_counter() - self.t0, rss, cpu, " / ".join(names)))
+
+    def begin(self, name):
+        if self.process is None:
+            return None  # sampler non avviato
+        rss = self.current_rss_mb()
+        with self.lock:
+            token = self.next_token
+            self.next_token += 1
+            self.active_ops[token] = {
+                'name': name,
+                'start': time.perf_counter() - self.t0,
+                'rss_start': rss,
+                'rss_peak': rss
+            }
+        return token
+
+    def end(self, token):
+        if token is None or self.process is None:
+            return None
+        rss = self.current_rss_mb()
+        with self.lock:
+            op = self.active_ops.pop(token, None)
+            if op is None:
+                return None
+            op['end'] = time.perf_counter() - self.t0
+            op['rss_end'] = rss
+            op['rss_peak'] = max(op['rss_peak'], rss)
+            op['delta_mb'] = rss - op['rss_start']
+            op['peak_delta_mb'] = op['rss_peak'] - op['rss_start']
+            self.operations.append(op)
+        logger.info("%s: %+.1f MB RSS (peak %+.1f MB) in %.2fs",
+                    op['name'], op['delta_mb'], op['peak_delta_mb'], op['end'] - op['start'])
+        return op
+
+    def timeline(self, last=None):
+        """
+        Ritorna la timeline come DataFrame (T_S, RSS_MB, CPU_PCT, OPERATION).
+        """
+        with self.lock:
+            data = list(self.samples)
+        if last is not None:
+            data = data[-last:]
+        return pd.DataFrame(data, columns=['T_S', 'RSS_MB', 'CPU_PCT', 'OPERATION'])
+
+
+_sampler = ResourceSampler()
+
+
+def get_sampler():
+    return _sampler
+
+
+def begin_operation(name):
+    """
+    Registra l'inizio di un'operazione. Ritorna un token per end_operation().
+    """
+    return _sampler.begin(name)
+
+
+def end_operation(token):
+    return _sampler.end(token)
+
+
+@contextmanager
+def track_operation(name):
+    """
+    with track_operation("Build Graph"): ...
+    Registra RSS iniziale/finale/picco dell'operazione.
+    """
+    token = begin_operation(name)
+    try:
+        yield
+    finally:
+        end_operation(token)
+
+
+def operations_summary():
+    """
+    Crescita RSS aggregata per nome operazione, ordinata per crescita totale:
+    NAME, COUNT, TOTAL_DELTA_MB, MAX_PEAK_DELTA_MB, TOTAL_TIME_S
+    """
+    with _sampler.lock:
+        ops = list(_sampler.operations)
+    if not ops:
+        return pd.DataFrame(columns=['NAME', 'COUNT', 'TOTAL_DELTA_MB', 'MAX_PEAK_DELTA_MB', 'TOTAL_TIME_S'])
+    df = pd.DataFrame(ops)
+    df['DURATION'] = df['end'] - df['start']
+    summary = df.groupby('name').agg(
+        COUNT=('name', 'size'),
+        TOTAL_DELTA_MB=('delta_mb', 'sum'),
+        MAX_PEAK_DELTA_MB=('peak_delta_mb', 'max'),
+        TOTAL_TIME_S=('DURATION', 'sum')
+    ).reset_index().rename(columns={'name': 'NAME'})
+    return summary.sort_values('TOTAL_DELTA_MB', ascending=False, ignore_index=True)
+
+# End of memory_profiler_functions.py
@@ -0,0 +1,429 @@
+"""
+Filename: snapshot_functions.py
+===============================
+
+Scopo:
+  - Gestire gli snapshot FEATHER dei DataFrame globali.
+  - Ad ogni salvataggio scrive un file "manifest.json" che descrive,
+    per ogni DataFrame: numero record, schema (colonne + dtype),
+    dimensione file, hash SHA-256, timestamp e id dell'import,
+    watermark (max ID / RICO_ID / STUDY_DATE).
+  - Al caricamento usa il manifest per validare la coerenza prima di
+    leggere i file e per saltare i file non cambiati dall'ultimo load.
+  - Permette più snapshot con nome, affiancati nella cartella FEATHER.
+
+Procedures/Functions:
+  - snapshot_folder(name): Cartella dello snapshot (""=default).
+  - list_snapshots(): Elenco degli snapshot disponibili.
+  - save_snapshot(name): Salva i DF + manifest. Ritorna lista di righe.
+  - read_manifest(name): Legge il manifest (o None se assente).
+  - validate_snapshot(name): Controlla file, dimensioni, hash, schema e import.
+  - plan_snapshot_load(name): Decide quali file leggere e quali saltare.
+  - read_snapshot_frame(name, df_name): Legge un singolo file FEATHER.
+  - apply_snapshot_frame(name, df_name, df, entry): Pubblica il DF in data_structures.
+  - load_snapshot(name, force): Validazione + caricamento completo.
+  - record_import(df_names): Registra timestamp/id dell'import corrente.
+
+Modifiche recenti:
+  - 2026-10-19: Creazione del modulo (manifest, validazione, snapshot con nome).
+  - 2026-10-19: pyarrow importato solo in lettura/scrittura (import differito).
+  - 2026-10-19: I DF sono pubblicati con data_structures.set_dataframe()
+    (versione = hash del file FEATHER).
+  - 2026-10-19: Lo stato dei DF caricati/salvati registra la generazione
+    invece del DF (i DF sostituiti non restano in memoria).
+
+Note:
+  - Lo snapshot di default ("") coincide con la cartella storica
+    "DataFrame Download FEATHER": i file già presenti senza manifest
+    vengono ancora caricati (modalità legacy, senza validazione).
+  - Le funzioni non toccano Tk: ritornano righe di testo da mostrare.
+"""
+
+import os
+import json
+import time
+import hashlib
+import datetime
+import uuid
+
+import pandas as pd
+
+import data_structures
+
+FEATHER_FOLDER = "DataFrame Download FEATHER"
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+
+DF_NAMES = [
+    "Studies_DF",
+    "RulesConclusions_DF",
+    "FinalDiagnoses_DF",
+    "ClinicalDiagnoses_DF",
+    "KB_Conclusions_DF",
+    "KB_Rules_DF",
+    "KB_Conditions_DF",
+    "KB_Muscles_DF",
+    "KB_Nerves_DF"
+]
+
+# DF provenienti dall'import DB (HIS) e dall'import KB:
+# i DF di uno stesso gruppo devono appartenere allo stesso import.
+DB_DF_NAMES = ["Studies_DF", "RulesConclusions_DF", "FinalDiagnoses_DF", "ClinicalDiagnoses_DF"]
+KB_DF_NAMES = ["KB_Conclusions_DF", "KB_Rules_DF", "KB_Conditions_DF", "KB_Muscles_DF", "KB_Nerves_DF"]
+
+# Schema atteso (da data_structures) per ogni DF
+EXPECTED_SCHEMAS = {
+    "Studies_DF": data_structures.STUDIES_COLUMNS,
+    "RulesConclusions_DF": data_structures.RULES_CONCLUSIONS_COLUMNS,
+    "FinalDiagnoses_DF": data_structures.FINAL_DIAGNOSES_COLUMNS,
+    "ClinicalDiagnoses_DF": data_structures.CLINICAL_DIAGNOSES_COLUMNS,
+    "KB_Conclusions_DF": data_structures.KB_Conclusions_COLUMNS,
+    "KB_Rules_DF": data_structures.KB_Rules_COLUMNS,
+    "KB_Conditions_DF": data_structures.KB_Conditions_COLUMNS,
+    "KB_Muscles_DF": data_structures.KB_Muscles_COLUMNS,
+    "KB_Nerves_DF": data_structures.KB_Nerves_COLUMNS
+}
+
+# Colonne su cui calcolare i watermark dell'import
+WATERMARK_COLUMNS = ["ID", "RICO_ID", "STUDY_DATE"]
+
+# Stato dell'ultimo load/save: df_name -> {'sha256':..., 'generation': int}
+# Serve per saltare i file invariati (stesso hash e DF non sostituito);
+# la generazione evita di tenere in vita i DF già sostituiti.
+_loaded_frames = {}
+_active_snapshot = ""
+
+
+def snapshot_folder(name=""):
+    """
+    Ritorna la cartella dello snapshot. Lo snapshot di default ("")
+    è la cartella FEATHER storica; gli altri sono sottocartelle.
+    """
+    if not name:
+        return FEATHER_FOLDER
+    return os.path.join(FEATHER_FOLDER, name)
+
+
+def list_snapshots():
+    """
+    Ritorna l'elenco dei nomi di snapshot disponibili.
+    "" (default) è sempre presente; le sottocartelle sono incluse
+    solo se contengono un manifest.
+    """
+    names = [""]
+    if os.path.isdir(FEATHER_FOLDER):
+        for entry in sorted(os.listdir(FEATHER_FOLDER)):
+            path = os.path.join(FEATHER_FOLDER, entry)
+            if os.path.isfile(os.path.join(path, MANIFEST_FILE)):
+                names.append(entry)
+    return names
+
+
+def get_active_snapshot():
+    """
+    Nome dello snapshot caricato o salvato per ultimo.
+    """
+    return _active_snapshot
+
+
+def record_import(df_names):
+    """
+    Registra in data_structures.IMPORT_INFO timestamp e id comune
+    dell'import appena eseguito per i DF indicati.
+    """
+    info = {
+        'import_id': uuid.uuid4().hex,
+        'imported_at': datetime.datetime.now().isoformat(timespec='seconds')
+    }
+    for df_name in df_names:
+        data_structures.IMPORT_INFO[df_name] = dict(info)
+
+
+def file_sha256(filename, chunk_size=1024 * 1024):
+    """
+    Hash SHA-256 del file, letto a blocchi.
+    """
+    h = hashlib.sha256()
+    with open(filename, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def compute_watermarks(df):
+    """
+    Ritorna i valori massimi (come stringhe) delle colonne ID, RICO_ID,
+    STUDY_DATE presenti nel DF.
+    """
+    marks = {}
+    for col in WATERMARK_COLUMNS:
+        if col in df.columns and len(df) > 0:
+            val = df[col].max()
+            marks[col] = None if pd.isna(val) else str(val)
+    return marks
+
+
+def read_manifest(name=""):
+    """
+    Legge il manifest dello snapshot. Ritorna None se non esiste.
+    """
+    path = os.path.join(snapshot_folder(name), MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_manifest(name, manifest):
+    """
+    Scrittura atomica del manifest (file temporaneo + replace).
+    """
+    path = os.path.join(snapshot_folder(name), MANIFEST_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def save_snapshot(name=""):
+    """
+    Salva tutti i DF non vuoti in FEATHER nella cartella dello snapshot
+    e scrive il manifest. Ritorna una lista di righe di esito.
+    """
+    global _active_snapshot
+    import pyarrow.feather as feather
+    folder = snapshot_folder(name)
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+
+    lines = [f"Downloading all DataFrames to FEATHER in {folder}...", ""]
+    frames = {}
+    for df_name in DF_NAMES:
+        df = getattr(data_structures, df_name, None)
+        if df is None or df.empty:
+            lines.append(f"{df_name} is empty or None. Skipping.")
+            continue
+        filename = os.path.join(folder, f"{df_name}.feather")
+        df.reset_index(drop=True, inplace=True)
+        feather.write_feather(df, filename)
+
+        st = os.stat(filename)
+        sha = file_sha256(filename)
+        info = data_structures.IMPORT_INFO.get(df_name, {})
+        frames[df_name] = {
+            'file': f"{df_name}.feather",
+            'rows': int(len(df)),
+            'schema': {col: str(dtype) for col, dtype in df.dtypes.items()},
+            'size': int(st.st_size),
+            'mtime_ns': int(st.st_mtime_ns),
+            'sha256': sha,
+            'import_id': info.get('import_id'),
+            'imported_at': info.get('imported_at'),
+            'watermarks': compute_watermarks(df)
+        }
+        _loaded_frames[df_name] = {'sha256': sha,
+                                   'generation': data_structures.get_generation(df_name)}
+        # Il contenuto in memoria coincide ora con il file salvato
+        data_structures.DF_VERSIONS[df_name] = sha
+        lines.append(f"Saved {df_name} -> {filename}")
+
+    # I DF vuoti restano fuori dal manifest: eventuali file FEATHER
+    # precedenti non vengono cancellati (plan_snapshot_load li ignora)
+    manifest = {
+        'manifest_version': MANIFEST_VERSION,
+        'schema_version': data_structures.SCHEMA_VERSION,
+        'snapshot': name,
+        'saved_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'frames': frames
+    }
+    _write_manifest(name, manifest)
+    _active_snapshot = name
+    lines.append(f"Manifest written ({len(frames)} frames).")
+    return lines
+
+
+def _dtype_kind(dtype_str):
+    """
+    Classe del dtype per il confronto tollerante dello schema:
+    interi (nullable o no), float, bool, datetime, object/string.
+    """
+    d = dtype_str.lower()
+    if d.startswith("int") or d.startswith("uint"):
+        return "int"
+    if d.startswith("float"):
+        return "float"
+    if d.startswith("bool"):
+        return "bool"
+    if d.startswith("datetime"):
+        return "datetime"
+    return "object"
+
+
+def validate_snapshot(name=""):
+    """
+    Valida lo snapshot usando il manifest, senza leggere i DataFrame.
+    Ritorna (errors, warnings): liste di stringhe.
+      - errori: manifest mancante o di versione non supportata,
+        file mancanti, dimensione/hash diversi, colonne mancanti.
+      - warning: schema_version diversa, dtype diversi, colonne extra,
+        DF dello stesso gruppo provenienti da import diversi.
+    """
+    errors = []
+    warnings = []
+    manifest = read_manifest(name)
+    if manifest is None:
+        errors.append("No manifest found.")
+        return errors, warnings
+    if manifest.get('manifest_version') != MANIFEST_VERSION:
+        errors.append(f"Unsupported manifest version {manifest.get('manifest_version')}.")
+        return errors, warnings
+    if manifest.get('schema_version') != data_structures.SCHEMA_VERSION:
+        warnings.append(
+            f"Schema version {manifest.get('schema_version')} "
+            f"differs from current {data_structures.SCHEMA_VERSION}."
+        )
+
+    folder = snapshot_folder(name)
+    frames = manifest.get('frames', {})
+    for df_name, entry in frames.items():
+        filename = os.path.join(folder, entry['file'])
+        if not os.path.exists(filename):
+            errors.append(f"{df_name}: file {filename} missing.")
+            continue
+        st = os.stat(filename)
+        if st.st_size != entry['size']:
+            errors.append(f"{df_name}: size {st.st_size} differs from manifest {entry['size']}.")
+            continue
+        # Se mtime è cambiato (es. copia) verifichiamo il contenuto con l'hash
+        if st.st_mtime_ns != entry['mtime_ns'] and file_sha256(filename) != entry['sha256']:
+            errors.append(f"{df_name}: content changed since manifest (hash mismatch).")
+            continue
+
+        expected = EXPECTED_SCHEMAS.get(df_name, {})
+        schema = entry.get('schema', {})
+        missing = [c for c in expected if c not in schema]
+        if missing:
+            errors.append(f"{df_name}: missing columns {missing}.")
+        extra = [c for c in schema if c not in expected]
+        if extra:
+            warnings.append(f"{df_name}: extra columns {extra}.")
+        for col, series in expected.items():
+            if col in schema and _dtype_kind(schema[col]) != _dtype_kind(str(series.dtype)):
+                warnings.append(f"{df_name}.{col}: dtype {schema[col]} (expected {series.dtype}).")
+
+    for group in (DB_DF_NAMES, KB_DF_NAMES):
+        ids = {frames[n].get('import_id') for n in group if n in frames}
+        ids.discard(None)
+        if len(ids) > 1:
+            warnings.append(f"Frames {', '.join(n for n in group if n in frames)} come from different imports.")
+
+    return errors, warnings
+
+
+def plan_snapshot_load(name="", force=False):
+    """
+    Decide quali DF leggere dallo snapshot.
+    Ritorna (to_read, skipped, manifest):
+      - to_read: lista di (df_name, entry) da leggere (entry=None in legacy).
+      - skipped: lista di df_name invariati rispetto all'ultimo load.
+    Un DF è invariato se l'hash coincide con quello caricato/salvato
+    per ultimo e la generazione del DF in data_structures è ancora quella
+    registrata allora (il DF non è stato sostituito).
+    """
+    manifest = read_manifest(name)
+    folder = snapshot_folder(name)
+    to_read = []
+    skipped = []
+
+    if manifest is None:
+        # Modalità legacy: file sciolti senza manifest
+        for df_name in DF_NAMES:
+            if os.path.exists(os.path.join(folder, f"{df_name}.feather")):
+                to_read.append((df_name, None))
+        return to_read, skipped, None
+
+    for df_name in DF_NAMES:
+        entry = manifest['frames'].get(df_name)
+        if entry is None:
+            continue
+        prev = _loaded_frames.get(df_name)
+        if (not force and prev is not None
+                and prev['sha256'] == entry['sha256']
+                and prev['generation'] == data_structures.get_generation(df_name)):
+            skipped.append(df_name)
+            continue
+        to_read.append((df_name, entry))
+    return to_read, skipped, manifest
+
+
+def read_snapshot_frame(name, df_name):
+    """
+    Legge e ritorna un singolo DF dallo snapshot (nessun effetto su
+    data_structures: utilizzabile anche da un thread secondario).
+    """
+    import pyarrow.feather as feather
+    filename = os.path.join(snapshot_folder(name), f"{df_name}.feather")
+    return feather.read_feather(filename)
+
+
+def apply_snapshot_frame(name, df_name, df, entry):
+    """
+    Pubblica il DF letto in data_structures e aggiorna lo stato
+    usato per saltare i file invariati.
+    """
+    global _active_snapshot
+    data_structures.set_dataframe(df_name, df, entry['sha256'] if entry is not None else None)
+    if entry is not None:
+        _loaded_frames[df_name] = {'sha256': entry['sha256'],
+                                   'generation': data_structures.get_generation(df_name)}
+        if entry.get('import_id'):
+            data_structures.IMPORT_INFO[df_name] = {
+                'import_id': entry['import_id'],
+                'imported_at': entry.get('imported_at')
+            }
+    else:
+        _loaded_frames.pop(df_name, None)
+    _active_snapshot = name
+
+
+def load_snapshot(name="", force=False):
+    """
+    Valida lo snapshot e carica i DF cambiati.
+    Ritorna una lista di righe di esito. In caso di errori di
+    validazione non carica nulla.
+    """
+    folder = snapshot_folder(name)
+    lines = [f"Loading DataFrames from FEATHER in {folder}...", ""]
+    start_time = time.time()
+
+    if read_manifest(name) is None:
+        lines.append("No manifest found: loading files without validation (legacy).")
+    else:
+        errors, warnings = validate_snapshot(name)
+        for w in warnings:
+            lines.append(f"Warning: {w}")
+        if errors:
+            for e in errors:
+                lines.append(f"Error: {e}")
+            lines.append("")
+            lines.append("Snapshot NOT loaded.")
+            return lines
+
+    to_read, skipped, manifest = plan_snapshot_load(name, force)
+    for df_name in skipped:
+        lines.append(f"Unchanged {df_name}: {len(getattr(data_structures, df_name))} records (skipped).")
+    for df_name, entry in to_read:
+        df = read_snapshot_frame(name, df_name)
+        apply_snapshot_frame(name, df_name, df, entry)
+        lines.append(f"Loaded {df_name}: {len(df)} records.")
+
+    if manifest is not None:
+        lines.append(f"Snapshot saved at {manifest.get('saved_at')}.")
+    elapsed = time.time() - start_time
+    lines.append(f"Load time: {elapsed:.2f}s")
+    return lines
+
+# End of snapshot_functions.py
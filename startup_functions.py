@@ -0,0 +1,264 @@
+"""
+Filename: startup_functions.py
+==============================
+
+Scopo:
+  - Pipeline di avvio asincrona: la finestra viene mostrata subito e
+    i DataFrame vengono letti dallo snapshot FEATHER in un thread
+    secondario (BackgroundSnapshotLoader).
+  - Dipendenze pagina -> DataFrame, per abilitare tab e pulsanti appena
+    i DF necessari sono pronti.
+  - Misura del "time to first interaction" e del tempo di caricamento.
+
+Procedures/Functions/Classi Principali:
+  - PAGE_DEPENDENCIES: tab del Notebook -> DF richiesti.
+  - STARTUP_LOAD_ORDER: ordine di lettura (prima i DF piccoli del KB).
+  - frames_ready(df_names, ready): True se tutti i DF sono pronti.
+  - BackgroundSnapshotLoader: thread di lettura + coda di messaggi
+    consumata dal thread Tk con poll().
+  - LazyPage(ttk.Frame): contenitore di una pagina del Notebook costruita
+    alla prima selezione della tab.
+  - import_time_report(module): import-time per modulo (python -X importtime).
+  - check_import_budget(report, budget_s): regressioni di import all'avvio.
+
+Modifiche recenti:
+  - 2026-10-19: Creazione del modulo (avvio asincrono con barra di stato).
+  - 2026-10-19: LazyPage e report import-time. Uso da riga di comando:
+      python startup_functions.py [--module main] [--top 20] [--budget 2.0]
+    ritorna exit code 1 se un modulo pesante è importato all'avvio o se
+    l'import supera il budget.
+  - 2026-10-19: import_time_report() solleva RuntimeError se l'import
+    fallisce; da riga di comando stampa la fine di stderr ed esce con 2.
+
+Note:
+  - Il thread secondario legge solo i file (read_snapshot_frame);
+    la pubblicazione in data_structures avviene nel thread Tk
+    (apply_snapshot_frame), che è l'unico a toccare i widget.
+"""
+
+import sys
+import time
+import queue
+import logging
+import argparse
+import threading
+import subprocess
+import tkinter as tk
+from tkinter import ttk
+
+from snapshot_functions import (
+    DF_NAMES,
+    KB_DF_NAMES,
+    read_manifest,
+    validate_snapshot,
+    plan_snapshot_load,
+    read_snapshot_frame,
+    apply_snapshot_frame
+)
+
+logger = logging.getLogger(__name__)
+
+PAGE_DEPENDENCIES = {
+    "Home": [],
+    "Explore Studies": [
+        "Studies_DF", "RulesConclusions_DF", "FinalDiagnoses_DF",
+        "ClinicalDiagnoses_DF", "KB_Conclusions_DF"
+    ],
+    "Explore KB": ["KB_Conclusions_DF", "KB_Rules_DF", "KB_Conditions_DF"],
+    "Import/Export & Data Frame": [],
+    "AI Tools": []
+}
+
+# Prima i DF del KB (piccoli), poi i DF HIS in ordine di dimensione crescente
+STARTUP_LOAD_ORDER = KB_DF_NAMES + [
+    "FinalDiagnoses_DF", "ClinicalDiagnoses_DF", "RulesConclusions_DF", "Studies_DF"
+]
+
+
+# Dipendenze pesanti che non devono essere importate all'avvio.
+# pyarrow non è in elenco: pandas (>=2) lo importa già se installato.
+HEAVY_MODULES = ["sklearn", "networkx", "GPUtil", "psutil", "fdb", "striprtf", "scipy"]
+
+# Righe di stderr mostrate se l'import misurato fallisce
+IMPORT_ERROR_TAIL = 10
+
+
+def frames_ready(df_names, ready):
+    """
+    True se tutti i DF in df_names sono nell'insieme ready.
+    """
+    return all(n in ready for n in df_names)
+
+
+class BackgroundSnapshotLoader:
+    """
+    Legge uno snapshot FEATHER in un thread secondario.
+    I risultati sono accodati come tuple:
+      ('frame', df_name, df, entry)  DF letto, da pubblicare
+      ('skip', df_name)              DF invariato (già in memoria)
+      ('message', text)              riga informativa (warning, legacy...)
+      ('error', text)                errore: caricamento interrotto
+      ('done', elapsed)              fine lettura
+    Il thread Tk chiama poll() (es. con after) per consumare la coda.
+    """
+    def __init__(self, snapshot_name=""):
+        self.snapshot_name = snapshot_name
+        self.queue = queue.Queue()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="SnapshotLoader", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        start_time = time.perf_counter()
+        try:
+            if read_manifest(self.snapshot_name) is None:
+                self.queue.put(('message', "No manifest found: loading files without validation (legacy)."))
+            else:
+                errors, warnings = validate_snapshot(self.snapshot_name)
+                for w in warnings:
+                    self.queue.put(('message', f"Warning: {w}"))
+                if errors:
+                    for e in errors:
+                        self.queue.put(('error', e))
+                    self.queue.put(('done', time.perf_counter() - start_time))
+                    return
+
+            to_read, skipped, _ = plan_snapshot_load(self.snapshot_name)
+            for df_name in skipped:
+                self.queue.put(('skip', df_name))
+            order = {n: i for i, n in enumerate(STARTUP_LOAD_ORDER)}
+            to_read.sort(key=lambda x: order.get(x[0], len(DF_NAMES)))
+            for df_name, entry in to_read:
+                t0 = time.perf_counter()
+                df = read_snapshot_frame(self.snapshot_name, df_name)
+                logger.info("Read %s (%d records) in %.2fs", df_name, len(df), time.perf_counter() - t0)
+                self.queue.put(('frame', df_name, df, entry))
+        except Exception as E:
+            self.queue.put(('error', f"Error loading snapshot: {E}"))
+        self.queue.put(('done', time.perf_counter() - start_time))
+
+    def poll(self):
+        """
+        Ritorna la lista dei messaggi disponibili (senza bloccare).
+        """
+        items = []
+        while True:
+            try:
+                items.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def publish(self, item):
+        """
+        Da chiamare nel thread Tk per un messaggio ('frame', ...):
+        pubblica il DF in data_structures.
+        """
+        _, df_name, df, entry = item
+        apply_snapshot_frame(self.snapshot_name, df_name, df, entry)
+
+
+class LazyPage(ttk.Frame):
+    """
+    Contenitore inserito nel Notebook al posto della pagina vera.
+    La pagina viene creata da factory(parent) solo alla prima chiamata
+    di ensure_built() (tipicamente alla selezione della tab).
+    """
+    def __init__(self, parent, factory, name):
+        super().__init__(parent)
+        self.factory = factory
+        self.name = name
+        self.page = None
+
+    def is_built(self):
+        return self.page is not None
+
+    def ensure_built(self):
+        """
+        Costruisce la pagina se necessario e la ritorna.
+        """
+        if self.page is None:
+            t0 = time.perf_counter()
+            self.page = self.factory(self)
+            self.page.pack(fill=tk.BOTH, expand=True)
+            logger.info("Built page %s in %.2fs", self.name, time.perf_counter() - t0)
+        return self.page
+
+
+def import_time_report(module="main"):
+    """
+    Esegue "python -X importtime -c 'import <module>'" in un processo
+    separato e ritorna una lista di tuple (cumulative_us, self_us, nome)
+    ordinata per tempo cumulativo decrescente. Se l'import fallisce solleva
+    RuntimeError con le ultime righe di stderr (il report sarebbe parziale).
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        errors = [line for line in proc.stderr.splitlines() if not line.startswith("import time:")]
+        tail = "\n".join(errors[-IMPORT_ERROR_TAIL:])
+        raise RuntimeError(f"Import of '{module}' failed (exit code {proc.returncode}):\n{tail}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # intestazione
+        self_us = int(parts[0].strip())
+        cum_us = int(parts[1].strip())
+        name = parts[2].strip()
+        rows.append((cum_us, self_us, name))
+    rows.sort(reverse=True)
+    return rows
+
+
+def check_import_budget(report, module="main", budget_s=None):
+    """
+    Controlla il report di import_time_report().
+    Ritorna una lista di violazioni (stringhe):
+      - moduli in HEAVY_MODULES importati all'avvio;
+      - tempo cumulativo del modulo principale oltre budget_s.
+    """
+    violations = []
+    imported = {name for _, _, name in report}
+    for heavy in HEAVY_MODULES:
+        if heavy in imported:
+            violations.append(f"Heavy module '{heavy}' imported at startup.")
+    if budget_s is not None:
+        for cum_us, _, name in report:
+            if name == module and cum_us / 1e6 > budget_s:
+                violations.append(f"Import of '{module}' took {cum_us / 1e6:.2f}s (budget {budget_s:.2f}s).")
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time report (python -X importtime).")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--budget", type=float, default=None, help="Max import time in seconds.")
+    args = parser.parse_args()
+
+    try:
+        report = import_time_report(args.module)
+    except RuntimeError as E:
+        print(E)
+        return 2
+    print(f"{'cumulative ms':>14} {'self ms':>10}  module")
+    for cum_us, self_us, name in report[:args.top]:
+        print(f"{cum_us / 1000:14.1f} {self_us / 1000:10.1f}  {name}")
+
+    violations = check_import_budget(report, args.module, args.budget)
+    for v in violations:
+        print(v)
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# End of startup_functions.py
@@ -0,0 +1,498 @@
+"""
+Filename: stats_functions.py
+============================
+
+Scopo:
+  - Statistiche della pagina Home calcolate fuori dalla GUI e restituite
+    come risultato strutturato (dict / DataFrame), riusabile anche da
+    altre pagine o da script.
+  - RulesConclusions: ogni CONCLUSION_CODE è mappato su una piccola
+    bitmask di flag (Final, Muscle, Nerve, In Report, Reserved,
+    Generalization, Warning) con una lookup table; tutti i conteggi per
+    studio sono calcolati in un solo passaggio raggruppato, senza il merge
+    di RulesConclusions_DF con KB_Conclusions_DF.
+  - Studies: la tabella "tidy" (YEAR, DAY, SEX_CODE) da cui derivano
+    tutte le statistiche (testo della Home ed export CSV) è ricavata dalla
+    sezione "studies" del cubo giornaliero (cube_functions).
+  - Report per intervallo di date dalle somme prefisse del cubo.
+
+Procedures/Functions:
+  - rulesconc_stats(rc_df, studies_df): conteggi per studio e medie.
+  - studies_stats(studies_df, start, end): tabella (YEAR, DAY, SEX_CODE) e riepiloghi.
+  - export_studies_stats_csv(filename, stats): salva la tabella in CSV.
+  - kb_stats_text(), rulesconc_stats_text(), studies_stats_text(): testi
+    dei tre pulsanti della Home (nessun accesso a Tk).
+  - range_stats_text(start, end): report di un intervallo di date.
+  - HomeStatsCache / get_home_stats_cache(): testi in cache per versione
+    dei DF letti, persistiti in HOME_STATS_FILE accanto allo snapshot.
+  - save_home_stats(snapshot_name): salva la cache nello snapshot.
+
+Modifiche recenti:
+  - 2026-10-19: Creazione del modulo (RulesConclusions Stats).
+  - 2026-10-19: Studies Stats vettoriali (groupby multi-chiave, export CSV).
+  - 2026-10-19: Testi della Home calcolati fuori da Tk e in cache
+    (HomeStatsCache), salvati con lo snapshot.
+  - 2026-10-19: Studies/RulesConclusions Stats e report per intervallo dal
+    cubo giornaliero; LUT dei flag e colonne derivate spostate in cube_functions.
+
+Note:
+  - Semantica identica a HomePage.show_rulesconc_stats precedente: la media
+    di ogni colonna è calcolata sugli studi con almeno una conclusione di
+    quel tipo; le righe con RICO_ID nullo sono escluse; un CODE assente
+    dal KB non ha flag.
+  - Con più righe KB per lo stesso CODE i flag sono in OR (il merge
+    precedente duplicava invece le righe di RulesConclusions).
+  - Studies Stats: stesse regole di prima (studi senza STUDY_DATE contati
+    solo nel totale e in M/F; età media per giorno, poi min/max/media dei
+    giorni; età = giorni / 365.25).
+"""
+
+import os
+import json
+import time
+import logging
+import datetime
+import threading
+
+import pandas as pd
+
+import data_structures
+from snapshot_functions import snapshot_folder, get_active_snapshot
+from cube_functions import (
+    RC_STAT_COLUMNS, AGE_BAND_LABELS, per_study_flag_counts,
+    derived_study_columns, build_studies_section, get_cube
+)
+
+HOME_STATS_FILE = "home_stats.json"
+
+logger = logging.getLogger(__name__)
+
+
+def rulesconc_stats(rc_df=None, studies_df=None):
+    """
+    Statistiche di RulesConclusions_DF (default: DF correnti).
+    Ritorna un dict:
+      total_rows       righe di RulesConclusions_DF
+      total_studies    RICO_ID distinti di Studies_DF
+      per_study        DataFrame indicizzato per RICO_ID con le colonne
+                       di RC_STAT_COLUMNS (numero di conclusioni per tipo)
+      studies_with     colonna -> numero di studi con almeno una conclusione
+      averages         colonna -> media sugli studi con almeno una conclusione
+      labels           colonna -> etichetta
+      elapsed          secondi
+    """
+    t0 = time.perf_counter()
+    if rc_df is None:
+        rc_df = data_structures.RulesConclusions_DF
+    if studies_df is None:
+        studies_df = data_structures.Studies_DF
+    columns = [name for name, _ in RC_STAT_COLUMNS]
+    ricos, counts = per_study_flag_counts(rc_df)
+
+    per_study = pd.DataFrame(counts, index=pd.Index(ricos, name='RICO_ID'), columns=columns)
+    with_any = (counts > 0).sum(axis=0)
+    sums = counts.sum(axis=0)
+    averages = {c: (sums[i] / with_any[i] if with_any[i] else 0.0) for i, c in enumerate(columns)}
+
+    result = {
+        'total_rows': len(rc_df),
+        'total_studies': int(studies_df['RICO_ID'].nunique(dropna=False)) if not studies_df.empty else 0,
+        'per_study': per_study,
+        'studies_with': dict(zip(columns, with_any.tolist())),
+        'averages': averages,
+        'labels': dict(RC_STAT_COLUMNS),
+        'elapsed': time.perf_counter() - t0
+    }
+    logger.info("RulesConclusions stats: %d rows, %d studies in %.3fs",
+                len(rc_df), len(ricos), result['elapsed'])
+    return result
+
+
+def studies_stats(studies_df=None, start=None, end=None):
+    """
+    Statistiche di Studies_DF (default: sezione "studies" del cubo giornaliero).
+    start/end (date, incluse): solo gli studi con data nell'intervallo.
+    Ritorna un dict:
+      total, males, females  conteggi su tutti gli studi (o dell'intervallo)
+      table     DataFrame tidy (YEAR, DAY, SEX_CODE, STUDIES, AGE_COUNT,
+                AGE_SUM, AGE_MEAN) sugli studi con data
+      by_day    DataFrame (DAY, YEAR, STUDIES, AGE_MEAN)
+      by_year   DataFrame (YEAR, STUDIES, MALES, FEMALES, DAYS,
+                MIN_DAY, MAX_DAY, AVG_DAY)
+      avg_by_day, max_by_day          studi per giorno lavorativo
+      age_min, age_max, age_avg       sulle età medie giornaliere (None se assenti)
+      elapsed   secondi
+    """
+    t0 = time.perf_counter()
+    if studies_df is None:
+        cells = get_cube().table("studies")
+    else:
+        cells = build_studies_section(studies_df, derived_study_columns(studies_df))
+
+    # Celle (DAY, SEX_CODE, AGE_BAND) del cubo: i totali includono gli studi senza data
+    day = cells['DAY']
+    if start is not None or end is not None:
+        keep = day.notna().to_numpy().copy()
+        if start is not None:
+            keep &= (day >= pd.Timestamp(start)).to_numpy(dtype=bool, na_value=False)
+        if end is not None:
+            keep &= (day <= pd.Timestamp(end)).to_numpy(dtype=bool, na_value=False)
+        cells = cells[keep]
+        day = cells['DAY']
+    studies = cells['STUDIES']
+    sex = cells['SEX_CODE']
+    result = {
+        'total': int(studies.sum()),
+        'males': int(studies[(sex == 1).to_numpy(dtype=bool, na_value=False)].sum()),
+        'females': int(studies[(sex == 2).to_numpy(dtype=bool, na_value=False)].sum())
+    }
+
+    dated = cells[day.notna().to_numpy()]
+    frame = pd.DataFrame({
+        'YEAR': dated['DAY'].dt.year.astype('Int64').array,
+        'DAY': dated['DAY'].array,
+        'SEX_CODE': dated['SEX_CODE'].array,
+        'STUDIES': dated['STUDIES'].to_numpy(),
+        'AGE_COUNT': dated['AGE_COUNT'].to_numpy(),
+        'AGE_SUM': dated['AGE_SUM'].to_numpy()
+    })
+    table = frame.groupby(['YEAR', 'DAY', 'SEX_CODE'], dropna=False, sort=True)[
+        ['STUDIES', 'AGE_COUNT', 'AGE_SUM']].sum().reset_index()
+    table['AGE_MEAN'] = table['AGE_SUM'] / table['AGE_COUNT'].where(table['AGE_COUNT'] > 0)
+    result['table'] = table
+
+    # Per giorno (somma sui sessi)
+    by_day = table.groupby(['DAY', 'YEAR'], sort=True)[['STUDIES', 'AGE_COUNT', 'AGE_SUM']].sum().reset_index()
+    by_day['AGE_MEAN'] = by_day['AGE_SUM'] / by_day['AGE_COUNT'].where(by_day['AGE_COUNT'] > 0)
+    by_day = by_day[['DAY', 'YEAR', 'STUDIES', 'AGE_MEAN']]
+    result['by_day'] = by_day
+    result['avg_by_day'] = float(by_day['STUDIES'].mean()) if len(by_day) else 0.0
+    result['max_by_day'] = int(by_day['STUDIES'].max()) if len(by_day) else 0
+    ages = by_day['AGE_MEAN'].dropna()
+    result['age_min'] = float(ages.min()) if len(ages) else None
+    result['age_max'] = float(ages.max()) if len(ages) else None
+    result['age_avg'] = float(ages.mean()) if len(ages) else None
+
+    # Per anno
+    sex_counts = table.pivot_table(index='YEAR', columns='SEX_CODE', values='STUDIES',
+                                   aggfunc='sum', fill_value=0)
+    by_year = by_day.groupby('YEAR', sort=True)['STUDIES'].agg(
+        STUDIES='sum', DAYS='size', MIN_DAY='min', MAX_DAY='max', AVG_DAY='mean'
+    )
+    by_year.insert(1, 'MALES', sex_counts.get(1, pd.Series(0, index=sex_counts.index)).reindex(by_year.index, fill_value=0))
+    by_year.insert(2, 'FEMALES', sex_counts.get(2, pd.Series(0, index=sex_counts.index)).reindex(by_year.index, fill_value=0))
+    result['by_year'] = by_year.reset_index()
+
+    result['elapsed'] = time.perf_counter() - t0
+    logger.info("Studies stats: %d studies in %.3fs", result['total'], result['elapsed'])
+    return result
+
+
+def export_studies_stats_csv(filename, stats=None):
+    """
+    Salva la tabella tidy (YEAR, DAY, SEX_CODE, ...) di studies_stats in CSV.
+    Ritorna il numero di righe scritte.
+    """
+    if stats is None:
+        stats = studies_stats()
+    table = stats['table']
+    table.to_csv(filename, index=False, encoding='utf-8', date_format='%Y-%m-%d')
+    return len(table)
+
+
+# ----------------------------------------------------------------
+# Testi della pagina Home (senza Tk: eseguibili in un thread secondario)
+# ----------------------------------------------------------------
+def kb_stats_text():
+    """
+    Statistiche su KB_Conclusions, KB_Rules, KB_Conditions (in inglese).
+    """
+    df = data_structures.KB_Conclusions_DF
+    if df.empty:
+        return "KB_Conclusions_DF is empty.\n"
+
+    lines = []
+    lines.append("CONCLUSIONS:\n")
+    lines.append(f"Total: {format(len(df), ',d')}")
+
+    lines.append(f"Final: {format(int((df['GROUP_CODE'] == 1).sum()), ',d')}")
+    lines.append(f"Single Muscle: {format(int((df['GROUP_CODE'] == 2).sum()), ',d')}")
+    lines.append(f"Single Nerve: {format(int((df['GROUP_CODE'] == 3).sum()), ',d')}")
+
+    lines.append("")
+    depth_counts = df['DEPTH'].value_counts()
+    for d in range(df['DEPTH'].max() + 1):
+        lines.append(f"Depth {d}: {format(int(depth_counts.get(d, 0)), ',d')}")
+
+    lines.append("")
+    lines.append(f"In Report: {format(int((df['SHOW_IN_REPORTS_BL'] == True).sum()), ',d')}")
+    lines.append(f"Reserved: {format(int((df['RESERVED_BL'] == True).sum()), ',d')}")
+    lines.append(f"Generalization: {format(int((df['GENERALIZATION_BL'] == True).sum()), ',d')}")
+    lines.append(f"Warning: {format(int((df['WARNING_BL'] == True).sum()), ',d')}")
+    lines.append("")
+
+    # RULES
+    df_rules = data_structures.KB_Rules_DF
+    lines.append("RULES:")
+    if df_rules.empty:
+        lines.append("No rules loaded.")
+    else:
+        lines.append(f"Total number of rules: {format(len(df_rules), ',d')}")
+        group_conc = df_rules.groupby('CONCLUSION_CODE').size()
+        lines.append(f"Total number of conclusions that have rules: {format(df_rules['CONCLUSION_CODE'].nunique(), ',d')}")
+        avg_per_conc = group_conc.mean() if len(group_conc) > 0 else 0
+        max_per_conc = group_conc.max() if len(group_conc) > 0 else 0
+        lines.append(f"Average rules per conclusion: {avg_per_conc:.2f}")
+        lines.append(f"Max rules per conclusion: {format(max_per_conc, ',d')}")
+
+    lines.append("")
+    # CONDITIONS
+    df_cond = data_structures.KB_Conditions_DF
+    lines.append("CONDITIONS:")
+    if df_cond.empty:
+        lines.append("No conditions loaded.")
+    else:
+        lines.append(f"Total number of conditions: {format(len(df_cond), ',d')}")
+        group_rule = df_cond.groupby('RULE_ID').size()
+        avg_cond_rule = group_rule.mean() if len(group_rule) > 0 else 0
+        max_cond_rule = group_rule.max() if len(group_rule) > 0 else 0
+        lines.append(f"Average conditions per rule: {avg_cond_rule:.2f}")
+        lines.append(f"Max conditions per rule: {format(max_cond_rule, ',d')}")
+
+    return "\n".join(lines)
+
+
+def rulesconc_stats_text():
+    """
+    Testo di RulesConclusions Stats, dalle somme della sezione "conclusions"
+    del cubo: media = conclusioni del tipo / studi con almeno una.
+    """
+    if data_structures.RulesConclusions_DF.empty:
+        return "RulesConclusions_DF is empty.\n"
+    if data_structures.KB_Conclusions_DF.empty:
+        return "KB_Conclusions_DF is empty.\n"
+
+    cube = get_cube()
+    studies_df = data_structures.Studies_DF
+    total_studies = int(studies_df['RICO_ID'].nunique(dropna=False)) if not studies_df.empty else 0
+    lines = []
+    lines.append(f"Total number of rule conclusions in database: {format(int(cube.total('conclusions', 'ROWS')), ',d')}")
+    lines.append(f"Total number of studies: {format(total_studies, ',d')}")
+    lines.append("")
+
+    lines.append("Average number of conclusions per study:")
+    for name, label in RC_STAT_COLUMNS:
+        with_any = cube.total("conclusions", f"S_{name}")
+        average = cube.total("conclusions", f"N_{name}") / with_any if with_any else 0.0
+        lines.append(f"{label}: {int(round(average))}")
+    return "\n".join(lines)
+
+
+def range_stats_text(start=None, end=None):
+    """
+    Report di un intervallo di date (inclusi; None = senza limite) dalle
+    somme prefisse del cubo: studi per sesso e fascia d'età, conclusioni
+    per tipo, diagnosi finali e cliniche. Ogni totale è O(1).
+    """
+    cube = get_cube()
+    first, last = None, None
+    days = cube.table("studies")['DAY'].dropna()
+    if len(days):
+        first, last = days.min(), days.max()
+    start = pd.Timestamp(start) if start is not None else first
+    end = pd.Timestamp(end) if end is not None else last
+    if start is None or end is None:
+        return "No dated studies.\n"
+    if start > end:
+        return f"Invalid range: {start:%Y-%m-%d} > {end:%Y-%m-%d}\n"
+
+    def total(section, column, **filters):
+        return int(round(cube.range_total(section, column, start, end, **filters)))
+
+    n_studies = total("studies", "STUDIES")
+    lines = [f"From {start:%Y-%m-%d} to {end:%Y-%m-%d} ({(end - start).days + 1} days)", ""]
+    lines.append(f"Studies: {format(n_studies, ',d')} (Males: {format(total('studies', 'STUDIES', SEX_CODE=1), ',d')} "
+                 f"Females: {format(total('studies', 'STUDIES', SEX_CODE=2), ',d')})")
+    age_count = cube.range_total("studies", "AGE_COUNT", start, end)
+    if age_count:
+        lines.append(f"Average age: {cube.range_total('studies', 'AGE_SUM', start, end) / age_count:.1f}")
+    for band, label in enumerate(AGE_BAND_LABELS):
+        lines.append(f"  Age {label}: {format(total('studies', 'STUDIES', AGE_BAND=band), ',d')}")
+    lines.append(f"  Age unknown: {format(total('studies', 'STUDIES', AGE_BAND=-1), ',d')}")
+
+    lines.append("")
+    lines.append(f"Rule conclusions: {format(total('conclusions', 'ROWS'), ',d')}")
+    for name, label in RC_STAT_COLUMNS:
+        n = total("conclusions", f"N_{name}")
+        s = total("conclusions", f"S_{name}")
+        lines.append(f"  {label}: {format(n, ',d')} in {format(s, ',d')} studies")
+
+    lines.append("")
+    for prefix, label in (("FINAL", "Final diagnoses"), ("CLINICAL", "Clinical diagnoses")):
+        lines.append(f"{label}: {format(total('diagnoses', f'{prefix}_ROWS'), ',d')} "
+                     f"in {format(total('diagnoses', f'{prefix}_STUDIES'), ',d')} studies")
+    return "\n".join(lines)
+
+
+def studies_stats_text():
+    """
+    Testo di Studies Stats (da studies_stats):
+     - Totale, M/F
+     - Average by working day (e max)
+     - Age min, max, average
+     - Per ogni year, #studies, M/F, min in a day, max in a day, average.
+    """
+    if data_structures.Studies_DF.empty:
+        return "Studies_DF is empty.\n"
+
+    stats = studies_stats()
+    lines = []
+    lines.append(f"Total studies: {format(stats['total'], ',d')} (Males: {format(stats['males'], ',d')} Females: {format(stats['females'], ',d')})")
+    lines.append(f"Average studies by working day: {int(round(stats['avg_by_day']))} (Max: {stats['max_by_day']})")
+    if stats['age_avg'] is None:
+        lines.append("Min age 0, Max: 0, Average: 0")
+    else:
+        lines.append(f"Min age {int(round(stats['age_min']))}, Max: {int(round(stats['age_max']))}, Average: {int(round(stats['age_avg']))}")
+
+    lines.append("")
+    for row in stats['by_year'].itertuples(index=False):
+        lines.append(f"Year {int(row.YEAR)}:")
+        lines.append(f"  Studies: {format(int(row.STUDIES), ',d')} (M={format(int(row.MALES), ',d')}, F={format(int(row.FEMALES), ',d')})")
+        lines.append(f"  Min in a day: {int(row.MIN_DAY)}  Max: {int(row.MAX_DAY)}  Average: {int(round(row.AVG_DAY))}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+# ----------------------------------------------------------------
+# Cache dei risultati della Home (per versione dei DF, persistita)
+# ----------------------------------------------------------------
+# nome -> (DF letti, funzione che produce il testo)
+HOME_STATS = {
+    "kb": (["KB_Conclusions_DF", "KB_Rules_DF", "KB_Conditions_DF"], kb_stats_text),
+    "rulesconc": (["RulesConclusions_DF", "KB_Conclusions_DF", "Studies_DF"], rulesconc_stats_text),
+    "studies": (["Studies_DF"], studies_stats_text)
+}
+
+
+def _persistable(versions):
+    # "gen-N" identifica il DF solo nella sessione corrente
+    return all(not v.startswith("gen-") for v in versions.values())
+
+
+class HomeStatsCache:
+    """
+    Testi delle statistiche della Home, validi finché i DF letti non cambiano.
+    Ogni voce registra versione (hash FEATHER o "gen-N") e generazione dei
+    DF al momento del calcolo: è valida se coincidono le versioni oppure,
+    nella stessa sessione, le generazioni.
+    Le voci con sole versioni da snapshot sono salvate in HOME_STATS_FILE
+    nella cartella dello snapshot e rilette al riavvio.
+    """
+    def __init__(self):
+        self.entries = {}
+        self.loaded_folders = set()
+        self.lock = threading.Lock()
+
+    def lookup(self, name):
+        """
+        Ritorna la voce {text, versions, computed_at, ...} se ancora valida, altrimenti None.
+        """
+        self.load(get_active_snapshot())
+        df_names = HOME_STATS[name][0]
+        with self.lock:
+            entry = self.entries.get(name)
+        if entry is None:
+            return None
+        if entry['versions'] == {n: data_structures.get_version(n) for n in df_names}:
+            return entry
+        if entry.get('generations') == {n: data_structures.get_generation(n) for n in df_names}:
+            return entry
+        return None
+
+    def compute(self, name):
+        """
+        Calcola il testo (anche da un thread secondario), lo registra e
+        aggiorna il file dello snapshot attivo. Ritorna la voce.
+        """
+        df_names, func = HOME_STATS[name]
+        versions = {n: data_structures.get_version(n) for n in df_names}
+        generations = {n: data_structures.get_generation(n) for n in df_names}
+        t0 = time.perf_counter()
+        text = func()
+        entry = {
+            'text': text,
+            'versions': versions,
+            'generations': generations,
+            'computed_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'elapsed': time.perf_counter() - t0
+        }
+        with self.lock:
+            self.entries[name] = entry
+        if _persistable(versions):
+            self.save(get_active_snapshot())
+        return entry
+
+    def save(self, snapshot_name=""):
+        """
+        Scrive le voci persistibili in HOME_STATS_FILE. Le voci calcolate in
+        questa sessione su DF poi salvati (stessa generazione) prendono
+        la versione corrente (hash FEATHER).
+        """
+        folder = snapshot_folder(snapshot_name)
+        if not os.path.isdir(folder):
+            return None
+        with self.lock:
+            for name, entry in self.entries.items():
+                df_names = HOME_STATS[name][0]
+                if entry.get('generations') == {n: data_structures.get_generation(n) for n in df_names}:
+                    entry['versions'] = {n: data_structures.get_version(n) for n in df_names}
+            data = {
+                name: {k: entry[k] for k in ('text', 'versions', 'computed_at', 'elapsed')}
+                for name, entry in self.entries.items() if _persistable(entry['versions'])
+            }
+        filename = os.path.join(folder, HOME_STATS_FILE)
+        tmp = filename + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1)
+        os.replace(tmp, filename)
+        self.loaded_folders.add(folder)
+        return filename
+
+    def load(self, snapshot_name=""):
+        """
+        Legge (una volta per cartella) le voci salvate; non sostituisce
+        quelle già calcolate in questa sessione.
+        """
+        folder = snapshot_folder(snapshot_name)
+        if folder in self.loaded_folders:
+            return
+        self.loaded_folders.add(folder)
+        filename = os.path.join(folder, HOME_STATS_FILE)
+        if not os.path.isfile(filename):
+            return
+        try:
+            with open(filename, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Cannot read %s: %s", filename, e)
+            return
+        with self.lock:
+            for name, entry in data.items():
+                if name in HOME_STATS and name not in self.entries:
+                    self.entries[name] = dict(entry, generations=None)
+
+
+_home_stats_cache = HomeStatsCache()
+
+
+def get_home_stats_cache():
+    return _home_stats_cache
+
+
+def save_home_stats(snapshot_name=""):
+    """
+    Salva la cache della Home nella cartella dello snapshot (dopo save_snapshot).
+    """
+    return _home_stats_cache.save(snapshot_name)
+
+# End of stats_functions.py
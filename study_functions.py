@@ -0,0 +1,326 @@
+"""
+Filename: study_functions.py
+============================
+
+Scopo:
+  - Accesso leggero ai record di Studies_DF senza convertire l'intero
+    DataFrame in lista di dict (to_dict('records')).
+  - Il DF colonnare viene letto direttamente, una riga alla volta.
+
+Procedures/Functions/Classi Principali:
+  - StudyRecordAccessor: accessor per posizione su Studies_DF, ricostruito
+    solo quando cambia la generazione del DF.
+  - to_python_value(val): converte pd.NA/NaT/NaN in None.
+  - StudyLookupIndex: hash map STUDY_NUMBER/RICO_ID/ANAG_ID -> posizioni e
+    indice ordinato su STUDY_DATE per ricerche per intervallo.
+  - get_lookup_index(): indice corrente (ricostruito al cambio generazione).
+  - parse_study_query(text): interpreta il testo della casella di ricerca.
+  - RicoRowIndex / get_rico_index(df_name): RICO_ID -> righe di un DF figlio
+    (RulesConclusions, Final/Clinical Diagnoses) senza scansione completa.
+  - PatientIndex / get_patient_index(): ANAG_ID -> posizioni degli studi
+    del paziente ordinate per STUDY_DATE.
+
+Modifiche recenti:
+  - 2026-10-19: Creazione del modulo (StudyRecordAccessor).
+  - 2026-10-19: StudyLookupIndex e parse_study_query(). Sintassi ricerca:
+      123                     STUDY_NUMBER (se non trovato: RICO_ID)
+      rico:123 / anag:45      RICO_ID / ANAG_ID
+      study:123               solo STUDY_NUMBER
+      2024-03-01              studi di quel giorno
+      date:2024-03-01..2024-03-31  intervallo di date (estremi inclusi)
+  - 2026-10-19: RicoRowIndex (ordinamento per RICO_ID + searchsorted).
+  - 2026-10-19: PatientIndex (ordinamento per ANAG_ID, STUDY_DATE).
+
+Note:
+  - La generazione del DF è gestita da data_structures.set_dataframe().
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+import data_structures
+
+
+def to_python_value(val):
+    """
+    Converte i valori mancanti di pandas (pd.NA, NaT, NaN) in None,
+    così i record si comportano come quelli di to_dict('records').
+    """
+    if val is None:
+        return None
+    if not isinstance(val, str) and pd.isna(val):
+        return None
+    return val
+
+
+class StudyRecordAccessor:
+    """
+    Accessor per posizione sui record di Studies_DF.
+     - refresh(): aggancia il DF corrente se la generazione è cambiata
+       (ritorna True in quel caso).
+     - get(pos): dict colonna->valore della riga pos, letto dalle colonne.
+     - value(pos, col): singolo valore.
+     - find_position(col, value): prima posizione con col==value (o None).
+    """
+    def __init__(self, df_name="Studies_DF"):
+        self.df_name = df_name
+        self.df = None
+        self.generation = None
+
+    def refresh(self):
+        gen = data_structures.get_generation(self.df_name)
+        if self.df is not None and gen == self.generation:
+            return False
+        self.df = getattr(data_structures, self.df_name)
+        self.generation = gen
+        return True
+
+    def __len__(self):
+        return 0 if self.df is None else len(self.df)
+
+    def get(self, pos):
+        return {col: to_python_value(self.df[col].iat[pos]) for col in self.df.columns}
+
+    def value(self, pos, col):
+        return to_python_value(self.df[col].iat[pos])
+
+    def find_position(self, col, value):
+        if self.df is None or col not in self.df.columns or value is None:
+            return None
+        hits = np.flatnonzero((self.df[col] == value).fillna(False).to_numpy(dtype=bool))
+        return int(hits[0]) if len(hits) > 0 else None
+
+
+LOOKUP_KEYS = {
+    'study': 'STUDY_NUMBER',
+    'rico': 'RICO_ID',
+    'anag': 'ANAG_ID'
+}
+
+
+class StudyLookupIndex:
+    """
+    Indici di ricerca su Studies_DF, costruiti in un solo passaggio:
+     - maps[col]: valore -> array delle posizioni (STUDY_NUMBER, RICO_ID, ANAG_ID);
+     - date_values/date_positions: STUDY_DATE ordinate (NaT esclusi) e
+       posizioni corrispondenti, per searchsorted sugli intervalli.
+    Le posizioni sono quelle di StudyRecordAccessor (iloc su Studies_DF).
+    """
+    def __init__(self, df, generation=None):
+        self.generation = generation
+        self.size = len(df)
+        self.maps = {}
+        for col in LOOKUP_KEYS.values():
+            if col not in df.columns:
+                self.maps[col] = {}
+                continue
+            mask = df[col].notna().to_numpy(dtype=bool)
+            positions = np.flatnonzero(mask)
+            keys = df[col][mask].astype('int64').to_numpy()
+            groups = pd.Series(positions).groupby(keys, sort=False).indices
+            self.maps[col] = {k: positions[v] for k, v in groups.items()}
+
+        if 'STUDY_DATE' in df.columns:
+            dates = pd.to_datetime(df['STUDY_DATE'], errors='coerce').to_numpy(dtype='datetime64[ns]')
+            valid_pos = np.flatnonzero(~np.isnat(dates))
+            order = np.argsort(dates[valid_pos], kind='stable')
+            self.date_positions = valid_pos[order]
+            self.date_values = dates[self.date_positions]
+        else:
+            self.date_positions = np.empty(0, dtype=np.int64)
+            self.date_values = np.empty(0, dtype='datetime64[ns]')
+
+    def lookup(self, col, value):
+        """
+        Posizioni (array ordinato) con col == value; array vuoto se nessuna.
+        """
+        hits = self.maps.get(col, {}).get(value)
+        if hits is None:
+            return np.empty(0, dtype=np.int64)
+        return hits
+
+    def date_range(self, start, end):
+        """
+        Posizioni degli studi con start <= STUDY_DATE < end + 1 giorno
+        (giorni interi, estremi inclusi), in ordine di data.
+        """
+        lo = np.datetime64(pd.Timestamp(start).normalize(), 'ns')
+        hi = np.datetime64(pd.Timestamp(end).normalize() + pd.Timedelta(days=1), 'ns')
+        i = np.searchsorted(self.date_values, lo, side='left')
+        j = np.searchsorted(self.date_values, hi, side='left')
+        return self.date_positions[i:j]
+
+    def search(self, text):
+        """
+        Esegue la query (vedi parse_study_query). Ritorna (posizioni, descrizione);
+        solleva ValueError se il testo non è valido.
+        """
+        kind, args = parse_study_query(text)
+        if kind == 'date':
+            start, end = args
+            return self.date_range(start, end), f"STUDY_DATE {start.date()}..{end.date()}"
+        col, value = args
+        if kind == 'any':
+            hits = self.lookup('STUDY_NUMBER', value)
+            if len(hits) > 0:
+                return hits, f"STUDY_NUMBER={value}"
+            return self.lookup('RICO_ID', value), f"RICO_ID={value}"
+        return self.lookup(col, value), f"{col}={value}"
+
+
+_lookup_index = None
+
+
+def get_lookup_index():
+    """
+    StudyLookupIndex su Studies_DF corrente; ricostruito solo se la
+    generazione del DF è cambiata dall'ultima chiamata.
+    """
+    global _lookup_index
+    gen = data_structures.get_generation("Studies_DF")
+    if _lookup_index is None or _lookup_index.generation != gen:
+        _lookup_index = StudyLookupIndex(data_structures.Studies_DF, gen)
+    return _lookup_index
+
+
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def _parse_day(text):
+    if not _DATE_RE.match(text):
+        raise ValueError(f"Invalid date '{text}' (expected YYYY-MM-DD)")
+    return pd.Timestamp(text)
+
+
+def parse_study_query(text):
+    """
+    Interpreta la query di ricerca studi. Ritorna:
+      ('any', ('STUDY_NUMBER', n))  numero senza prefisso
+      ('key', (col, n))             prefisso study:/rico:/anag:
+      ('date', (start, end))        data singola o intervallo a..b
+    Solleva ValueError per testo non valido.
+    """
+    text = (text or "").strip().lower()
+    if not text:
+        raise ValueError("Empty search")
+    prefix, sep, rest = text.partition(":")
+    if not sep:
+        prefix, rest = "", text
+    rest = rest.strip()
+
+    if prefix == "date" or (not prefix and _DATE_RE.match(rest.split("..")[0].strip())):
+        a, _, b = rest.partition("..")
+        start = _parse_day(a.strip())
+        end = _parse_day(b.strip()) if b.strip() else start
+        if end < start:
+            start, end = end, start
+        return 'date', (start, end)
+
+    if not rest.isdigit():
+        raise ValueError(f"Invalid search '{text}'")
+    if not prefix:
+        return 'any', ('STUDY_NUMBER', int(rest))
+    if prefix not in LOOKUP_KEYS:
+        raise ValueError(f"Unknown key '{prefix}' (use {', '.join(LOOKUP_KEYS)} or date)")
+    return 'key', (LOOKUP_KEYS[prefix], int(rest))
+
+
+class RicoRowIndex:
+    """
+    Indice RICO_ID -> posizioni delle righe di un DF con colonna RICO_ID.
+    Le posizioni sono ordinate per RICO_ID (ordinamento stabile, quindi
+    nell'ordine originale all'interno dello stesso studio); rows(rico)
+    usa due searchsorted invece di confrontare tutta la colonna.
+    """
+    def __init__(self, df, generation=None):
+        self.generation = generation
+        ricos = df['RICO_ID'].to_numpy(dtype='float64', na_value=np.nan) if len(df) else np.empty(0)
+        order = np.argsort(ricos, kind='stable')  # NaN in fondo
+        self.order = order
+        self.sorted_ricos = ricos[order]
+
+    def rows(self, rico_id):
+        """
+        Posizioni (iloc) delle righe con RICO_ID == rico_id.
+        """
+        if rico_id is None:
+            return self.order[0:0]
+        i = np.searchsorted(self.sorted_ricos, rico_id, side='left')
+        j = np.searchsorted(self.sorted_ricos, rico_id, side='right')
+        return self.order[i:j]
+
+
+_rico_indexes = {}
+
+
+def get_rico_index(df_name):
+    """
+    RicoRowIndex del DF df_name; ricostruito solo se la generazione è cambiata.
+    """
+    gen = data_structures.get_generation(df_name)
+    index = _rico_indexes.get(df_name)
+    if index is None or index.generation != gen:
+        index = RicoRowIndex(getattr(data_structures, df_name), gen)
+        _rico_indexes[df_name] = index
+    return index
+
+
+def rows_for_rico(df_name, rico_id):
+    """
+    Righe di df_name relative allo studio rico_id (DataFrame).
+    """
+    df = getattr(data_structures, df_name)
+    return df.iloc[get_rico_index(df_name).rows(rico_id)]
+
+
+class PatientIndex:
+    """
+    Studi ordinati per (ANAG_ID, STUDY_DATE, posizione): le visite di un
+    paziente sono un intervallo contiguo trovato con due searchsorted.
+    Gli studi senza ANAG_ID sono esclusi; quelli senza data vanno in fondo.
+    """
+    def __init__(self, df, generation=None):
+        self.generation = generation
+        if len(df) == 0 or 'ANAG_ID' not in df.columns:
+            self.order = np.empty(0, dtype=np.int64)
+            self.sorted_anag = np.empty(0, dtype=np.int64)
+            return
+        valid = np.flatnonzero(df['ANAG_ID'].notna().to_numpy(dtype=bool))
+        anag = df['ANAG_ID'].to_numpy(dtype='float64', na_value=np.nan)[valid].astype(np.int64)
+        if 'STUDY_DATE' in df.columns:
+            dates = pd.to_datetime(df['STUDY_DATE'], errors='coerce').to_numpy(dtype='datetime64[ns]')[valid]
+            # NaT come valore massimo: in fondo alla lista del paziente
+            dates = np.where(np.isnat(dates), np.datetime64(np.iinfo(np.int64).max - 1, 'ns'), dates)
+        else:
+            dates = np.zeros(len(valid), dtype='datetime64[ns]')
+        order = np.lexsort((valid, dates, anag))
+        self.order = valid[order]
+        self.sorted_anag = anag[order]
+
+    def positions(self, anag_id):
+        """
+        Posizioni in Studies_DF degli studi del paziente, in ordine di data.
+        """
+        if anag_id is None:
+            return self.order[0:0]
+        i = np.searchsorted(self.sorted_anag, anag_id, side='left')
+        j = np.searchsorted(self.sorted_anag, anag_id, side='right')
+        return self.order[i:j]
+
+
+_patient_index = None
+
+
+def get_patient_index():
+    """
+    PatientIndex su Studies_DF; ricostruito solo se la generazione è cambiata.
+    """
+    global _patient_index
+    gen = data_structures.get_generation("Studies_DF")
+    if _patient_index is None or _patient_index.generation != gen:
+        _patient_index = PatientIndex(data_structures.Studies_DF, gen)
+    return _patient_index
+
+# End of study_functions.py
@@ -0,0 +1,490 @@
+"""
+Filename: study_report_functions.py
+===================================
+
+Scopo:
+  - Composizione del testo di uno studio (come mostrato in Explore Studies)
+    senza dipendenze dalla UI: il risultato è una stringa unica più
+    l'elenco dei range di tag (titoli), inseribile nel Text con una sola
+    insert() seguita dai tag_add().
+  - Cache dei testi composti (RenderCache), con chiave
+    (RICO_ID, modalità di visualizzazione, generazioni dei DF usati).
+
+Procedures/Functions/Classi Principali:
+  - compose_study(record, only_in_report, show_mn, show_warn):
+      ritorna (text, tags) con tags = [(tag, start, end), ...] in caratteri.
+  - render_generations(): generazioni dei DF da cui dipende il testo.
+  - RenderCache: cache LRU dei testi composti.
+  - format_study(record, text, tags, fmt): uno studio in "text", "html" o "jsonl".
+  - export_studies(filename, fmt, positions, ...): export di tutti gli studi
+    (o di un sottoinsieme) con ProcessPoolExecutor, a blocchi di RICO_ID.
+  - patient_timeline(anag_id, only_in_report, show_warn): visite del paziente,
+    matrice visite x conclusioni finali e variazioni tra visite consecutive.
+
+Modifiche recenti:
+  - 2026-10-19: Creazione del modulo (estratto da ExploreStudiesPage.show_record).
+  - 2026-10-19: Export massivo text/HTML/JSONL con pool di processi; ritorna
+    numero di studi, tempo e throughput (studi/s).
+  - 2026-10-19: patient_timeline() (PatientIndex + RicoRowIndex, diff vettoriale).
+  - 2026-10-19: export_studies() rimuove il file .tmp se l'esportazione fallisce.
+
+Note:
+  - Le righe figlie dello studio (conclusioni, diagnosi) sono lette con
+    study_functions.rows_for_rico() (indice per RICO_ID), i filtri con le
+    LUT di kb_cache_functions.
+  - Export: gli studi sono ordinati per RICO_ID e divisi in blocchi; ad ogni
+    worker si passano solo le righe dei DF figli del blocco (slice sugli
+    indici RICO_ID), il KB una sola volta nell'initializer. I blocchi sono
+    scritti nell'ordine, con al più 2 blocchi in coda per worker.
+"""
+
+import os
+import html
+import json
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import data_structures
+from study_functions import (
+    StudyRecordAccessor,
+    rows_for_rico,
+    get_rico_index,
+    get_patient_index
+)
+from kb_cache_functions import get_kb_cache
+from utils import (
+    interpret_side_code,
+    get_conclusion_str,
+    get_muscle_str,
+    get_nerve_str
+)
+
+# DF da cui dipende il testo composto di uno studio
+RENDER_DF_NAMES = [
+    "Studies_DF", "RulesConclusions_DF", "FinalDiagnoses_DF",
+    "ClinicalDiagnoses_DF", "KB_Conclusions_DF"
+]
+
+
+def render_generations():
+    return tuple(data_structures.get_generation(n) for n in RENDER_DF_NAMES)
+
+
+def _diagnoses_list(df_name, rico_id, default_str):
+    items = []
+    for _, rowd in rows_for_rico(df_name, rico_id).iterrows():
+        side_str = interpret_side_code(rowd.get('SIDE_CODE', None))
+        diag_str = rowd.get('STR', default_str)
+        if side_str:
+            diag_str += side_str
+        items.append(diag_str)
+    return items
+
+
+def _site_conclusions_list(rows, site_str_func, unknown_str):
+    items = []
+    for _, rowc in rows.iterrows():
+        c_str = get_conclusion_str(rowc['CODE'])
+        side_str = interpret_side_code(rowc.get('SIDE_CODE', None))
+        site_code = rowc.get('SITE_CODE', None)
+        if pd.notna(site_code):
+            site_name = site_str_func(site_code)
+        else:
+            site_name = unknown_str
+        text_item = c_str + f", {site_name}"
+        if side_str:
+            text_item += side_str
+        items.append(text_item)
+    return items
+
+
+def compose_study(record, only_in_report=True, show_mn=False, show_warn=False):
+    """
+    Compone il testo dello studio (record: dict colonna->valore di Studies_DF).
+    Ritorna (text, tags): tags è una lista di (tag, start, end) in caratteri,
+    con tag "title_tag" o "red_title".
+    """
+    parts = []
+    tags = []
+    length = 0
+
+    def add(s, tag=None):
+        nonlocal length
+        if tag is not None:
+            tags.append((tag, length, length + len(s)))
+        parts.append(s)
+        length += len(s)
+
+    def print_title(tt, tag="title_tag"):
+        add("\n")
+        add(tt + "\n", tag)
+
+    rico_id = record.get('RICO_ID')
+    add("\n")
+    add(f"Study Number: {record.get('STUDY_NUMBER')}\n", "title_tag")
+
+    subset = rows_for_rico("RulesConclusions_DF", rico_id)
+    if 'CONCLUSION_CODE' in subset.columns and 'CODE' not in subset.columns:
+        subset = subset.rename(columns={'CONCLUSION_CODE': 'CODE'})
+
+    # Filtri in report / warning: un solo gather sulla LUT del KB
+    kb_cache = get_kb_cache()
+    keep = kb_cache.mode_mask(only_in_report, show_warn)[kb_cache.index(subset['CODE'])]
+    subset = subset[keep]
+
+    clinical_list = _diagnoses_list("ClinicalDiagnoses_DF", rico_id, "(no clinical diag)")
+    finaldiag_list = _diagnoses_list("FinalDiagnoses_DF", rico_id, "(no final diag)")
+
+    final_rows = subset[subset.get('GROUP_CODE', 0) == 1]
+    final_list = []
+    for _, rowc in final_rows.iterrows():
+        item = get_conclusion_str(rowc['CODE'])
+        side_str = interpret_side_code(rowc.get('SIDE_CODE', None))
+        if side_str:
+            item += side_str
+        final_list.append(item)
+
+    print_title("FINAL IMPRESSIONS")
+    add((record.get('FINAL_IMPRESSIONS') or "") + "\n")
+
+    print_title("CLINICAL DIAGNOSES")
+    add("\n".join(clinical_list) + "\n")
+
+    print_title("FINAL DIAGNOSES")
+    add("\n".join(finaldiag_list) + "\n")
+
+    print_title("FINAL CONCLUSIONS", "red_title")
+    add("\n".join(final_list) + "\n")
+
+    if show_mn:
+        muscle_list = _site_conclusions_list(
+            subset[subset.get('GROUP_CODE', 0) == 2], get_muscle_str, "UnknownMuscle"
+        )
+        nerve_list = _site_conclusions_list(
+            subset[subset.get('GROUP_CODE', 0) == 3], get_nerve_str, "UnknownNerve"
+        )
+        print_title("SINGLE MUSCLE CONCLUSIONS", "red_title")
+        if muscle_list:
+            add("\n".join(muscle_list) + "\n")
+
+        print_title("SINGLE NERVE CONCLUSIONS", "red_title")
+        if nerve_list:
+            add("\n".join(nerve_list) + "\n")
+
+    print_title("FINAL REPORT")
+    add((record.get('FINAL_REPORT') or "") + "\n")
+
+    print_title("VARIABLES")
+    for k in ["RICO_ID", "ANAG_ID", "SERVICE_ID"]:
+        add(f"{k}: {record.get(k, '')}\n")
+
+    return "".join(parts), tags
+
+
+class RenderCache:
+    """
+    Cache LRU dei testi composti: chiave (RICO_ID, flag modalità, generazioni).
+    Al cambio di generazione di un DF le vecchie chiavi non sono più
+    raggiunte e vengono espulse dall'LRU.
+    """
+    def __init__(self, max_items=256):
+        self.max_items = max_items
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.items.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.items.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.items[key] = value
+        self.items.move_to_end(key)
+        while len(self.items) > self.max_items:
+            self.items.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def clear(self):
+        self.items.clear()
+
+
+# ------------------------------------------------------------------
+# EXPORT MASSIVO
+# ------------------------------------------------------------------
+EXPORT_FORMATS = ["text", "html", "jsonl"]
+EXPORT_CHILD_DF_NAMES = ["RulesConclusions_DF", "FinalDiagnoses_DF", "ClinicalDiagnoses_DF"]
+EXPORT_CHUNK_SIZE = 500
+
+HTML_HEADER = (
+    "<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>Studies</title>\n"
+    "<style>body{font-family:Helvetica,sans-serif} .red_title{color:red} "
+    "section{border-bottom:1px solid #ccc;white-space:pre-wrap}</style>\n"
+    "</head><body>\n"
+)
+HTML_FOOTER = "</body></html>\n"
+
+
+def _json_value(val):
+    if val is None:
+        return None
+    if isinstance(val, pd.Timestamp):
+        return val.isoformat()
+    if isinstance(val, np.generic):
+        return val.item()
+    return val
+
+
+def format_study(record, text, tags, fmt):
+    """
+    Formatta uno studio composto (text, tags) per l'export.
+      - "text":  separatore + testo;
+      - "html":  <section> con i titoli in <h3 class="tag">;
+      - "jsonl": una riga JSON con variabili, testo e sezioni (titolo -> contenuto).
+    """
+    if fmt == "text":
+        return "=" * 80 + "\n" + text
+    if fmt == "html":
+        out = ["<section>"]
+        pos = 0
+        for tag, start, end in tags:
+            out.append(html.escape(text[pos:start]))
+            out.append(f'<h3 class="{tag}">{html.escape(text[start:end].strip())}</h3>')
+            pos = end
+        out.append(html.escape(text[pos:]))
+        out.append("</section>\n")
+        return "".join(out)
+    if fmt == "jsonl":
+        sections = {}
+        bounds = [(start, end) for _, start, end in tags] + [(len(text), len(text))]
+        for (start, end), (next_start, _) in zip(bounds[:-1], bounds[1:]):
+            sections[text[start:end].strip()] = text[end:next_start].strip()
+        row = {k: _json_value(record.get(k)) for k in ("RICO_ID", "ANAG_ID", "STUDY_NUMBER", "STUDY_DATE")}
+        row['TEXT'] = text
+        row['SECTIONS'] = sections
+        return json.dumps(row, ensure_ascii=False) + "\n"
+    raise ValueError(f"Unknown export format '{fmt}'")
+
+
+_worker_options = {}
+
+
+def _init_export_worker(kb_df, options):
+    """
+    Initializer dei processi di export: KB e opzioni una volta per processo.
+    """
+    data_structures.set_dataframe("KB_Conclusions_DF", kb_df)
+    _worker_options.update(options)
+
+
+def _export_chunk(frames):
+    """
+    Compone e formatta gli studi di un blocco. frames: df_name -> DF del blocco.
+    Ritorna la stringa da scrivere.
+    """
+    for df_name, df in frames.items():
+        data_structures.set_dataframe(df_name, df)
+    records = StudyRecordAccessor()
+    records.refresh()
+    out = []
+    for pos in range(len(records)):
+        record = records.get(pos)
+        text, tags = compose_study(
+            record, _worker_options['only_in_report'],
+            _worker_options['show_mn'], _worker_options['show_warn']
+        )
+        out.append(format_study(record, text, tags, _worker_options['fmt']))
+    return "".join(out)
+
+
+def sort_by_rico(positions=None):
+    """
+    Posizioni in Studies_DF (tutte se None) ordinate per RICO_ID.
+    """
+    studies = data_structures.Studies_DF
+    if positions is None:
+        positions = np.arange(len(studies))
+    positions = np.asarray(positions, dtype=np.int64)
+    ricos = studies['RICO_ID'].to_numpy(dtype='float64', na_value=np.nan)[positions]
+    return positions[np.argsort(ricos, kind='stable')]
+
+
+def iter_export_chunks(positions=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Genera i blocchi di export: dict df_name -> DF, con gli studi
+    (positions, o tutti; riordinati per RICO_ID) e le sole righe figlie
+    del blocco (slice sull'indice RICO_ID + isin sul range).
+    """
+    studies = data_structures.Studies_DF
+    positions = sort_by_rico(positions)
+    ricos = studies['RICO_ID'].to_numpy(dtype='float64', na_value=np.nan)[positions]
+
+    child_indexes = {n: get_rico_index(n) for n in EXPORT_CHILD_DF_NAMES}
+    for i in range(0, len(positions), chunk_size):
+        chunk_pos = positions[i:i + chunk_size]
+        chunk_ricos = ricos[i:i + chunk_size]
+        frames = {"Studies_DF": studies.iloc[chunk_pos].reset_index(drop=True)}
+        valid = chunk_ricos[~np.isnan(chunk_ricos)]
+        for df_name, index in child_indexes.items():
+            df = getattr(data_structures, df_name)
+            if len(valid) == 0:
+                frames[df_name] = df.iloc[0:0]
+                continue
+            a = np.searchsorted(index.sorted_ricos, valid[0], side='left')
+            b = np.searchsorted(index.sorted_ricos, valid[-1], side='right')
+            in_chunk = np.isin(index.sorted_ricos[a:b], valid)
+            frames[df_name] = df.iloc[index.order[a:b][in_chunk]].reset_index(drop=True)
+        yield frames
+
+
+def export_studies(filename, fmt="text", positions=None, only_in_report=True,
+                   show_mn=False, show_warn=False, workers=None,
+                   chunk_size=EXPORT_CHUNK_SIZE, progress=None):
+    """
+    Esporta gli studi (tutti o positions) in filename nel formato fmt.
+    workers: numero di processi (None = CPU-1; 1 = nello stesso processo).
+    progress(done, total): callback opzionale dopo ogni blocco.
+    Ritorna dict: studies, chunks, elapsed, rate (studi/s), workers.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}'")
+    start_time = time.perf_counter()
+    total = len(data_structures.Studies_DF) if positions is None else len(positions)
+    if workers is None:
+        workers = max(1, (os.cpu_count() or 2) - 1)
+    options = {'fmt': fmt, 'only_in_report': only_in_report, 'show_mn': show_mn, 'show_warn': show_warn}
+    kb_df = data_structures.KB_Conclusions_DF
+    ordered = sort_by_rico(positions)
+    chunks = iter_export_chunks(ordered, chunk_size)
+
+    done = 0
+    n_chunks = 0
+    tmp_path = filename + ".tmp"
+    # File parziale rimosso se la composizione o un worker falliscono
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            if fmt == "html":
+                f.write(HTML_HEADER)
+
+            def write_chunk(frames_len, text):
+                nonlocal done, n_chunks
+                f.write(text)
+                done += frames_len
+                n_chunks += 1
+                if progress is not None:
+                    progress(done, total)
+
+            if workers == 1:
+                # Nello stesso processo: si compone direttamente sui DF globali
+                records = StudyRecordAccessor()
+                records.refresh()
+                for i in range(0, len(ordered), chunk_size):
+                    out = []
+                    for pos in ordered[i:i + chunk_size]:
+                        record = records.get(pos)
+                        text, tags = compose_study(record, only_in_report, show_mn, show_warn)
+                        out.append(format_study(record, text, tags, fmt))
+                    write_chunk(len(out), "".join(out))
+            else:
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_export_worker,
+                                         initargs=(kb_df, options)) as pool:
+                    pending = deque()
+                    for frames in chunks:
+                        pending.append((len(frames["Studies_DF"]), pool.submit(_export_chunk, frames)))
+                        # Al più 2 blocchi in coda per worker (memoria limitata)
+                        while len(pending) >= 2 * workers:
+                            n, fut = pending.popleft()
+                            write_chunk(n, fut.result())
+                    while pending:
+                        n, fut = pending.popleft()
+                        write_chunk(n, fut.result())
+
+            if fmt == "html":
+                f.write(HTML_FOOTER)
+        os.replace(tmp_path, filename)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    elapsed = time.perf_counter() - start_time
+    return {
+        'studies': done,
+        'chunks': n_chunks,
+        'elapsed': elapsed,
+        'rate': done / elapsed if elapsed > 0 else 0.0,
+        'workers': workers
+    }
+
+
+# ------------------------------------------------------------------
+# TIMELINE PAZIENTE
+# ------------------------------------------------------------------
+def patient_timeline(anag_id, only_in_report=True, show_warn=False):
+    """
+    Timeline delle conclusioni finali (GROUP_CODE=1) del paziente anag_id.
+    Ritorna un dict:
+      visits:   DataFrame (POSITION, RICO_ID, STUDY_NUMBER, STUDY_DATE) in ordine di data
+      labels:   descrizione di ogni conclusione (STR + lato), per prima comparsa
+      matrix:   array bool visite x conclusioni (presenza)
+      added:    array bool (visite-1) x conclusioni: comparse rispetto alla visita precedente
+      removed:  array bool (visite-1) x conclusioni: scomparse rispetto alla visita precedente
+    Le visite sono lette da PatientIndex e le conclusioni da RicoRowIndex:
+    nessuna scansione delle tabelle complete.
+    """
+    positions = get_patient_index().positions(anag_id)
+    studies = data_structures.Studies_DF
+    visits = pd.DataFrame({
+        'POSITION': positions,
+        'RICO_ID': studies['RICO_ID'].to_numpy()[positions],
+        'STUDY_NUMBER': studies['STUDY_NUMBER'].to_numpy()[positions],
+        'STUDY_DATE': studies['STUDY_DATE'].to_numpy()[positions]
+    })
+
+    rc_index = get_rico_index("RulesConclusions_DF")
+    row_lists = [rc_index.rows(r) for r in visits['RICO_ID']]
+    rows = np.concatenate(row_lists) if row_lists else np.empty(0, dtype=np.int64)
+    visit_of_row = np.repeat(np.arange(len(visits)), [len(r) for r in row_lists])
+
+    rc = data_structures.RulesConclusions_DF
+    code_col = 'CODE' if 'CODE' in rc.columns else 'CONCLUSION_CODE'
+    codes = rc[code_col].iloc[rows]
+    kb_cache = get_kb_cache()
+    keep = kb_cache.mode_mask(only_in_report, show_warn)[kb_cache.index(codes)]
+    keep &= (rc['GROUP_CODE'].iloc[rows] == 1).fillna(False).to_numpy(dtype=bool)
+
+    codes = codes.to_numpy(dtype='float64', na_value=np.nan)[keep]
+    sides = rc['SIDE_CODE'].iloc[rows].to_numpy(dtype='float64', na_value=np.nan)[keep] \
+        if 'SIDE_CODE' in rc.columns else np.full(int(keep.sum()), np.nan)
+    visit_of_row = visit_of_row[keep]
+
+    # (CODE, SIDE_CODE) -> colonna, nell'ordine di prima comparsa
+    pairs = pd.MultiIndex.from_arrays([codes, sides])
+    col_of_row, uniques = pd.factorize(pairs)
+    matrix = np.zeros((len(visits), len(uniques)), dtype=bool)
+    matrix[visit_of_row, col_of_row] = True
+
+    labels = []
+    for code, side in uniques:
+        label = get_conclusion_str(None if np.isnan(code) else int(code))
+        labels.append(label + interpret_side_code(None if np.isnan(side) else int(side)))
+
+    return {
+        'visits': visits,
+        'labels': labels,
+        'matrix': matrix,
+        'added': matrix[1:] & ~matrix[:-1],
+        'removed': matrix[:-1] & ~matrix[1:]
+    }
+
+# End of study_report_functions.py
@@ -16,13 +16,15 @@ Procedures/Functions:
 Modifiche recenti:
 - 2025-01-14: In get_conclusion_str(), aggiunta ricerca in KB_Conclusions_DF per mostrare la STR 
   anziché "ConclusionCode=xxx".
+- 2026-10-19: get_conclusion_str() legge la STR dalla LUT per CODE di
+  kb_cache_functions invece di filtrare KB_Conclusions_DF ad ogni chiamata.
 
 Note:
 - Tutte le funzioni assumono che i DataFrame siano stati correttamente popolati in data_structures.py.
 """
 
 import pandas as pd
-import data_structures
+from kb_cache_functions import get_kb_cache
 
 def interpret_side_code(side_code):
     """
@@ -46,16 +48,11 @@ def interpret_side_code(side_code):
 
 def get_conclusion_str(ccode):
     """
-    Cerca in data_structures.KB_Conclusions_DF il record con CODE=ccode
-    e ritorna la STR. Se non trovato, ritorna "ConclusionCode=ccode".
+    Ritorna la STR della conclusione con CODE=ccode dalla LUT per CODE
+    di kb_cache_functions (ricostruita solo se il KB cambia).
+    Se non trovata, ritorna "ConclusionCode=ccode".
     """
-    kb_df = data_structures.KB_Conclusions_DF
-    if kb_df.empty or ccode is None:
-        return f"ConclusionCode={ccode}"
-    sub = kb_df[kb_df['CODE'] == ccode]
-    if sub.empty:
-        return f"ConclusionCode={ccode}"
-    return str(sub.iloc[0]['STR'])  # Se trovato, restituisce la STR
+    return get_kb_cache().conclusion_str(ccode)
 
 def get_muscle_str(site_code):
     """